@@ -1,20 +1,68 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g, stream_with_context
 from flask_cors import CORS
+import click
 import numpy as np
-from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-from transformers import AutoModelForSequenceClassification
-import torch
 import re
 import os
 import json
 import uuid
+import hashlib
 import traceback
+import threading
+import time
+import logging
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 from functools import wraps
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from auth_cache import AuthenticatedUser, TokenCache
+from password_hashing import PasswordHasher, PasswordHashingBusy
+from db_config import DEFAULT_DATABASE_URL, engine_options, install_sqlite_pragmas, is_sqlite, sqlite_pragmas
+from batching import BatchScheduler
+from jobs import JobRunner, QueueFull
+from candidates import CandidateGenerator, type_pair_allowlist
+from relation_encoding import SharedDocumentEncoding
+from chunking import plan_chunks, stitch_entities
+from coreference import CoreferenceIndex
+from incremental import ExtractionState, IncrementalExtractor, IncrementalStore
+from inference_pool import InferencePool
+from model_registry import ModelRegistry, ModelsWarmingUp
+from inference_backend import convert_models
+from diagram_delta import (DiagramDocument, DiagramStore, PatchError, VersionConflict, diagram_edge,
+                           diagram_node, plantuml_boundary, plantuml_relation_lines, plantuml_system_line)
+from diagram_layout import LayeredLayout
+from plantuml_parser import PlantUMLSyntaxError, parse_c4_plantuml
+from result_cache import ResultCache, model_fingerprint, compress_payload, decompress_payload
+from bulk import (OUTPUT_FORMATS, Checkpoint, ResultWriter, ThroughputMeter, batched, document_record,
+                  iter_documents)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS, MetricsRegistry, stage_timer
+
+# Журнал в формате "время уровень логгер событие ключ=значение", уровень из LOG_LEVEL
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s %(message)s'
+)
+logger = logging.getLogger('c4architect')
+
+# Метрики для /metrics; кеши и очереди подключаются колбэками после их создания
+metrics = MetricsRegistry(prefix='c4architect_')
+http_requests = metrics.counter('http_requests_total', 'HTTP requests', ('method', 'endpoint', 'status'))
+http_latency = metrics.histogram('http_request_duration_seconds', 'HTTP request latency', ('method', 'endpoint'))
+http_request_size = metrics.histogram('http_request_size_bytes', 'HTTP request body size', ('endpoint',),
+                                      buckets=SIZE_BUCKETS)
+stage_latency = metrics.histogram('pipeline_stage_duration_seconds', 'Extraction pipeline stage latency', ('stage',))
+document_chars = metrics.histogram('pipeline_document_chars', 'Characters per extracted document',
+                                   buckets=SIZE_BUCKETS)
+document_entities = metrics.histogram('pipeline_document_entities', 'Entities per extracted document',
+                                      buckets=SIZE_BUCKETS)
+model_forward = metrics.counter('model_forward_total', 'Model forward passes', ('model',))
+model_examples = metrics.counter('model_examples_total', 'Examples passed through the models', ('model',))
+relation_pairs = metrics.counter('relation_pairs_total', 'Entity pairs by relation extraction outcome', ('outcome',))
+coreference_merges = metrics.counter('coreference_merges_total', 'Entity mentions merged into an earlier mention',
+                                     ('match',))
 
 app = Flask(__name__)
 CORS(app, 
@@ -22,24 +70,103 @@ CORS(app,
      allow_headers=["Authorization", "Content-Type"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 app.config['SECRET_KEY'] = 'your_secret_key_here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///c4architect.db'
+# БД из окружения: пул соединений для серверных СУБД, WAL и busy_timeout для SQLite (см. db_config)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], os.environ)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+    install_sqlite_pragmas(sqlite_pragmas(os.environ))
+# Кеш проверенных токенов: время жизни записи (0 -- без кеша) и размер
+app.config['AUTH_CACHE_TTL'] = float(os.environ.get('AUTH_CACHE_TTL', 60))
+app.config['AUTH_CACHE_MAX_ENTRIES'] = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 1024))
+# Хеширование паролей: метод Werkzeug с параметрами стоимости, размер пула и очереди, таймаут (с)
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+# Загрузка моделей: 'background' (фоновый прогрев), 'lazy' (при первом запросе) или 'eager'
+app.config['MODEL_LOADING'] = os.environ.get('MODEL_LOADING', 'background')
+# Полные дампы сущностей, отношений, иерархии и PlantUML в журнал на каждый прогон (только для отладки)
+app.config['PIPELINE_DEBUG_DUMPS'] = os.environ.get('PIPELINE_DEBUG_DUMPS', '0') == '1'
+# Бэкенд инференса: 'pytorch' (fp32), 'int8' (динамическая квантизация), 'onnx' или 'onnx-int8'
+# (ONNX Runtime, модели из ONNX_MODEL_DIR после flask convert-models); ONNX_THREADS=0 -- по числу ядер
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'pytorch')
+app.config['ONNX_MODEL_DIR'] = os.environ.get('ONNX_MODEL_DIR', 'onnx_models')
+app.config['ONNX_THREADS'] = int(os.environ.get('ONNX_THREADS', 0))
+# Пул процессов для /process с общими (copy-on-write) весами моделей; 0 -- в процессе запроса
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', 0))
+app.config['INFERENCE_TIMEOUT'] = float(os.environ.get('INFERENCE_TIMEOUT', 300))
+# Динамический батчинг NER/RE между параллельными запросами: размер батча и максимальное ожидание
+app.config['INFERENCE_BATCHING'] = os.environ.get('INFERENCE_BATCHING', '0') == '1'
+app.config['NER_BATCH_MAX_SIZE'] = int(os.environ.get('NER_BATCH_MAX_SIZE', 8))
+app.config['BATCH_MAX_WAIT_MS'] = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+# Длинные тексты: NER по фрагментам не длиннее NER_CHUNK_TOKENS токенов (0 -- лимит модели без
+# служебных токенов, текст в пределах лимита обрабатывается целиком, как раньше), соседние
+# фрагменты перекрываются на NER_CHUNK_OVERLAP предложений, фрагменты идут батчами
+app.config['NER_CHUNK_TOKENS'] = int(os.environ.get('NER_CHUNK_TOKENS', 0))
+app.config['NER_CHUNK_OVERLAP'] = int(os.environ.get('NER_CHUNK_OVERLAP', 2))
+app.config['NER_CHUNK_BATCH_SIZE'] = int(os.environ.get('NER_CHUNK_BATCH_SIZE', 8))
+# Пакетная обработка (/process/bulk, flask process-corpus): документов в батче и в одном запросе
+app.config['BULK_BATCH_SIZE'] = int(os.environ.get('BULK_BATCH_SIZE', 16))
+app.config['BULK_MAX_DOCUMENTS'] = int(os.environ.get('BULK_MAX_DOCUMENTS', 500))
+# Асинхронные задачи извлечения: число рабочих потоков, размер очереди, шаг прогресса RE
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_QUEUE_SIZE'] = int(os.environ.get('JOB_QUEUE_SIZE', 100))
+# Выполняемые задачи отмечаются каждые JOB_HEARTBEAT_SECONDS; задача без отметки дольше
+# JOB_STALE_SECONDS считается брошенной (процесс упал) и снова ставится в очередь
+app.config['JOB_HEARTBEAT_SECONDS'] = float(os.environ.get('JOB_HEARTBEAT_SECONDS', 15))
+app.config['JOB_STALE_SECONDS'] = float(os.environ.get('JOB_STALE_SECONDS', 120))
+app.config['RE_PROGRESS_CHUNK'] = int(os.environ.get('RE_PROGRESS_CHUNK', 256))
+# Потоковый /process/stream: сколько узлов/ребер отправлять в одном событии
+app.config['STREAM_CHUNK_SIZE'] = int(os.environ.get('STREAM_CHUNK_SIZE', 500))
+# Раскладка узлов: 'layered' -- послойная (Sugiyama), 'grid' -- прежние фиксированные строки
+app.config['DIAGRAM_LAYOUT'] = os.environ.get('DIAGRAM_LAYOUT', 'layered')
+app.config['LAYOUT_MAX_PER_ROW'] = int(os.environ.get('LAYOUT_MAX_PER_ROW', 40))
+app.config['LAYOUT_CACHE_SIZE'] = int(os.environ.get('LAYOUT_CACHE_SIZE', 64))
+# Сколько диаграмм держать на сервере для патчей /update-diagram
+app.config['DIAGRAM_MAX_DOCUMENTS'] = int(os.environ.get('DIAGRAM_MAX_DOCUMENTS', 128))
+# Размер микробатча для RE модели
+app.config['RE_BATCH_SIZE'] = int(os.environ.get('RE_BATCH_SIZE', 32))
+# Режим RE: 'pair' -- отдельный контекст на пару, 'shared' -- общая токенизация документа
+app.config['RE_SCORING_MODE'] = os.environ.get('RE_SCORING_MODE', 'pair')
+# Отбор пар-кандидатов для RE: окно предложений, расстояние в токенах, фильтр по типам
+app.config['RE_CANDIDATE_SENTENCE_WINDOW'] = int(os.environ['RE_CANDIDATE_SENTENCE_WINDOW']) \
+    if os.environ.get('RE_CANDIDATE_SENTENCE_WINDOW') else None
+app.config['RE_CANDIDATE_MAX_TOKEN_DISTANCE'] = int(os.environ['RE_CANDIDATE_MAX_TOKEN_DISTANCE']) \
+    if os.environ.get('RE_CANDIDATE_MAX_TOKEN_DISTANCE') else None
+app.config['RE_CANDIDATE_TYPE_FILTER'] = os.environ.get('RE_CANDIDATE_TYPE_FILTER', '0') == '1'
+# Объединение повторных упоминаний сущностей перед RE и порог сходства имен (1.0 -- только точное совпадение)
+app.config['COREFERENCE'] = os.environ.get('COREFERENCE', '1') == '1'
+app.config['COREFERENCE_THRESHOLD'] = float(os.environ.get('COREFERENCE_THRESHOLD', 0.8))
+# Кеш результатов /process: размер LRU в памяти и второй уровень в БД
+app.config['RESULT_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 256))
+app.config['RESULT_CACHE_PERSISTENT'] = os.environ.get('RESULT_CACHE_PERSISTENT', '0') == '1'
+# Сколько последних версий текста (пользователь, диаграмма) хранить для инкрементального режима
+app.config['INCREMENTAL_MAX_STATES'] = int(os.environ.get('INCREMENTAL_MAX_STATES', 128))
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
 # Модель пользователя
+# Пароли хешируются в отдельном ограниченном пуле, а не в потоке запроса
+password_hasher = PasswordHasher(
+    method=app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.now)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     def generate_token(self):
         payload = {
@@ -49,6 +176,102 @@ class User(db.Model):
         }
         return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
 
+# Второй уровень кеша результатов /process
+class CachedResult(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+
+# Асинхронная задача извлечения (состояние переживает перезапуск воркера)
+class ExtractionJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)
+    text = db.Column(db.Text, nullable=False)
+    entities_found = db.Column(db.Integer)
+    pairs_scored = db.Column(db.Integer)
+    pairs_total = db.Column(db.Integer)
+    result = db.Column(db.LargeBinary)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self, include_result=False):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {
+                "entities_found": self.entities_found,
+                "pairs_scored": self.pairs_scored,
+                "pairs_total": self.pairs_total
+            },
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_result and self.result is not None:
+            data["result"] = decompress_payload(self.result)
+        return data
+
+
+# Сохраненная диаграмма пользователя; содержимое -- в версиях
+class Diagram(db.Model):
+    __table_args__ = (
+        # Список диаграмм пользователя -- один запрос по индексу (владелец, дата изменения)
+        db.Index('ix_diagram_owner_updated', 'owner_id', 'updated_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    name = db.Column(db.String(200), nullable=False)
+    current_version = db.Column(db.Integer, nullable=False, default=1)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "version": self.current_version,
+            "content_hash": self.content_hash,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+# Версия диаграммы: текст, сущности, отношения, иерархия и PlantUML в сжатом JSON
+class DiagramVersion(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('diagram_id', 'version', name='uq_diagram_version'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    diagram_id = db.Column(db.Integer, db.ForeignKey('diagram.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False, index=True)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now)
+
+
+class DatabaseResultStore:
+    """Персистентный уровень кеша результатов в таблице cached_result"""
+
+    def get(self, key):
+        with db.session.no_autoflush:
+            row = db.session.get(CachedResult, key)
+        return decompress_payload(row.payload) if row is not None else None
+
+    def put(self, key, payload):
+        try:
+            db.session.merge(CachedResult(key=key, payload=compress_payload(payload)))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("result_cache.write_failed error=%s", e)
+
 # Создаем таблицы при первом запуске
 # Flask (начиная с 2.3) удален метод before_first_request
 # @app.before_first_request
@@ -56,28 +279,51 @@ class User(db.Model):
 #     db.create_all()
 
 
+token_cache = TokenCache(
+    max_entries=app.config['AUTH_CACHE_MAX_ENTRIES'],
+    ttl=app.config['AUTH_CACHE_TTL']
+)
+
+# Изменение или удаление пользователя сбрасывает его токены в кеше.
+# Массовые query.update()/delete() эти события не вызывают
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_user_tokens(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
+
 # Декоратор для проверки аутентификации
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        started = time.perf_counter()
         token = None
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
-        
-        print(f"Received token: {token}")  # Добавить логирование
+        parts = request.headers.get('Authorization', '').split()
+        if len(parts) == 2:
+            token = parts[1]
         
         if not token:
+            logger.info("auth.rejected reason=missing_token path=%s", request.path)
             return jsonify({'error': 'Token is missing'}), 401
         
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            user_id = int(data['sub'])
-            current_user = User.query.get(user_id)
-            print(f"Authenticated user: {current_user.username}")  # Добавить логирование
-        except Exception as e:
-            print(f"Token validation error: {str(e)}")  # Добавить логирование
-            return jsonify({'error': 'Token is invalid'}), 401
+        # Проверенный ранее токен: без разбора JWT и запроса пользователя
+        current_user = token_cache.get(token)
+        cached = current_user is not None
+        if not cached:
+            try:
+                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+                with db.session.no_autoflush:
+                    user = db.session.get(User, int(data['sub']))
+            except Exception as e:
+                logger.warning("auth.rejected reason=invalid_token error=%s path=%s", type(e).__name__, request.path)
+                return jsonify({'error': 'Token is invalid'}), 401
+            if user is None:
+                logger.warning("auth.rejected reason=unknown_user path=%s", request.path)
+                return jsonify({'error': 'Token is invalid'}), 401
+            current_user = AuthenticatedUser(user.id, user.username)
+            token_cache.put(token, current_user, data.get('exp'))
         
+        token_cache.record(cached, time.perf_counter() - started)
+        logger.debug("auth.ok user_id=%s cached=%s path=%s", current_user.id, cached, request.path)
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -91,13 +337,23 @@ def register():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
     
-    if User.query.filter_by(username=username).first():
+    with db.session.no_autoflush:
+        exists = User.query.filter_by(username=username).first() is not None
+    if exists:
         return jsonify({'error': 'Username already exists'}), 400
     
     user = User(username=username)
-    user.set_password(password)
+    try:
+        user.set_password(password)
+    except PasswordHashingBusy as e:
+        return jsonify({'error': str(e)}), 503, {"Retry-After": "1"}
     db.session.add(user)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Параллельная регистрация того же имени
+        db.session.rollback()
+        return jsonify({'error': 'Username already exists'}), 400
     
     return jsonify({'message': 'User created successfully'}), 201
 
@@ -107,29 +363,103 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
-    user = User.query.filter_by(username=username).first()
+    with db.session.no_autoflush:
+        user = User.query.filter_by(username=username).first()
     
-    if not user or not user.check_password(password):
+    try:
+        valid = user is not None and user.check_password(password)
+    except PasswordHashingBusy as e:
+        return jsonify({'error': str(e)}), 503, {"Retry-After": "1"}
+    if not valid:
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    # Хеш со старыми параметрами пересчитывается с текущими, пока пароль известен
+    if password_hasher.needs_rehash(user.password_hash):
+        try:
+            user.set_password(password)
+            db.session.commit()
+            password_hasher.record_rehash()
+        except PasswordHashingBusy:
+            db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("auth.rehash_failed user_id=%s error=%s", user.id, e)
+    
     token = user.generate_token()
     return jsonify({'token': token}), 200
 
-# Загрузка NER модели
-ner_model_path = "ner_model-20250625T131736Z-1-001/ner_model"
-ner_tokenizer = AutoTokenizer.from_pretrained(ner_model_path)
-ner_model = AutoModelForTokenClassification.from_pretrained(ner_model_path)
+# NER и RE модели загружаются реестром лениво или в фоне (см. MODEL_LOADING)
+ner_model_path = os.environ.get("NER_MODEL_PATH", "ner_model-20250625T131736Z-1-001/ner_model")
+re_model_path = os.environ.get("RE_MODEL_PATH", "re_model_v2-20250625T151402Z-1-001/re_model_v2")
+models = ModelRegistry(
+    ner_model_path,
+    re_model_path,
+    mode=app.config['MODEL_LOADING'],
+    backend=app.config['INFERENCE_BACKEND'],
+    onnx_dir=app.config['ONNX_MODEL_DIR'],
+    onnx_threads=app.config['ONNX_THREADS']
+)
+if app.config['MODEL_LOADING'] == 'eager':
+    models.load()
+
+def create_inference_pool(workers, **environ):
+    """Пул воркеров из сервера форков: сервер импортирует это приложение с
+    MODEL_LOADING=eager, веса загружаются в нем один раз и общие для всех воркеров.
+    environ -- дополнительная конфигурация воркеров через окружение"""
+    return InferencePool(workers, preload=[__name__], environ={'MODEL_LOADING': 'eager', **environ})
+
+inference_pool = create_inference_pool(app.config['INFERENCE_WORKERS']) if app.config['INFERENCE_WORKERS'] > 0 else None
+inference_pool_lock = threading.Lock()
+
+# Кеш результатов /process (ключ: нормализованный текст + версии моделей и бэкенд инференса)
+result_cache = ResultCache(
+    max_entries=app.config['RESULT_CACHE_MAX_ENTRIES'],
+    model_fingerprints=(
+        model_fingerprint(ner_model_path, os.environ.get('NER_MODEL_REVISION')),
+        model_fingerprint(re_model_path, os.environ.get('RE_MODEL_REVISION')),
+        app.config['INFERENCE_BACKEND']
+    ),
+    persistent_store=DatabaseResultStore() if app.config['RESULT_CACHE_PERSISTENT'] else None
+)
+
+# Состояния для инкрементального переизвлечения отредактированного текста
+incremental_store = IncrementalStore(max_entries=app.config['INCREMENTAL_MAX_STATES'])
 
-# Загрузка RE модели
-re_model_path = "re_model_v2-20250625T151402Z-1-001/re_model_v2"
-re_tokenizer = AutoTokenizer.from_pretrained(re_model_path)
-re_model = AutoModelForSequenceClassification.from_pretrained(re_model_path)
+# Серверная раскладка диаграммы, координаты кешируются по хешу иерархии
+diagram_layout = LayeredLayout(
+    max_per_row=app.config['LAYOUT_MAX_PER_ROW'],
+    max_cache=app.config['LAYOUT_CACHE_SIZE']
+)
+
+# Диаграммы, редактируемые патчами, по ключу (пользователь, диаграмма)
+diagram_store = DiagramStore(max_entries=app.config['DIAGRAM_MAX_DOCUMENTS'])
 
 # Списки сущностей и отношений
 ENTITY_TYPES = ["SYSTEM", "CONTAINER", "COMPONENT", "ACTOR", "EXTERNAL_SYSTEM", "DATABASE", "QUEUE", "VERB"]
 RELATION_TYPES = ["uses", "contains", "stores_in", "produces", "retrieves_from", 
                  "triggers", "monitors", "delivers_to", "depends_on", "communicates_with", "interacts_with"]
 
+# Допустимые пары типов (head, tail) для каждого отношения
+STRUCTURAL_TYPES = ("SYSTEM", "CONTAINER", "COMPONENT")
+RELATION_SIGNATURES = {
+    "uses": (("ACTOR", "EXTERNAL_SYSTEM") + STRUCTURAL_TYPES,
+             ("EXTERNAL_SYSTEM", "DATABASE", "QUEUE") + STRUCTURAL_TYPES),
+    "contains": (STRUCTURAL_TYPES, ("CONTAINER", "COMPONENT", "DATABASE", "QUEUE", "VERB")),
+    "stores_in": (STRUCTURAL_TYPES, ("DATABASE",)),
+    "produces": (("EXTERNAL_SYSTEM",) + STRUCTURAL_TYPES, ("QUEUE",)),
+    "retrieves_from": (STRUCTURAL_TYPES, ("DATABASE", "QUEUE", "EXTERNAL_SYSTEM")),
+    "triggers": (("ACTOR", "EXTERNAL_SYSTEM", "QUEUE") + STRUCTURAL_TYPES, ("VERB",) + STRUCTURAL_TYPES),
+    "monitors": (("ACTOR",) + STRUCTURAL_TYPES, ("DATABASE", "QUEUE") + STRUCTURAL_TYPES),
+    "delivers_to": (("QUEUE",) + STRUCTURAL_TYPES, ("ACTOR", "EXTERNAL_SYSTEM") + STRUCTURAL_TYPES),
+    "depends_on": (STRUCTURAL_TYPES, ("EXTERNAL_SYSTEM", "DATABASE", "QUEUE") + STRUCTURAL_TYPES),
+    "communicates_with": (("EXTERNAL_SYSTEM",) + STRUCTURAL_TYPES, ("EXTERNAL_SYSTEM",) + STRUCTURAL_TYPES),
+    "interacts_with": (("ACTOR",), ("EXTERNAL_SYSTEM",) + STRUCTURAL_TYPES)
+}
+
+# Порог уверенности и максимальная длина входа RE модели
+RE_CONFIDENCE_THRESHOLD = 0.7
+RE_MAX_LENGTH = 128
+
 # Иерархия C4
 C4_LEVELS = {
     "SYSTEM": 1,
@@ -142,86 +472,299 @@ C4_LEVELS = {
     "VERB": 4
 }
 
-# Создаем пайплайны
-ner_pipeline = pipeline(
-    "token-classification", 
-    model=ner_model, 
-    tokenizer=ner_tokenizer,
-    aggregation_strategy="simple"
+# Генератор пар-кандидатов для RE (по умолчанию только фильтр по уровням C4)
+coreference_index = CoreferenceIndex(app.config['COREFERENCE_THRESHOLD']) if app.config['COREFERENCE'] else None
+
+candidate_generator = CandidateGenerator(
+    max_level_distance=1,
+    sentence_window=app.config['RE_CANDIDATE_SENTENCE_WINDOW'],
+    max_token_distance=app.config['RE_CANDIDATE_MAX_TOKEN_DISTANCE'],
+    allowed_type_pairs=type_pair_allowlist(RELATION_SIGNATURES) if app.config['RE_CANDIDATE_TYPE_FILTER'] else None
 )
 
-def predict_entities(text):
-    """Предсказание сущностей с помощью NER модели"""
-    results = ner_pipeline(text)
-    
+def merge_ner_results(results, offset=0):
+    """Фильтрация и склейка результатов NER пайплайна в сущности.
+    offset сдвигает смещения, если NER запускался на фрагменте текста"""
     entities = []
     for entity in results:
         # Фильтрация и нормализация сущностей
         if entity['entity_group'] in ENTITY_TYPES and entity['word'].strip():
             # Объединение разделенных токенов
-            if entities and entities[-1]['end'] == entity['start'] and entities[-1]['type'] == entity['entity_group']:
+            if entities and entities[-1]['end'] == entity['start'] + offset and entities[-1]['type'] == entity['entity_group']:
                 entities[-1]['text'] += " " + entity['word'].strip()
-                entities[-1]['end'] = entity['end']
+                entities[-1]['end'] = entity['end'] + offset
             else:
                 entity_id = f"ent-{len(entities)}"
                 entity_level = C4_LEVELS.get(entity['entity_group'], 1)
                 entities.append({
                     "text": entity['word'].strip(),
                     "type": entity['entity_group'],
-                    "start": entity['start'],
-                    "end": entity['end'],
+                    "start": entity['start'] + offset,
+                    "end": entity['end'] + offset,
                     "id": entity_id,
                     "level": entity_level
                 })
     
     return entities
 
-def predict_relations(entities, text):
-    """Предсказание отношений с помощью RE модели"""
+def count_forward(model, examples, passes=1):
+    # В воркерах пула счетчики растут в памяти воркера и в /metrics родителя не попадают
+    model_forward.inc(passes, model=model)
+    model_examples.inc(examples, model=model)
+
+def run_ner_batch(texts):
+    """Обработчик батча планировщика NER: один вызов пайплайна на тексты нескольких запросов"""
+    count_forward("ner", len(texts))
+    return models.require().ner_pipeline(texts, batch_size=len(texts))
+
+def ner_chunk_tokens(registry):
+    """Размер фрагмента NER: лимит модели без служебных токенов или меньший NER_CHUNK_TOKENS"""
+    tokenizer = registry.ner_tokenizer
+    limit = min(tokenizer.model_max_length,
+                getattr(registry.ner_model.config, "max_position_embeddings", tokenizer.model_max_length))
+    limit -= tokenizer.num_special_tokens_to_add()
+    if app.config['NER_CHUNK_TOKENS'] > 0:
+        limit = min(app.config['NER_CHUNK_TOKENS'], limit)
+    return max(1, limit)
+
+def plan_ner_chunks(text):
+    """Фрагменты текста для NER (короткий текст -- один фрагмент)"""
+    registry = models.require()
+    offsets = registry.ner_tokenizer(
+        text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+    )["offset_mapping"]
+    return plan_chunks(text, offsets, ner_chunk_tokens(registry), app.config['NER_CHUNK_OVERLAP'])
+
+def run_ner(texts, batch_size=None):
+    """Результаты NER пайплайна для списка текстов: через планировщик или батчами
+    по batch_size, чтобы память не росла с числом текстов"""
+    registry = models.require()
+    if ner_scheduler is not None:
+        return ner_scheduler.map(texts)
+    batch_size = batch_size or app.config['NER_CHUNK_BATCH_SIZE']
+    results = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        results.extend(registry.ner_pipeline(batch, batch_size=len(batch)))
+        count_forward("ner", len(batch))
+    return results
+
+def predict_entities(text):
+    """Предсказание сущностей с помощью NER модели"""
+    return predict_segment_entities([(0, text)])[0]
+
+def predict_segment_entities(segments, batch_size=None):
+    """NER для списка фрагментов (offset, text) одним батчем, смещения глобальные.
+    Длинные фрагменты делятся на перекрывающиеся части по предложениям, сущности
+    частей склеиваются с id ent-N в порядке текста"""
+    plans = [plan_ner_chunks(segment) for _, segment in segments]
+    results = iter(run_ner(
+        [segment[chunk.start:chunk.end] for (_, segment), plan in zip(segments, plans) for chunk in plan],
+        batch_size
+    ))
+    entities = []
+    for (offset, _), plan in zip(segments, plans):
+        if len(plan) == 1:
+            entities.append(merge_ner_results(next(results), offset))
+            continue
+        chunk_entities = [merge_ner_results(next(results), offset + chunk.start) for chunk in plan]
+        entities.append(stitch_entities(chunk_entities, plan, offset))
+    return entities
+
+def build_relation_context(head, tail, text):
+    """Контекст для классификации отношения между парой сущностей"""
+    return f"{head['text']} {tail['text']} in: {text}"
+
+def run_relation_model(inputs, batch_size=None):
+    """Инференс RE модели микробатчами по уже токенизированному паддингованному входу.
+    Возвращает тензоры (confidence, predicted_class) в порядке примеров"""
+    import torch
+
+    re_tokenizer = models.require().re_tokenizer
+    re_model = models.re_model
+    batch_size = batch_size or app.config['RE_BATCH_SIZE']
+    total = inputs["input_ids"].shape[0]
+
+    confidences = []
+    classes = []
+    with torch.inference_mode():
+        for start in range(0, total, batch_size):
+            batch = {key: value[start:start + batch_size] for key, value in inputs.items()}
+            # Обрезаем общий паддинг до самой длинной последовательности микробатча
+            if re_tokenizer.padding_side == "right":
+                length = int(batch["attention_mask"].sum(dim=1).max())
+                batch = {key: value[:, :length] for key, value in batch.items()}
+
+            logits = re_model(**batch).logits
+            count_forward("re", batch["input_ids"].shape[0])
+            probabilities = torch.softmax(logits, dim=1)
+            confidence, predicted_class = torch.max(probabilities, dim=1)
+            confidences.append(confidence)
+            classes.append(predicted_class)
+
+    return torch.cat(confidences), torch.cat(classes)
+
+def score_relation_contexts(contexts, batch_size=None):
+    """Пакетная классификация отношений: одна токенизация всех контекстов"""
+    inputs = models.require().re_tokenizer(
+        contexts,
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=RE_MAX_LENGTH
+    )
+    return run_relation_model(inputs, batch_size)
+
+def score_relation_batch(input_ids):
+    """Обработчик батча планировщика RE: списки id пар разных запросов -> [(confidence, class)]"""
+    inputs = models.require().re_tokenizer.pad(
+        [{"input_ids": ids} for ids in input_ids],
+        padding=True,
+        return_tensors="pt"
+    )
+    confidences, classes = run_relation_model(inputs, batch_size=len(input_ids))
+    return list(zip(confidences.tolist(), classes.tolist()))
+
+# Общие батчи NER и RE для параллельных запросов (INFERENCE_BATCHING=1)
+if app.config['INFERENCE_BATCHING']:
+    ner_scheduler = BatchScheduler(
+        run_ner_batch,
+        max_batch_size=app.config['NER_BATCH_MAX_SIZE'],
+        max_wait_ms=app.config['BATCH_MAX_WAIT_MS'],
+        name="ner-batch-scheduler"
+    )
+    re_scheduler = BatchScheduler(
+        score_relation_batch,
+        max_batch_size=app.config['RE_BATCH_SIZE'],
+        max_wait_ms=app.config['BATCH_MAX_WAIT_MS'],
+        name="re-batch-scheduler"
+    )
+else:
+    ner_scheduler = None
+    re_scheduler = None
+
+def canonicalize_entities(entities, stats=None):
+    """Объединение повторных упоминаний в сущности со списком mentions (до RE)"""
+    if coreference_index is None:
+        return entities
+    coreference_stats = {}
+    with stage_timer(stats, "coreference"):
+        entities = coreference_index.merge(entities, coreference_stats)
+    if stats is not None:
+        stats["coreference"] = coreference_stats
+    return entities
+
+def candidate_pairs(entities, text="", stats=None):
+    """Пары сущностей для RE, отобранные настроенным генератором кандидатов"""
+    return candidate_generator.generate(entities, text, stats)
+
+def iter_scored_pairs(pairs, text, batch_size=None, chunk_size=None):
+    """Классификация пар (head, tail) порциями по chunk_size пар (по умолчанию все сразу).
+    Для каждой порции возвращает (число оцененных пар, отношения порции)"""
+    import torch
+
+    re_tokenizer = models.require().re_tokenizer
+    shared = app.config['RE_SCORING_MODE'] == 'shared' and re_tokenizer.is_fast
+    # Документ токенизируется один раз, входы пар собираются из общих токенов
+    encoding = SharedDocumentEncoding(re_tokenizer, text, max_length=RE_MAX_LENGTH) if shared else None
+    chunk_size = chunk_size or max(len(pairs), 1)
+
+    for chunk_start in range(0, len(pairs), chunk_size):
+        chunk = pairs[chunk_start:chunk_start + chunk_size]
+        if re_scheduler is not None:
+            # Пары уходят в общую очередь и оцениваются в батчах вместе с парами других запросов
+            if shared:
+                input_ids = [encoding.pair_input_ids(head, tail) for head, tail in chunk]
+            else:
+                contexts = [build_relation_context(head, tail, text) for head, tail in chunk]
+                input_ids = re_tokenizer(contexts, truncation=True, max_length=RE_MAX_LENGTH)["input_ids"]
+            scored = re_scheduler.map(input_ids)
+            confidences = torch.tensor([confidence for confidence, _ in scored])
+            classes = torch.tensor([predicted_class for _, predicted_class in scored])
+        elif shared:
+            confidences, classes = run_relation_model(encoding.encode_pairs(chunk), batch_size)
+        else:
+            contexts = [build_relation_context(head, tail, text) for head, tail in chunk]
+            confidences, classes = score_relation_contexts(contexts, batch_size)
+
+        yield chunk_start + len(chunk), accept_relations(chunk, confidences, classes)
+
+def accept_relations(pairs, confidences, classes):
+    """Отношения для пар, предсказания которых прошли порог уверенности (сразу для всего батча)"""
+    import torch
+
+    relations = []
+    accepted = (confidences > RE_CONFIDENCE_THRESHOLD) & (classes < len(RELATION_TYPES))
+    for idx in torch.nonzero(accepted).flatten().tolist():
+        head, tail = pairs[idx]
+        relations.append({
+            "source": head['id'],
+            "target": tail['id'],
+            "type": RELATION_TYPES[classes[idx].item()],
+            "confidence": confidences[idx].item(),
+            "level": min(head['level'], tail['level'])
+        })
+    return relations
+
+def score_entity_pairs(pairs, text, batch_size=None):
+    """Классификация отношений для готового списка пар (head, tail)"""
+    relations = []
+    for _, chunk_relations in iter_scored_pairs(pairs, text, batch_size):
+        relations.extend(chunk_relations)
+    return relations
+
+def predict_relations(entities, text, stats=None, progress=None):
+    """Предсказание отношений с помощью RE модели.
+    В stats (если передан) записывается статистика отбора пар-кандидатов,
+    progress(pairs_scored=..., pairs_total=...) вызывается по мере оценки пар"""
     relations = []
     
     if len(entities) < 2:
         return relations
     
-    # Создаем все возможные пары сущностей
-    for i in range(len(entities)):
-        for j in range(i + 1, len(entities)):
-            head = entities[i]
-            tail = entities[j]
-            
-            # Только если сущности на одном уровне или соседних уровнях
-            if abs(head['level'] - tail['level']) > 1:
-                continue
-                
-            # Создаем контекст для классификации отношений
-            context = f"{head['text']} {tail['text']} in: {text}"
-            inputs = re_tokenizer(
-                context, 
-                return_tensors="pt", 
-                padding=True,
-                truncation=True, 
-                max_length=128
-            )
-            
-            # Предсказание
-            outputs = re_model(**inputs)
-            logits = outputs.logits
-            probabilities = torch.softmax(logits, dim=1)
-            confidence, predicted_class = torch.max(probabilities, dim=1)
-            
-            # Принимаем только предсказания с достаточной уверенностью
-            if confidence.item() > 0.7 and predicted_class.item() < len(RELATION_TYPES):
-                relation_type = RELATION_TYPES[predicted_class.item()]
-                relations.append({
-                    "source": head['id'],
-                    "target": tail['id'],
-                    "type": relation_type,
-                    "confidence": confidence.item(),
-                    "level": min(head['level'], tail['level'])
-                })
+    pairs = candidate_pairs(entities, text, stats)
+    if progress is None:
+        return score_entity_pairs(pairs, text)
     
+    progress(pairs_scored=0, pairs_total=len(pairs))
+    for scored, chunk_relations in iter_scored_pairs(pairs, text, chunk_size=app.config['RE_PROGRESS_CHUNK']):
+        relations.extend(chunk_relations)
+        progress(pairs_scored=scored, pairs_total=len(pairs))
     return relations
 
+def relation_inputs(pairs, text):
+    """Ключи входа RE модели для пар: при одинаковом ключе вход модели тот же.
+    В режиме pair контекст пары -- начало документа (токенизируется отдельно от
+    префикса "<head> <tail> in:", обрезается до RE_MAX_LENGTH), поэтому правка
+    в первых RE_MAX_LENGTH токенах меняет вход всех пар; в режиме shared
+    вход -- окно документа вокруг пары"""
+    if not pairs:
+        return []
+    re_tokenizer = models.require().re_tokenizer
+    if app.config['RE_SCORING_MODE'] == 'shared' and re_tokenizer.is_fast:
+        encoding = SharedDocumentEncoding(re_tokenizer, text, max_length=RE_MAX_LENGTH)
+        return [tuple(encoding.pair_input_ids(head, tail)) for head, tail in pairs]
+    window = tuple(re_tokenizer(
+        text, add_special_tokens=False, truncation=True, max_length=RE_MAX_LENGTH
+    )["input_ids"])
+    return [(head['text'], tail['text'], window) for head, tail in pairs]
+
+# Инкрементальный режим использует те же этапы NER и RE, что и полный прогон
+incremental_extractor = IncrementalExtractor(
+    ner_segments=predict_segment_entities,
+    candidate_pairs=candidate_pairs,
+    score_pairs=score_entity_pairs,
+    relation_inputs=relation_inputs,
+    coreference=coreference_index
+)
+
+def index_by_id(nodes):
+    """Индекс id -> узел; при повторах id остается первый узел"""
+    index = {}
+    for node in nodes:
+        index.setdefault(node["id"], node)
+    return index
+
 def build_c4_hierarchy(entities, relations):
     """Построение иерархии C4 из сущностей и отношений"""
     # Группируем сущности по уровням
@@ -263,7 +806,17 @@ def build_c4_hierarchy(entities, relations):
                 "description": ""
             })
     
+    # Индексы вместо вложенных просмотров: id -> узел родителя (первое вхождение, как при
+    # линейном поиске) и смежность по уровню отношения (уровень, id) -> связанные id
+    # в порядке отношений. Построение иерархии -- O(E + R)
+    adjacency = {}
+    for rel in relations:
+        adjacency.setdefault((rel['level'], rel['source']), []).append(rel['target'])
+        if rel['target'] != rel['source']:
+            adjacency.setdefault((rel['level'], rel['target']), []).append(rel['source'])
+    
     # Уровень 2: Контейнеры и БД
+    systems_by_id = index_by_id(hierarchy["systems"])
     for entity in levels[2]:
         container = {
             "id": entity['id'],
@@ -273,25 +826,15 @@ def build_c4_hierarchy(entities, relations):
         }
         
         # Находим родительскую систему
-        for rel in relations:
-            if rel['source'] == entity['id'] and rel['level'] == 1:
-                for system in hierarchy["systems"]:
-                    if system["id"] == rel['target']:
-                        if "containers" not in system:
-                            system["containers"] = []
-                        system["containers"].append(container)
-                        break
-            elif rel['target'] == entity['id'] and rel['level'] == 1:
-                for system in hierarchy["systems"]:
-                    if system["id"] == rel['source']:
-                        if "containers" not in system:
-                            system["containers"] = []
-                        system["containers"].append(container)
-                        break
+        for parent_id in adjacency.get((1, entity['id']), ()):
+            system = systems_by_id.get(parent_id)
+            if system is not None:
+                system.setdefault("containers", []).append(container)
         
         hierarchy["containers"].append(container)
     
     # Уровень 3: Компоненты
+    containers_by_id = index_by_id(hierarchy["containers"])
     for entity in levels[3]:
         component = {
             "id": entity['id'],
@@ -300,25 +843,15 @@ def build_c4_hierarchy(entities, relations):
         }
         
         # Находим родительский контейнер
-        for rel in relations:
-            if rel['source'] == entity['id'] and rel['level'] == 2:
-                for container in hierarchy["containers"]:
-                    if container["id"] == rel['target']:
-                        if "components" not in container:
-                            container["components"] = []
-                        container["components"].append(component)
-                        break
-            elif rel['target'] == entity['id'] and rel['level'] == 2:
-                for container in hierarchy["containers"]:
-                    if container["id"] == rel['source']:
-                        if "components" not in container:
-                            container["components"] = []
-                        container["components"].append(component)
-                        break
+        for parent_id in adjacency.get((2, entity['id']), ()):
+            container = containers_by_id.get(parent_id)
+            if container is not None:
+                container.setdefault("components", []).append(component)
         
         hierarchy["components"].append(component)
     
     # Уровень 4: Элементы кода (классы, функции)
+    components_by_id = index_by_id(hierarchy["components"])
     for entity in levels[4]:
         code_element = {
             "id": entity['id'],
@@ -327,113 +860,65 @@ def build_c4_hierarchy(entities, relations):
         }
         
         # Находим родительский компонент
-        for rel in relations:
-            if rel['source'] == entity['id'] and rel['level'] == 3:
-                for component in hierarchy["components"]:
-                    if component["id"] == rel['target']:
-                        if "code_elements" not in component:
-                            component["code_elements"] = []
-                        component["code_elements"].append(code_element)
-                        break
-            elif rel['target'] == entity['id'] and rel['level'] == 3:
-                for component in hierarchy["components"]:
-                    if component["id"] == rel['source']:
-                        if "code_elements" not in component:
-                            component["code_elements"] = []
-                        component["code_elements"].append(code_element)
-                        break
+        for parent_id in adjacency.get((3, entity['id']), ()):
+            component = components_by_id.get(parent_id)
+            if component is not None:
+                component.setdefault("code_elements", []).append(code_element)
         
         hierarchy["code_elements"].append(code_element)
     
     return hierarchy
 
-def generate_c4_code(hierarchy, current_level=1):
-    """Рекурсивная генерация кода PlantUML для C4 уровней"""
-    code = ""
+def iter_c4_code(hierarchy, current_level=1):
+    """Генерация кода PlantUML для C4 уровней начиная с current_level.
+    Один проход по иерархии на каждый раздел, код отдается частями (генератор)"""
+    # Уровни ниже первого дают полный документ, как и раньше
+    current_level = max(current_level, 1)
     
     if current_level == 1:
-        code += "@startuml\n"
-        code += "!include https://raw.githubusercontent.com/plantuml-stdlib/C4-PlantUML/master/C4_Context.puml\n"
-        code += "!include https://raw.githubusercontent.com/plantuml-stdlib/C4-PlantUML/master/C4_Container.puml\n"
-        code += "!include https://raw.githubusercontent.com/plantuml-stdlib/C4-PlantUML/master/C4_Component.puml\n\n"
+        yield "@startuml\n"
+        yield "!include https://raw.githubusercontent.com/plantuml-stdlib/C4-PlantUML/master/C4_Context.puml\n"
+        yield "!include https://raw.githubusercontent.com/plantuml-stdlib/C4-PlantUML/master/C4_Container.puml\n"
+        yield "!include https://raw.githubusercontent.com/plantuml-stdlib/C4-PlantUML/master/C4_Component.puml\n\n"
         
         # Системы и акторы
         for system in hierarchy["systems"]:
-            if system.get("type") == "actor":
-                code += f'Person({system["id"]}, "{system["name"]}", "")\n'
-            elif system.get("type") == "external":
-                code += f'System_Ext({system["id"]}, "{system["name"]}", "")\n'
-            else:
-                code += f'System({system["id"]}, "{system["name"]}", "")\n'
+            yield plantuml_system_line(system)
+        
+        yield "\n"
         
-        code += "\n"
+        # Генерируем связи (только для верхнего уровня)
+        yield "\n' Relations\n"
+        for system in hierarchy["systems"]:
+            yield plantuml_relation_lines(system, 1)
+        
+        for container in hierarchy["containers"]:
+            yield plantuml_relation_lines(container, 2)
+        
+        for component in hierarchy["components"]:
+            yield plantuml_relation_lines(component, 3)
     
     # Контейнеры (уровень 2)
-    if current_level == 2:
+    if current_level <= 2:
         for system in hierarchy["systems"]:
-            if "containers" in system and system["containers"]:
-                code += f'System_Boundary({system["id"]}_boundary, "{system["name"]} Boundary") {{\n'
-                
-                for container in system["containers"]:
-                    if container["type"] == "database":
-                        code += f'  ContainerDb({container["id"]}, "{container["name"]}", "")\n'
-                    elif container["type"] == "queue":
-                        code += f'  Queue({container["id"]}, "{container["name"]}", "")\n'
-                    else:
-                        code += f'  Container({container["id"]}, "{container["name"]}", "")\n'
-                
-                code += "}\n\n"
+            yield plantuml_boundary(system, 1)
     
     # Компоненты (уровень 3)
-    if current_level == 3:
+    if current_level <= 3:
         for container in hierarchy["containers"]:
-            if "components" in container and container["components"]:
-                code += f'Container_Boundary({container["id"]}_boundary, "{container["name"]} Components") {{\n'
-                
-                for component in container["components"]:
-                    code += f'  Component({component["id"]}, "{component["name"]}", "")\n'
-                
-                code += "}\n\n"
+            yield plantuml_boundary(container, 2)
     
     # Элементы кода (уровень 4)
-    if current_level == 4:
-        for component in hierarchy["components"]:
-            if "code_elements" in component and component["code_elements"]:
-                code += f'Component_Boundary({component["id"]}_boundary, "{component["name"]} Code") {{\n'
-                
-                for code_elem in component["code_elements"]:
-                    code += f'  Component({code_elem["id"]}, "{code_elem["name"]}", "{code_elem["type"]}")\n'
-                
-                code += "}\n\n"
-    
-    # Генерируем связи
-    if current_level == 1:
-        # Только для верхнего уровня
-        code += "\n' Relations\n"
-        for system in hierarchy["systems"]:
-            if "containers" in system:
-                for container in system["containers"]:
-                    code += f'Rel({system["id"]}, {container["id"]}, "Uses")\n'
-        
-        for container in hierarchy["containers"]:
-            if "components" in container:
-                for component in container["components"]:
-                    code += f'Rel({container["id"]}, {component["id"]}, "Uses")\n'
-        
+    if current_level <= 4:
         for component in hierarchy["components"]:
-            if "code_elements" in component:
-                for code_elem in component["code_elements"]:
-                    code += f'Rel({component["id"]}, {code_elem["id"]}, "Uses")\n'
-    
-    # Рекурсивно генерируем следующий уровень
-    if current_level < 4:
-        next_level_code = generate_c4_code(hierarchy, current_level + 1)
-        code += next_level_code
+            yield plantuml_boundary(component, 3)
     
     if current_level == 1:
-        code += "@enduml"
-    
-    return code
+        yield "@enduml"
+
+def generate_c4_code(hierarchy, current_level=1):
+    """Код PlantUML для C4 уровней (части из iter_c4_code собираются один раз)"""
+    return "".join(iter_c4_code(hierarchy, current_level))
 
 def convert_to_diagram_elements(hierarchy):
     """Преобразование иерархии в элементы диаграммы для ReactFlow"""
@@ -442,95 +927,266 @@ def convert_to_diagram_elements(hierarchy):
     
     # Системы (уровень 1)
     for i, system in enumerate(hierarchy["systems"]):
-        nodes.append({
-            "id": system["id"],
-            "type": "c4",
-            "position": {"x": 100 + i * 300, "y": 100},
-            "data": {
-                "label": system["name"],
-                "entityType": system.get("type", "SYSTEM").upper(),
-                "level": 1
-            }
-        })
+        nodes.append(diagram_node(system, 1, position={"x": 100 + i * 300, "y": 100}))
     
     # Контейнеры (уровень 2)
     container_idx = 0
     for system in hierarchy["systems"]:
         if "containers" in system:
-            for i, container in enumerate(system["containers"]):
-                nodes.append({
-                    "id": container["id"],
-                    "type": "c4",
-                    "position": {"x": 200 + container_idx * 200, "y": 200},
-                    "data": {
-                        "label": container["name"],
-                        "entityType": container["type"].upper(),
-                        "level": 2,
-                        "parent": system["id"]
-                    }
-                })
-                edges.append({
-                    "id": f"edge-{system['id']}-{container['id']}",
-                    "source": system["id"],
-                    "target": container["id"],
-                    "label": "Contains",
-                    "level": 1
-                })
+            for container in system["containers"]:
+                nodes.append(diagram_node(container, 2, system["id"], {"x": 200 + container_idx * 200, "y": 200}))
+                edges.append(diagram_edge(system["id"], container["id"], 1))
                 container_idx += 1
     
     # Компоненты (уровень 3)
     component_idx = 0
     for container in hierarchy["containers"]:
         if "components" in container:
-            for i, component in enumerate(container["components"]):
-                nodes.append({
-                    "id": component["id"],
-                    "type": "c4",
-                    "position": {"x": 300 + component_idx * 150, "y": 300},
-                    "data": {
-                        "label": component["name"],
-                        "entityType": "COMPONENT",
-                        "level": 3,
-                        "parent": container["id"]
-                    }
-                })
-                edges.append({
-                    "id": f"edge-{container['id']}-{component['id']}",
-                    "source": container["id"],
-                    "target": component["id"],
-                    "label": "Contains",
-                    "level": 2
-                })
+            for component in container["components"]:
+                nodes.append(diagram_node(component, 3, container["id"], {"x": 300 + component_idx * 150, "y": 300}))
+                edges.append(diagram_edge(container["id"], component["id"], 2))
                 component_idx += 1
     
     # Элементы кода (уровень 4)
     code_idx = 0
     for component in hierarchy["components"]:
         if "code_elements" in component:
-            for i, code_elem in enumerate(component["code_elements"]):
-                nodes.append({
-                    "id": code_elem["id"],
-                    "type": "c4",
-                    "position": {"x": 400 + code_idx * 120, "y": 400},
-                    "data": {
-                        "label": code_elem["name"],
-                        "entityType": "CODE",
-                        "level": 4,
-                        "parent": component["id"]
-                    }
-                })
-                edges.append({
-                    "id": f"edge-{component['id']}-{code_elem['id']}",
-                    "source": component["id"],
-                    "target": code_elem["id"],
-                    "label": "Implements",
-                    "level": 3
-                })
+            for code_elem in component["code_elements"]:
+                nodes.append(diagram_node(code_elem, 4, component["id"], {"x": 400 + code_idx * 120, "y": 400}))
+                edges.append(diagram_edge(component["id"], code_elem["id"], 3))
                 code_idx += 1
     
+    if app.config['DIAGRAM_LAYOUT'] == 'layered':
+        positions = diagram_layout.positions(nodes, edges, key=LayeredLayout.key_for(hierarchy))
+        for node, position in zip(nodes, positions):
+            node["position"] = dict(position)
+    
     return nodes, edges
 
 
+def extract_graph(text, stats=None, progress=None):
+    """Сущности и отношения для текста (полный прогон NER и RE).
+    progress(**counters) получает число найденных сущностей и оцененных пар"""
+    # Предсказываем сущности
+    with stage_timer(stats, "ner"):
+        entities = predict_entities(text)
+    entities = canonicalize_entities(entities, stats)
+    debug_dump("entities", entities)
+    if progress is not None:
+        progress(entities_found=len(entities))
+    
+    # Предсказываем отношения
+    candidate_stats = {}
+    with stage_timer(stats, "re"):
+        relations = predict_relations(entities, text, candidate_stats, progress)
+    debug_dump("relations", relations)
+    debug_dump("relation_candidates", candidate_stats)
+    if stats is not None:
+        stats["relation_candidates"] = candidate_stats
+    
+    return entities, relations
+
+def build_result(entities, relations, stats=None):
+    """Иерархия C4, PlantUML и элементы диаграммы по сущностям и отношениям"""
+    stats = stats if stats is not None else {}
+    # Строим иерархию C4
+    with stage_timer(stats, "hierarchy"):
+        hierarchy = build_c4_hierarchy(entities, relations)
+    debug_dump("hierarchy", hierarchy)
+    
+    # Генерируем PlantUML код
+    with stage_timer(stats, "plantuml"):
+        plantuml_code = generate_c4_code(hierarchy)
+    debug_dump("plantuml_code", plantuml_code)
+    
+    # Преобразуем в элементы диаграммы
+    with stage_timer(stats, "layout"):
+        nodes, edges = convert_to_diagram_elements(hierarchy)
+    
+    return {
+        "entities": entities,
+        "relations": relations,
+        "hierarchy": hierarchy,
+        "plantuml_code": plantuml_code,
+        "nodes": nodes,
+        "edges": edges,
+        "stats": stats
+    }
+
+def debug_dump(label, payload):
+    """Полный дамп промежуточного результата в журнал, только при PIPELINE_DEBUG_DUMPS=1"""
+    if app.config['PIPELINE_DEBUG_DUMPS']:
+        if not isinstance(payload, str):
+            payload = json.dumps(payload, indent=2, ensure_ascii=False)
+        logger.info("pipeline.%s\n%s", label, payload)
+
+def observe_pipeline(text, result):
+    """Метрики свежего (не из кеша) прогона конвейера по его stats"""
+    stats = result.get("stats") or {}
+    for stage, ms in stats.get("timings_ms", {}).items():
+        stage_latency.observe(ms / 1000.0, stage=stage)
+    document_chars.observe(len(text))
+    document_entities.observe(len(result["entities"]))
+    candidates = stats.get("relation_candidates") or {}
+    for outcome, key in (("scored", "candidate_pairs"), ("pruned_by_distance", "pruned_by_distance"),
+                         ("pruned_by_level", "pruned_by_level"), ("pruned_by_type", "pruned_by_type")):
+        if candidates.get(key):
+            relation_pairs.inc(candidates[key], outcome=outcome)
+    relation_pairs.inc(len(result["relations"]), outcome="accepted")
+    coreference = stats.get("coreference") or {}
+    for match in ("exact", "fuzzy"):
+        if coreference.get(f"{match}_merges"):
+            coreference_merges.inc(coreference[f"{match}_merges"], match=match)
+
+def run_extraction(text):
+    """Полный конвейер: текст -> сущности, отношения, иерархия C4, PlantUML и элементы диаграммы"""
+    stats = {}
+    entities, relations = extract_graph(text, stats)
+    return build_result(entities, relations, stats)
+
+def extract_batch(texts):
+    """Конвейер для нескольких документов: один вызов NER на все тексты и общий
+    батч RE по парам всех документов. Результаты в порядке texts"""
+    models.require()
+    stats = [{} for _ in texts]
+    present = [idx for idx, text in enumerate(texts) if text.strip()]
+
+    started = time.perf_counter()
+    entities = [[] for _ in texts]
+    if present:
+        segments = [(0, texts[idx]) for idx in present]
+        for idx, doc_entities in zip(present, predict_segment_entities(segments, app.config['BULK_BATCH_SIZE'])):
+            entities[idx] = doc_entities
+    # Время общего батча делится между документами поровну
+    ner_ms = 1000.0 * (time.perf_counter() - started) / len(texts)
+    entities = [canonicalize_entities(doc_entities, doc_stats) for doc_entities, doc_stats in zip(entities, stats)]
+
+    started = time.perf_counter()
+    pairs = [
+        candidate_pairs(doc_entities, text, doc_stats.setdefault("relation_candidates", {}))
+        if len(doc_entities) >= 2 else []
+        for doc_entities, text, doc_stats in zip(entities, texts, stats)
+    ]
+    if app.config['RE_SCORING_MODE'] == 'shared':
+        # Общая токенизация строится по документу, такие пары батчатся только внутри документа
+        relations = [score_entity_pairs(doc_pairs, text) if doc_pairs else []
+                     for doc_pairs, text in zip(pairs, texts)]
+    else:
+        contexts = [build_relation_context(head, tail, text)
+                    for doc_pairs, text in zip(pairs, texts) for head, tail in doc_pairs]
+        relations = []
+        if contexts:
+            confidences, classes = score_relation_contexts(contexts)
+        offset = 0
+        for doc_pairs in pairs:
+            end = offset + len(doc_pairs)
+            relations.append(accept_relations(doc_pairs, confidences[offset:end], classes[offset:end])
+                             if doc_pairs else [])
+            offset = end
+    re_ms = 1000.0 * (time.perf_counter() - started) / len(texts)
+
+    results = []
+    for doc_entities, doc_relations, doc_stats in zip(entities, relations, stats):
+        doc_stats.setdefault("timings_ms", {}).update({"ner": ner_ms, "re": re_ms})
+        results.append(build_result(doc_entities, doc_relations, doc_stats))
+    return results
+
+def iter_extraction_events(text, chunk_size=None):
+    """Потоковый конвейер: события (имя, данные) по мере готовности этапов.
+    Сущности -- сразу после NER, отношения -- порциями по мере оценки пар,
+    затем иерархия, PlantUML и элементы диаграммы порциями по chunk_size"""
+    chunk_size = chunk_size or app.config['STREAM_CHUNK_SIZE']
+    cache_key = result_cache.key_for(text, pipeline_settings())
+    result = result_cache.get(cache_key)
+    cached = result is not None
+    stats = {}
+
+    if not cached:
+        with stage_timer(stats, "ner"):
+            entities = predict_entities(text)
+        entities = canonicalize_entities(entities, stats)
+        yield "entities", {"entities": entities}
+
+        relations = []
+        pairs = candidate_pairs(entities, text, stats.setdefault("relation_candidates", {})) \
+            if len(entities) >= 2 else []
+        yield "relations", {"relations": [], "pairs_scored": 0, "pairs_total": len(pairs)}
+        scoring = iter_scored_pairs(pairs, text, chunk_size=app.config['RE_PROGRESS_CHUNK'])
+        while True:
+            # Время RE без времени отправки событий клиенту
+            with stage_timer(stats, "re"):
+                chunk = next(scoring, None)
+            if chunk is None:
+                break
+            scored, chunk_relations = chunk
+            relations.extend(chunk_relations)
+            yield "relations", {"relations": chunk_relations, "pairs_scored": scored, "pairs_total": len(pairs)}
+
+        result = build_result(entities, relations, stats)
+        observe_pipeline(text, result)
+        result_cache.put(cache_key, result)
+    else:
+        # Из кеша: те же события сущностей и отношений, но без вызова моделей
+        yield "entities", {"entities": result["entities"]}
+        pairs_total = (result["stats"].get("relation_candidates") or {}).get("candidate_pairs", 0)
+        yield "relations", {"relations": result["relations"], "pairs_scored": pairs_total, "pairs_total": pairs_total}
+
+    yield "hierarchy", {"hierarchy": result["hierarchy"]}
+    yield "plantuml", {"plantuml_code": result["plantuml_code"]}
+    for start in range(0, max(len(result["nodes"]), 1), chunk_size):
+        yield "nodes", {"nodes": result["nodes"][start:start + chunk_size]}
+    for start in range(0, max(len(result["edges"]), 1), chunk_size):
+        yield "edges", {"edges": result["edges"][start:start + chunk_size]}
+    yield "done", {"stats": result["stats"], "cached": cached}
+
+def start_inference_pool():
+    """Запуск пула воркеров (безопасен из потока запроса: воркеры форкаются сервером форков)"""
+    with inference_pool_lock:
+        if not inference_pool.running:
+            inference_pool.start()
+
+def dispatch_extraction(text):
+    """Полный прогон конвейера в пуле воркеров, если он настроен, иначе в текущем процессе"""
+    if inference_pool is None:
+        return run_extraction(text)
+    if not inference_pool.running:
+        start_inference_pool()
+    return inference_pool.run(run_extraction, text, timeout=app.config['INFERENCE_TIMEOUT'])
+
+def extract_documents(texts):
+    """extract_batch с изоляцией ошибок: если батч падает, документы прогоняются
+    по одному. Возвращает [(результат, None) или (None, ошибка)] в порядке texts"""
+    try:
+        return [(result, None) for result in extract_batch(texts)]
+    except Exception:
+        if len(texts) == 1:
+            return [(None, traceback.format_exc(limit=1).strip().splitlines()[-1])]
+    outcomes = []
+    for text in texts:
+        outcomes.extend(extract_documents([text]))
+    return outcomes
+
+def dispatch_documents(texts):
+    """extract_documents в пуле воркеров, если он настроен, иначе в текущем процессе"""
+    if inference_pool is None:
+        return extract_documents(texts)
+    if not inference_pool.running:
+        start_inference_pool()
+    return inference_pool.run(extract_documents, texts, timeout=app.config['INFERENCE_TIMEOUT'])
+
+def pipeline_settings():
+    """Настройки конвейера, влияющие на результат (входят в ключ кеша)"""
+    return {
+        "ner_chunk_tokens": app.config['NER_CHUNK_TOKENS'],
+        "ner_chunk_overlap": app.config['NER_CHUNK_OVERLAP'],
+        "coreference_threshold": app.config['COREFERENCE_THRESHOLD'] if app.config['COREFERENCE'] else None,
+        "re_scoring_mode": app.config['RE_SCORING_MODE'],
+        "re_candidate_sentence_window": app.config['RE_CANDIDATE_SENTENCE_WINDOW'],
+        "re_candidate_max_token_distance": app.config['RE_CANDIDATE_MAX_TOKEN_DISTANCE'],
+        "re_candidate_type_filter": app.config['RE_CANDIDATE_TYPE_FILTER']
+    }
+
+
 # Защищенные эндпоинты
 @app.route('/process', methods=['POST'])
 @token_required
@@ -539,33 +1195,52 @@ def process_text(current_user):
     text = data.get('text', '')
     
     try:
-        # Предсказываем сущности
-        entities = predict_entities(text)
-        print("Predicted entities:", json.dumps(entities, indent=2, ensure_ascii=False))
-        
-        # Предсказываем отношения
-        relations = predict_relations(entities, text)
-        print("Predicted relations:", json.dumps(relations, indent=2, ensure_ascii=False))
-        
-        # Строим иерархию C4
-        hierarchy = build_c4_hierarchy(entities, relations)
-        print("C4 Hierarchy:", json.dumps(hierarchy, indent=2, ensure_ascii=False))
-        
-        # Генерируем PlantUML код
-        plantuml_code = generate_c4_code(hierarchy)
-        print("Generated PlantUML code:\n", plantuml_code)
-        
-        # Преобразуем в элементы диаграммы
-        nodes, edges = convert_to_diagram_elements(hierarchy)
+        # Повторная отправка того же текста отдается из кеша
+        cache_key = result_cache.key_for(text, pipeline_settings())
+        result = result_cache.get(cache_key)
+        cached = result is not None
+        # Инкрементальный результат приближенный и не кешируется под ключом полного прогона
+        approximate = False
+        if data.get('incremental'):
+            # Переизвлечение только измененных предложений относительно прошлой версии
+            state_key = (current_user.id, data.get('diagram_id', 'default'))
+            if cached:
+                # Состояние сохраняется и при попадании в кеш: следующая правка будет инкрементальной
+                state = ExtractionState(text, result["entities"], result["relations"])
+            else:
+                previous = incremental_store.get(state_key)
+                stats = {}
+                if previous is not None:
+                    incremental_stats = {}
+                    with stage_timer(stats, "incremental"):
+                        state = incremental_extractor.update(previous, text, incremental_stats)
+                    stats["incremental"] = incremental_stats
+                    approximate = True
+                else:
+                    entities, relations = extract_graph(text, stats)
+                    state = ExtractionState(text, entities, relations)
+                result = build_result(state.entities, state.relations, stats)
+            incremental_store.put(state_key, state)
+        elif not cached:
+            result = dispatch_extraction(text)
+        if not cached:
+            observe_pipeline(text, result)
+            if not approximate:
+                result_cache.put(cache_key, result)
         
         return jsonify({
             "success": True,
-            "hierarchy": hierarchy,
-            "plantuml_code": plantuml_code,
-            "nodes": nodes,
-            "edges": edges
+            **result,
+            "cached": cached
         })
         
+    except ModelsWarmingUp as e:
+        # Модели еще загружаются: быстрый ответ, клиент повторит запрос позже
+        return jsonify({
+            "success": False,
+            "status": "warming_up",
+            "error": str(e)
+        }), 503, {"Retry-After": "5"}
     except Exception as e:
         return jsonify({
             "success": False,
@@ -573,10 +1248,508 @@ def process_text(current_user):
             "traceback": traceback.format_exc()
         })
 
+@app.route('/process/stream', methods=['POST'])
+@token_required
+def process_text_stream(current_user):
+    data = request.json
+    text = data.get('text', '')
+    # NDJSON по умолчанию, Server-Sent Events -- по ?format=sse или Accept: text/event-stream
+    use_sse = request.args.get('format') == 'sse' or \
+        request.accept_mimetypes.best == 'text/event-stream'
+    
+    try:
+        models.require()
+    except ModelsWarmingUp as e:
+        return jsonify({
+            "success": False,
+            "status": "warming_up",
+            "error": str(e)
+        }), 503, {"Retry-After": "5"}
+    
+    def generate():
+        try:
+            for event, payload in iter_extraction_events(text):
+                if use_sse:
+                    yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                else:
+                    yield json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+        except Exception as e:
+            error = {"error": str(e), "traceback": traceback.format_exc()}
+            if use_sse:
+                yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            else:
+                yield json.dumps({"event": "error", **error}) + "\n"
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/process/bulk', methods=['POST'])
+@token_required
+def process_bulk(current_user):
+    """Пакет документов: NDJSON строка на документ по мере готовности батчей и итог со скоростью"""
+    data = request.json or {}
+    documents = data.get('documents')
+    output_format = data.get('format', 'jsonl')
+    if not isinstance(documents, list) or not documents:
+        return jsonify({"success": False, "error": "documents must be a non-empty list"}), 400
+    if len(documents) > app.config['BULK_MAX_DOCUMENTS']:
+        return jsonify({
+            "success": False,
+            "error": f"At most {app.config['BULK_MAX_DOCUMENTS']} documents per request"
+        }), 413
+    if output_format not in OUTPUT_FORMATS:
+        return jsonify({"success": False, "error": f"format must be one of {', '.join(OUTPUT_FORMATS)}"}), 400
+    items = []
+    for idx, document in enumerate(documents):
+        if isinstance(document, str):
+            document = {"text": document}
+        if not isinstance(document, dict) or not isinstance(document.get('text', ''), str):
+            return jsonify({"success": False, "error": f"Document {idx} must be a string or {{id, text}}"}), 400
+        items.append((str(document.get('id', idx)), document.get('text', '')))
+    
+    try:
+        models.require()
+    except ModelsWarmingUp as e:
+        return jsonify({
+            "success": False,
+            "status": "warming_up",
+            "error": str(e)
+        }), 503, {"Retry-After": "5"}
+    
+    def generate():
+        meter = ThroughputMeter()
+        settings = pipeline_settings()
+        for batch in batched(items, app.config['BULK_BATCH_SIZE']):
+            keys = [result_cache.key_for(text, settings) for _, text in batch]
+            outcomes = [(result_cache.get(key), None) for key in keys]
+            cached = [result is not None for result, _ in outcomes]
+            # Кешированные документы не отправляются на инференс, остальные идут одним батчем
+            missing = [idx for idx, hit in enumerate(cached) if not hit]
+            if missing:
+                for idx, outcome in zip(missing, dispatch_documents([batch[idx][1] for idx in missing])):
+                    outcomes[idx] = outcome
+            for (doc_id, text), key, hit, (result, error) in zip(batch, keys, cached, outcomes):
+                meter.add(text, failed=error is not None)
+                if error is not None:
+                    yield json.dumps({"id": doc_id, "success": False, "error": error}, ensure_ascii=False) + "\n"
+                    continue
+                if not hit:
+                    observe_pipeline(text, result)
+                    result_cache.put(key, result)
+                record = document_record(doc_id, result, output_format)
+                yield json.dumps({**record, "success": True, "cached": hit}, ensure_ascii=False) + "\n"
+        yield json.dumps({"event": "done", **meter.stats()}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def execute_job(job_id):
+    """Выполнение задачи извлечения в рабочем потоке с сохранением прогресса в БД"""
+    with app.app_context():
+        # Задачу забирает только один воркер: queued -> running
+        now = datetime.datetime.now()
+        claimed = ExtractionJob.query.filter_by(id=job_id, status='queued').update(
+            {"status": "running", "started_at": now, "heartbeat_at": now})
+        db.session.commit()
+        if not claimed:
+            return
+        job = db.session.get(ExtractionJob, job_id)
+        last_commit = time.monotonic()
+
+        def progress(**counters):
+            nonlocal last_commit
+            for key, value in counters.items():
+                setattr(job, key, value)
+            # Прогресс пишется в БД не чаще двух раз в секунду
+            if time.monotonic() - last_commit >= 0.5:
+                db.session.commit()
+                last_commit = time.monotonic()
+
+        try:
+            # В рабочем потоке ждем окончания загрузки моделей вместо ответа "warming up"
+            models.load()
+            cache_key = result_cache.key_for(job.text, pipeline_settings())
+            result = result_cache.get(cache_key)
+            if result is None:
+                stats = {}
+                entities, relations = extract_graph(job.text, stats, progress)
+                result = build_result(entities, relations, stats)
+                observe_pipeline(job.text, result)
+                result_cache.put(cache_key, result)
+            job.result = compress_payload(result)
+            job.status = 'done'
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ExtractionJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.datetime.now()
+        db.session.commit()
+
+def requeue_stale_jobs():
+    """Задачи running без отметки дольше JOB_STALE_SECONDS -- брошенные упавшим процессом -- снова
+    в очереди. Задачи живых процессов (в том числе других воркеров gunicorn) не трогаются"""
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=app.config['JOB_STALE_SECONDS'])
+    stale = ExtractionJob.query.filter(
+        ExtractionJob.status == 'running',
+        db.or_(
+            ExtractionJob.heartbeat_at < cutoff,
+            db.and_(ExtractionJob.heartbeat_at.is_(None), ExtractionJob.started_at < cutoff)
+        )
+    ).update({"status": "queued"}, synchronize_session=False)
+    db.session.commit()
+    if stale:
+        logger.warning("jobs.requeued_stale count=%s", stale)
+    return stale
+
+def submit_queued_jobs():
+    """Постановка в очередь этого процесса всех задач queued (забирает задачу только один воркер)"""
+    pending = db.session.query(ExtractionJob.id).filter_by(status='queued').order_by(ExtractionJob.created_at)
+    for (job_id,) in pending:
+        job_runner.submit(job_id)
+
+def job_heartbeat(job_ids):
+    """Отметка выполняемых задач процесса и подбор задач, брошенных другими процессами"""
+    with app.app_context():
+        try:
+            if job_ids:
+                ExtractionJob.query.filter(ExtractionJob.id.in_(job_ids), ExtractionJob.status == 'running') \
+                    .update({"heartbeat_at": datetime.datetime.now()}, synchronize_session=False)
+                db.session.commit()
+            if requeue_stale_jobs():
+                submit_queued_jobs()
+        except QueueFull:
+            logger.warning("jobs.resume_deferred reason=queue_full")
+        except Exception as e:
+            db.session.rollback()
+            logger.error("jobs.heartbeat_failed error=%s", e)
+
+job_runner = JobRunner(execute_job, workers=app.config['JOB_WORKERS'], max_queue=app.config['JOB_QUEUE_SIZE'],
+                       heartbeat=job_heartbeat, heartbeat_interval=app.config['JOB_HEARTBEAT_SECONDS'])
+jobs_resumed = threading.Event()
+
+def resume_jobs():
+    """Повторная постановка в очередь задач, не завершенных до перезапуска: queued и брошенных running"""
+    if jobs_resumed.is_set():
+        return
+    jobs_resumed.set()
+    try:
+        # Пул запускается сразу, чтобы отметки и подбор брошенных задач шли и без новых задач
+        job_runner.start()
+        requeue_stale_jobs()
+        submit_queued_jobs()
+    except QueueFull:
+        logger.warning("jobs.resume_deferred reason=queue_full")
+    except Exception as e:
+        db.session.rollback()
+        logger.error("jobs.resume_failed error=%s", e)
+
+@app.route('/jobs', methods=['POST'])
+@token_required
+def submit_job(current_user):
+    data = request.json
+    text = data.get('text', '')
+    
+    job = ExtractionJob(user_id=current_user.id, text=text)
+    db.session.add(job)
+    db.session.commit()
+    
+    try:
+        job_runner.submit(job.id)
+    except QueueFull as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = datetime.datetime.now()
+        db.session.commit()
+        return jsonify({'error': str(e)}), 429
+    
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    with db.session.no_autoflush:
+        job = db.session.get(ExtractionJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.to_dict(include_result=job.status == 'done'))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@token_required
+def job_events(current_user, job_id):
+    job = db.session.get(ExtractionJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def events():
+        # Server-Sent Events: прогресс при каждом изменении, в конце -- итоговый статус
+        last = None
+        while True:
+            db.session.rollback()
+            current = db.session.get(ExtractionJob, job_id, populate_existing=True)
+            data = current.to_dict()
+            if data != last:
+                yield f"data: {json.dumps(data)}\n\n"
+                last = data
+            if current.status in ('done', 'failed'):
+                break
+            time.sleep(0.5)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def diagram_content(data):
+    """Содержимое версии диаграммы из тела запроса. Иерархия и PlantUML
+    достраиваются по сущностям и отношениям, если клиент их не прислал"""
+    entities = data.get('entities') or []
+    relations = data.get('relations') or []
+    hierarchy = data.get('hierarchy')
+    if hierarchy is None:
+        if not entities:
+            raise ValueError("Either hierarchy or entities is required")
+        hierarchy = build_c4_hierarchy(entities, relations)
+    plantuml_code = data.get('plantuml_code') or generate_c4_code(hierarchy)
+    return {
+        "text": data.get('text', ''),
+        "entities": entities,
+        "relations": relations,
+        "hierarchy": hierarchy,
+        "plantuml_code": plantuml_code
+    }
+
+def content_hash(content):
+    """Хеш содержимого версии (канонический JSON)"""
+    material = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+@app.route('/diagrams', methods=['GET'])
+@token_required
+def list_diagrams(current_user):
+    query = db.select(Diagram).where(Diagram.owner_id == current_user.id)
+    if request.args.get('content_hash'):
+        query = query.where(Diagram.content_hash == request.args['content_hash'])
+    with db.session.no_autoflush:
+        diagrams = db.session.execute(query.order_by(Diagram.updated_at.desc())).scalars().all()
+    
+    return jsonify({"diagrams": [diagram.to_dict() for diagram in diagrams]})
+
+@app.route('/diagrams', methods=['POST'])
+@token_required
+def create_diagram(current_user):
+    data = request.json
+    try:
+        content = diagram_content(data)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f'Invalid diagram: {e}'}), 400
+    
+    digest = content_hash(content)
+    diagram = Diagram(
+        owner_id=current_user.id,
+        name=data.get('name') or 'Untitled',
+        current_version=1,
+        content_hash=digest
+    )
+    db.session.add(diagram)
+    db.session.flush()
+    db.session.add(DiagramVersion(
+        diagram_id=diagram.id,
+        version=1,
+        content_hash=digest,
+        payload=compress_payload(content)
+    ))
+    db.session.commit()
+    
+    return jsonify(diagram.to_dict()), 201
+
+@app.route('/diagrams/<int:diagram_id>/versions', methods=['POST'])
+@token_required
+def save_diagram_version(current_user, diagram_id):
+    diagram = db.session.get(Diagram, diagram_id)
+    if diagram is None or diagram.owner_id != current_user.id:
+        return jsonify({'error': 'Diagram not found'}), 404
+    
+    data = request.json
+    try:
+        content = diagram_content(data)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f'Invalid diagram: {e}'}), 400
+    
+    # То же содержимое, что и в текущей версии, новую версию не создает
+    digest = content_hash(content)
+    if digest == diagram.content_hash:
+        return jsonify({**diagram.to_dict(), "unchanged": True})
+    
+    diagram.current_version += 1
+    diagram.content_hash = digest
+    diagram.updated_at = datetime.datetime.now()
+    if data.get('name'):
+        diagram.name = data['name']
+    db.session.add(DiagramVersion(
+        diagram_id=diagram.id,
+        version=diagram.current_version,
+        content_hash=digest,
+        payload=compress_payload(content)
+    ))
+    db.session.commit()
+    
+    return jsonify(diagram.to_dict()), 201
+
+@app.route('/diagrams/<int:diagram_id>', methods=['GET'])
+@token_required
+def open_diagram(current_user, diagram_id):
+    # Диаграмма и нужная версия одним запросом по первичному ключу и (diagram_id, version)
+    query = db.select(Diagram, DiagramVersion).join(
+        DiagramVersion, DiagramVersion.diagram_id == Diagram.id
+    ).where(Diagram.id == diagram_id, Diagram.owner_id == current_user.id)
+    version = request.args.get('version', type=int)
+    if version is not None:
+        query = query.where(DiagramVersion.version == version)
+    else:
+        query = query.where(DiagramVersion.version == Diagram.current_version)
+    with db.session.no_autoflush:
+        row = db.session.execute(query).first()
+    if row is None:
+        return jsonify({'error': 'Diagram not found'}), 404
+    
+    diagram, diagram_version = row
+    content = decompress_payload(diagram_version.payload)
+    # Версии из /update-diagram хранят узлы с позициями после патчей
+    if content.get("nodes") is not None and content.get("edges") is not None:
+        nodes, edges = content["nodes"], content["edges"]
+    else:
+        nodes, edges = convert_to_diagram_elements(content["hierarchy"])
+    
+    return jsonify({
+        **diagram.to_dict(),
+        "version": diagram_version.version,
+        "latest_version": diagram.current_version,
+        **content,
+        "nodes": nodes,
+        "edges": edges
+    })
+
+@app.route('/diagrams/<int:diagram_id>', methods=['DELETE'])
+@token_required
+def delete_diagram(current_user, diagram_id):
+    diagram = db.session.get(Diagram, diagram_id)
+    if diagram is None or diagram.owner_id != current_user.id:
+        return jsonify({'error': 'Diagram not found'}), 404
+    
+    db.session.execute(db.delete(DiagramVersion).where(DiagramVersion.diagram_id == diagram.id))
+    db.session.delete(diagram)
+    db.session.commit()
+    
+    return jsonify({"success": True})
+
+def resolve_diagram(user_id, diagram_id, create=False):
+    """Диаграмма /update-diagram: число -- id сохраненной диаграммы пользователя, строка --
+    имя рабочей диаграммы (без diagram_id -- 'default'); рабочая диаграмма создается при create"""
+    diagram_id = diagram_id or 'default'
+    if isinstance(diagram_id, int) or str(diagram_id).isdigit():
+        diagram = db.session.get(Diagram, int(diagram_id))
+        return diagram if diagram is not None and diagram.owner_id == user_id else None
+    diagram = db.session.execute(
+        db.select(Diagram).where(Diagram.owner_id == user_id, Diagram.name == str(diagram_id))
+        .order_by(Diagram.id).limit(1)
+    ).scalar()
+    if diagram is None and create:
+        diagram = Diagram(owner_id=user_id, name=str(diagram_id), current_version=0, content_hash='')
+        db.session.add(diagram)
+        db.session.flush()
+    return diagram
+
+def load_diagram_document(diagram):
+    """Документ патчей для текущей версии диаграммы (из памяти процесса или из БД)"""
+    key = (diagram.owner_id, diagram.id)
+    document = diagram_store.get(key)
+    # Документ в памяти устарел, если версию продвинул другой процесс
+    if document is not None and document.version == diagram.current_version:
+        return document
+    row = db.session.execute(db.select(DiagramVersion).where(
+        DiagramVersion.diagram_id == diagram.id, DiagramVersion.version == diagram.current_version
+    )).scalar()
+    if row is None:
+        return None
+    content = decompress_payload(row.payload)
+    nodes, edges = content.get("nodes"), content.get("edges")
+    if nodes is None or edges is None:
+        nodes, edges = convert_to_diagram_elements(content["hierarchy"])
+    source = {name: content.get(name) for name in ("text", "entities", "relations")}
+    document = DiagramDocument(content["hierarchy"], nodes, edges, version=row.version, source=source)
+    diagram_store.put(key, document)
+    return document
+
+def store_diagram_version(diagram, base_version, content):
+    """Новая версия диаграммы поверх base_version. False, если версию уже продвинул
+    другой процесс (условное обновление current_version или уникальность версии)"""
+    digest = content_hash(content)
+    updated = db.session.execute(
+        db.update(Diagram)
+        .where(Diagram.id == diagram.id, Diagram.current_version == base_version)
+        .values(current_version=base_version + 1, content_hash=digest, updated_at=datetime.datetime.now())
+    ).rowcount
+    if not updated:
+        db.session.rollback()
+        return False
+    db.session.add(DiagramVersion(
+        diagram_id=diagram.id,
+        version=base_version + 1,
+        content_hash=digest,
+        payload=compress_payload(content)
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
 @app.route('/update-diagram', methods=['POST'])
 @token_required
 def update_diagram(current_user):
     data = request.json
+    diagram_id = data.get('diagram_id')
+    
+    # Патч: операции против версии диаграммы, хранящейся в БД (Diagram/DiagramVersion)
+    if 'ops' in data:
+        diagram = resolve_diagram(current_user.id, diagram_id)
+        document = load_diagram_document(diagram) if diagram is not None else None
+        if document is None:
+            return jsonify({
+                "success": False,
+                "error": "Unknown diagram, send the full hierarchy first"
+            }), 404
+        key = (current_user.id, diagram.id)
+        try:
+            with document.lock:
+                base_version = document.version
+                delta = document.apply(data['ops'], data.get('version'))
+                snapshot = document.snapshot()
+                content = {
+                    **document.source,
+                    **snapshot,
+                    "plantuml_code": generate_c4_code(snapshot["hierarchy"])
+                }
+                if not store_diagram_version(diagram, base_version, content):
+                    # Версию продвинул другой процесс: документ в памяти больше не годится
+                    diagram_store.discard(key)
+                    raise VersionConflict(f"Diagram version {base_version} was superseded, reload the diagram")
+        except VersionConflict as e:
+            db.session.rollback()
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "version": db.session.get(Diagram, diagram.id).current_version
+            }), 409
+        except PatchError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        return jsonify({"success": True, "diagram_id": diagram.id, **delta})
+    
     hierarchy = data.get('hierarchy', {})
     
     try:
@@ -586,14 +1759,42 @@ def update_diagram(current_user):
         # Преобразование в элементы диаграммы
         nodes, edges = convert_to_diagram_elements(hierarchy)
         
-        return jsonify({
+        response = {
             "success": True,
             "plantuml_code": plantuml_code,
             "nodes": nodes,
             "edges": edges
-        })
+        }
+        
+        # Иерархия сохраняется новой версией диаграммы -- базой для патчей из любого процесса
+        # (без diagram_id -- рабочая диаграмма 'default', ее же ищет ветка патчей)
+        diagram = resolve_diagram(current_user.id, diagram_id, create=True)
+        if diagram is None:
+            return jsonify({"success": False, "error": "Diagram not found"}), 404
+        source = {
+            "text": data.get('text', ''),
+            "entities": data.get('entities') or [],
+            "relations": data.get('relations') or []
+        }
+        content = {**source, "hierarchy": hierarchy, "plantuml_code": plantuml_code, "nodes": nodes, "edges": edges}
+        if content_hash(content) != diagram.content_hash:
+            if not store_diagram_version(diagram, diagram.current_version, content):
+                return jsonify({
+                    "success": False,
+                    "error": "Diagram was updated concurrently, retry"
+                }), 409
+        else:
+            db.session.commit()
+        document = DiagramDocument(hierarchy, nodes, edges, version=diagram.current_version, source=source)
+        diagram_store.put((current_user.id, diagram.id), document)
+        response["diagram_id"] = diagram.id
+        response["version"] = document.version
+        response["plantuml_fragments"] = document.fragments()
+        
+        return jsonify(response)
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             "success": False,
             "error": str(e)
@@ -605,18 +1806,91 @@ def parse_plantuml(current_user):
     data = request.json
     code = data.get('code', '')
     
-    # В реальной реализации здесь будет парсинг PlantUML
-    # Для демонстрации вернем фиктивные данные
+    try:
+        hierarchy, relations = parse_c4_plantuml(code)
+    except PlantUMLSyntaxError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    
+    nodes, edges = convert_to_diagram_elements(hierarchy)
+    # Связи Rel, не описывающие вложение, показываются отдельными ребрами
+    for idx, relation in enumerate(relations):
+        edges.append({
+            "id": f"rel-{idx}-{relation['source']}-{relation['target']}",
+            "source": relation["source"],
+            "target": relation["target"],
+            "label": relation["label"]
+        })
+    
     return jsonify({
-        "nodes": [
-            {"id": "sys1", "type": "c4", "data": {"label": "System 1", "entityType": "SYSTEM"}},
-            {"id": "db1", "type": "c4", "data": {"label": "Database", "entityType": "DATABASE"}}
-        ],
-        "edges": [
-            {"id": "edge1", "source": "sys1", "target": "db1", "label": "uses"}
-        ]
+        "success": True,
+        "hierarchy": hierarchy,
+        "relations": relations,
+        "nodes": nodes,
+        "edges": edges
+    })
+
+@app.route('/status', methods=['GET'])
+def status():
+    return jsonify({
+        "models": models.status(),
+        "inference_pool": {
+            "workers": inference_pool.workers,
+            "running": inference_pool.running,
+            "memory": inference_pool.memory()
+        } if inference_pool is not None else None,
+        "batching": {
+            "ner": ner_scheduler.stats(),
+            "re": re_scheduler.stats()
+        } if ner_scheduler is not None else None,
+        "jobs": job_runner.stats(),
+        "result_cache": result_cache.stats(),
+        "auth": token_cache.stats(),
+        "password_hashing": password_hasher.stats()
     })
 
+def cache_samples(counter):
+    """Колбэк метрики кешей: значение counter из stats() кеша результатов и кеша токенов"""
+    def samples():
+        return [
+            ({"cache": "result"}, result_cache.stats()[counter]),
+            ({"cache": "auth"}, token_cache.stats()[counter])
+        ]
+    return samples
+
+metrics.callback('cache_hits_total', 'Cache hits', 'counter', cache_samples('hits'))
+metrics.callback('cache_misses_total', 'Cache misses', 'counter', cache_samples('misses'))
+metrics.callback('cache_entries', 'Cache entries', 'gauge', cache_samples('entries'))
+metrics.callback('result_cache_persistent_hits_total', 'Result cache hits served from the database', 'counter',
+                 lambda: [({}, result_cache.stats()['persistent_hits'])])
+metrics.callback('job_queue_depth', 'Extraction jobs waiting for a worker', 'gauge',
+                 lambda: [({}, job_runner.stats()['queue_depth'])])
+metrics.callback('models_ready', 'Whether the NER/RE models are loaded', 'gauge',
+                 lambda: [({"backend": models.backend}, int(models.ready))])
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Метка endpoint -- шаблон маршрута, а не путь: число рядов не растет с числом id
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    started = g.get('request_started')
+    if started is not None:
+        # Для потоковых ответов это время до начала отправки тела
+        http_latency.observe(time.perf_counter() - started, method=request.method, endpoint=endpoint)
+    http_requests.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    if request.content_length:
+        http_request_size.observe(request.content_length, endpoint=endpoint)
+    return response
+
 @app.route('/ai-assistant', methods=['POST'])
 @token_required
 def ai_assistant(current_user):
@@ -625,7 +1899,7 @@ def ai_assistant(current_user):
     current_diagram = data.get('currentDiagram', {})
     current_code = data.get('currentCode', '')
     
-    print(f"AI Assistant request: {action}")
+    logger.info("ai_assistant.request action=%s user_id=%s", action, current_user.id)
     
     # Здесь будет реальная интеграция с ИИ
     # Пока вернем фиктивный ответ
@@ -667,11 +1941,109 @@ def ai_assistant(current_user):
         "code": new_code
     })
 
+@app.before_request
+def warm_models():
+    # Фоновый прогрев моделей стартует с первым запросом к серверу, а не при импорте,
+    # чтобы CLI команды и миграции не загружали модели
+    if models.mode == 'background' and not models.ready:
+        models.warm_async()
+    # Незавершенные до перезапуска задачи снова ставятся в очередь
+    if not jobs_resumed.is_set():
+        resume_jobs()
+
 @app.cli.command("init-db")
 def init_db_command():
     """Initialize the database."""
     db.create_all()
     print("Database initialized.")
 
+@app.cli.command("process-corpus")
+@click.argument("source", type=click.Path(exists=True))
+@click.option("--output", required=True, help="JSONL file, or a directory for --format plantuml")
+@click.option("--format", "output_format", type=click.Choice(OUTPUT_FORMATS), default="jsonl")
+@click.option("--workers", type=int, default=0, help="Worker processes (0: run in this process)")
+@click.option("--batch-size", type=int, default=None, help="Documents per batch (default: BULK_BATCH_SIZE)")
+@click.option("--checkpoint", default=None, help="File of completed ids (default: <output>.checkpoint)")
+@click.option("--resume/--no-resume", default=True, help="Skip documents listed in the checkpoint")
+@click.option("--report-every", type=int, default=50, help="Progress line every N documents")
+def process_corpus_command(source, output, output_format, workers, batch_size, checkpoint, resume, report_every):
+    """Convert a directory or JSONL file of texts into C4 diagrams."""
+    if batch_size:
+        app.config['BULK_BATCH_SIZE'] = batch_size
+    # Воркеры загружают модели в сервере форков, в этом процессе они нужны только без пула
+    pool = create_inference_pool(workers, BULK_BATCH_SIZE=str(app.config['BULK_BATCH_SIZE'])) \
+        if workers > 0 else None
+    if pool is None:
+        models.load()
+    checkpoint = Checkpoint(checkpoint or output.rstrip(os.sep) + '.checkpoint', resume=resume)
+    writer = ResultWriter(output, output_format, resume=resume)
+    meter = ThroughputMeter()
+    if pool is not None:
+        pool.start()
+    pending = []
+    next_report = report_every
+
+    def finish(batch, outcomes):
+        nonlocal next_report
+        for (doc_id, text), (result, error) in zip(batch, outcomes):
+            meter.add(text, failed=error is not None)
+            if error is not None:
+                # Документ не попадает в контрольную точку и будет повторен при следующем запуске
+                logger.warning("corpus.document_failed id=%s error=%s", doc_id, error)
+                continue
+            writer.write(doc_id, result)
+            checkpoint.mark(doc_id)
+        if meter.documents >= next_report:
+            next_report = meter.documents + report_every
+            progress = meter.stats()
+            print(f"{progress['documents']} documents, {progress['failed']} failed, "
+                  f"{progress['docs_per_sec']:.2f} docs/sec")
+
+    def documents():
+        for doc_id, text in iter_documents(source):
+            if doc_id in checkpoint:
+                meter.skipped += 1
+            else:
+                yield doc_id, text
+
+    try:
+        for batch in batched(documents(), app.config['BULK_BATCH_SIZE']):
+            texts = [text for _, text in batch]
+            if pool is None:
+                finish(batch, extract_documents(texts))
+                continue
+            # Не больше двух батчей в очереди на воркер; результаты пишутся в порядке источника
+            pending.append((batch, pool.submit(extract_documents, texts)))
+            while len(pending) > 2 * workers:
+                done_batch, outcome = pending.pop(0)
+                finish(done_batch, outcome.get())
+        for done_batch, outcome in pending:
+            finish(done_batch, outcome.get())
+    finally:
+        if pool is not None:
+            pool.stop()
+        writer.close()
+        checkpoint.close()
+
+    summary = meter.stats()
+    print(f"Processed {summary['documents']} documents ({summary['failed']} failed, "
+          f"{summary['skipped']} skipped from checkpoint) in {summary['seconds']:.1f}s: "
+          f"{summary['docs_per_sec']:.2f} docs/sec, {summary['chars_per_sec']:.0f} chars/sec")
+
+@app.cli.command("convert-models")
+@click.option("--output", default=None, help="Output directory (default: ONNX_MODEL_DIR)")
+@click.option("--quantize/--no-quantize", default=True, help="Also write int8 ONNX models")
+def convert_models_command(output, quantize):
+    """Export the NER and RE models to ONNX for INFERENCE_BACKEND=onnx/onnx-int8."""
+    # Экспорт всегда из fp32 PyTorch моделей, независимо от текущего бэкенда
+    source = ModelRegistry(ner_model_path, re_model_path, mode='lazy').load()
+    for path in convert_models(source, output or app.config['ONNX_MODEL_DIR'], quantize=quantize):
+        print(f"Wrote {path}")
+
 if __name__ == '__main__':
+    if inference_pool is not None:
+        # Пул стартует до запуска сервера, чтобы первый запрос не ждал загрузки моделей воркерами
+        inference_pool.start()
+    elif models.mode == 'background':
+        models.warm_async()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
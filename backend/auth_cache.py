@@ -0,0 +1,118 @@
+"""Кеш проверенных JWT токенов для token_required.
+
+Токен -> снимок пользователя (id, username) живет не дольше ttl секунд и не
+дольше срока действия самого токена. Попадание в кеш пропускает и разбор
+JWT, и запрос пользователя в БД. При изменении или удалении пользователя
+его токены удаляются из кеша (invalidate_user вызывается из событий
+SQLAlchemy). Счетчики времени проверки позволяют сравнить стоимость
+аутентификации с кешем и без него.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class AuthenticatedUser:
+    """Снимок пользователя, не привязанный к сессии SQLAlchemy"""
+
+    __slots__ = ("id", "username")
+
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+
+class TokenCache:
+    """LRU кеш token -> AuthenticatedUser с TTL; ttl=0 отключает кеш"""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._auth_time = {True: 0.0, False: 0.0}
+        self._auth_count = {True: 0, False: 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, token):
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= now:
+                self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token, user, token_expires_at=None):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (user, expires_at)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(entry[0].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_user[entry[0].id]
+
+    def invalidate_user(self, user_id):
+        """Удаление всех токенов пользователя (изменение или удаление записи)"""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._drop(token)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def record(self, cached, seconds):
+        """Учет времени проверки токена (попадание в кеш или полная проверка)"""
+        with self._lock:
+            self._auth_time[cached] += seconds
+            self._auth_count[cached] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "mean_auth_ms_cached": 1000.0 * self._auth_time[True] / self._auth_count[True]
+                if self._auth_count[True] else 0.0,
+                "mean_auth_ms_uncached": 1000.0 * self._auth_time[False] / self._auth_count[False]
+                if self._auth_count[False] else 0.0
+            }
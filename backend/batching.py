@@ -0,0 +1,93 @@
+"""Динамический батчинг входов модели между параллельными запросами.
+
+Запросы кладут свои входы (тексты для NER, токенизированные пары для RE)
+в общую очередь и получают Future. Фоновый поток собирает батч, пока он
+не наберет max_batch_size элементов или пока с момента прихода первого
+элемента не пройдет max_wait_ms, выполняет его одним вызовом модели и
+раздает результаты обратно. Добавочная задержка ограничена max_wait_ms.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """Планировщик батчей: process_batch(items) -> results той же длины"""
+
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=5, name="batch-scheduler"):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.total_wait = 0.0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Поставить один вход в очередь, вернуть Future с результатом"""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items):
+        self._ensure_started()
+        futures = []
+        now = time.perf_counter()
+        for item in items:
+            future = Future()
+            self._queue.put((item, future, now))
+            futures.append(future)
+        return futures
+
+    def map(self, items):
+        """Синхронно: результаты для всех items в исходном порядке"""
+        return [future.result() for future in self.submit_many(items)]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                # Уже стоящие в очереди элементы забираем без ожидания
+                batch.append(self._queue.get(block=timeout > 0, timeout=max(timeout, 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.total_wait += sum(started - queued for _, _, queued in batch)
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "mean_wait_ms": 1000.0 * self.total_wait / self.items if self.items else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0
+            }
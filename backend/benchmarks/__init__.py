@@ -0,0 +1,7 @@
+"""Бенчмарки бэкенда C4 Architect. Запуск из каталога backend: python -m benchmarks.<имя>
+
+suite -- этапы конвейера /process, load -- HTTP нагрузка на запущенное приложение,
+results -- JSON с результатами и сравнение двух прогонов, synthetic -- тексты и графы
+заданного размера, stand_in_models -- маленькие модели вместо чекпоинтов,
+bench_* -- отдельные бенчмарки подсистем.
+"""
@@ -0,0 +1,50 @@
+"""Бенчмарк накладных расходов token_required: полная проверка (JWT + запрос
+пользователя в БД) против попадания в кеш токенов.
+
+    python -m benchmarks.bench_auth --requests 5000
+"""
+import argparse
+import time
+
+import app as backend
+
+
+def run(requests):
+    @backend.token_required
+    def endpoint(current_user):
+        return current_user.id
+
+    with backend.app.app_context():
+        backend.db.create_all()
+        user = backend.User.query.filter_by(username="bench-auth").first()
+        if user is None:
+            user = backend.User(username="bench-auth")
+            user.set_password("bench")
+            backend.db.session.add(user)
+            backend.db.session.commit()
+        token = user.generate_token()
+
+    headers = {"Authorization": f"Bearer {token}"}
+    print(f"{'mode':>9} {'requests':>9} {'us/request':>11}")
+    for mode, ttl in (("uncached", 0), ("cached", 60)):
+        backend.token_cache.ttl = ttl
+        backend.token_cache.clear()
+        elapsed = 0.0
+        for _ in range(requests):
+            with backend.app.test_request_context("/", headers=headers):
+                started = time.perf_counter()
+                endpoint()
+                elapsed += time.perf_counter() - started
+        print(f"{mode:>9} {requests:>9} {1e6 * elapsed / requests:>11.1f}")
+    print(backend.token_cache.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="token_required overhead benchmark")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    run(args.requests)
+
+
+if __name__ == "__main__":
+    main()
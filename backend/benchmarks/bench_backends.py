@@ -0,0 +1,121 @@
+"""Сравнение бэкендов инференса (INFERENCE_BACKEND) с fp32 PyTorch по точности
+и задержке predict_entities/predict_relations.
+
+Для каждого бэкенда считаются:
+    entity_f1   -- совпадение сущностей (start, end, type) с эталоном;
+    class_agree -- доля пар-кандидатов с тем же классом отношения (RE
+                   оценивается на эталонных сущностях, чтобы не смешивать
+                   расхождения NER и RE);
+    rel_f1      -- совпадение принятых отношений (source, target, type);
+    max_dconf   -- максимальное расхождение уверенности RE;
+    ner_ms, re_ms -- средняя задержка на документ.
+Код возврата 1, если entity_f1 или class_agree ниже порогов.
+
+ONNX бэкенды требуют моделей после `flask convert-models`.
+
+    python -m benchmarks.bench_backends --backends pytorch int8 onnx onnx-int8 --documents 10
+"""
+import argparse
+import sys
+import time
+
+import app as backend
+from benchmarks.synthetic import synthetic_documents
+from model_registry import ModelRegistry
+
+
+def f1(reference, candidate):
+    reference, candidate = set(reference), set(candidate)
+    if not reference and not candidate:
+        return 1.0
+    overlap = len(reference & candidate)
+    return 2.0 * overlap / (len(reference) + len(candidate))
+
+
+def run_backend(name, documents, reference_entities):
+    registry = ModelRegistry(
+        backend.ner_model_path,
+        backend.re_model_path,
+        mode="lazy",
+        backend=name,
+        onnx_dir=backend.app.config['ONNX_MODEL_DIR'],
+        onnx_threads=backend.app.config['ONNX_THREADS']
+    ).load()
+    backend.models = registry
+    # Прогрев: первые вызовы включают инициализацию ядер и сессий
+    backend.predict_entities(documents[0])
+
+    result = {"entities": [], "relations": [], "pair_scores": [], "ner": 0.0, "re": 0.0}
+    for idx, text in enumerate(documents):
+        started = time.perf_counter()
+        result["entities"].append(backend.predict_entities(text))
+        result["ner"] += time.perf_counter() - started
+
+        entities = reference_entities[idx] if reference_entities is not None else result["entities"][-1]
+        started = time.perf_counter()
+        result["relations"].append(backend.predict_relations(entities, text))
+        result["re"] += time.perf_counter() - started
+
+        pairs = backend.candidate_pairs(entities, text)
+        if pairs:
+            contexts = [backend.build_relation_context(head, tail, text) for head, tail in pairs]
+            confidences, classes = backend.score_relation_contexts(contexts)
+            result["pair_scores"].append(list(zip(confidences.tolist(), classes.tolist())))
+        else:
+            result["pair_scores"].append([])
+    return result
+
+
+def compare(reference, candidate):
+    entity_f1 = []
+    relation_f1 = []
+    agree = total = 0
+    max_dconf = 0.0
+    for idx in range(len(reference["entities"])):
+        entity_f1.append(f1(
+            ((e["start"], e["end"], e["type"]) for e in reference["entities"][idx]),
+            ((e["start"], e["end"], e["type"]) for e in candidate["entities"][idx])
+        ))
+        relation_f1.append(f1(
+            ((r["source"], r["target"], r["type"]) for r in reference["relations"][idx]),
+            ((r["source"], r["target"], r["type"]) for r in candidate["relations"][idx])
+        ))
+        for (ref_conf, ref_class), (conf, cls) in zip(reference["pair_scores"][idx], candidate["pair_scores"][idx]):
+            agree += ref_class == cls
+            total += 1
+            max_dconf = max(max_dconf, abs(ref_conf - conf))
+    return {
+        "entity_f1": sum(entity_f1) / len(entity_f1),
+        "relation_f1": sum(relation_f1) / len(relation_f1),
+        "class_agree": agree / total if total else 1.0,
+        "max_dconf": max_dconf
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference backend accuracy/latency comparison")
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "int8"])
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--sentences", type=int, default=4)
+    parser.add_argument("--min-entity-f1", type=float, default=0.95)
+    parser.add_argument("--min-class-agree", type=float, default=0.95)
+    args = parser.parse_args()
+
+    documents = synthetic_documents(args.documents, args.sentences)
+    reference = run_backend("pytorch", documents, None)
+    print(f"{'backend':>10} {'ner_ms':>8} {'re_ms':>8} {'entity_f1':>10} {'class_agree':>12} "
+          f"{'rel_f1':>8} {'max_dconf':>10}")
+    failed = False
+    for name in args.backends:
+        result = reference if name == "pytorch" else run_backend(name, documents, reference["entities"])
+        metrics = compare(reference, result)
+        ok = metrics["entity_f1"] >= args.min_entity_f1 and metrics["class_agree"] >= args.min_class_agree
+        failed = failed or not ok
+        print(f"{name:>10} {1000 * result['ner'] / len(documents):>8.2f} {1000 * result['re'] / len(documents):>8.2f} "
+              f"{metrics['entity_f1']:>10.3f} {metrics['class_agree']:>12.3f} {metrics['relation_f1']:>8.3f} "
+              f"{metrics['max_dconf']:>10.4f}{'' if ok else '  FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Бенчмарк динамического батчинга: параллельные запросы с общими батчами и без.
+
+    python -m benchmarks.bench_batching --concurrency 1 4 16 --requests 32 --max-wait-ms 2 5 20
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as backend
+from batching import BatchScheduler
+from benchmarks.synthetic import synthetic_document
+
+
+def extract(text):
+    started = time.perf_counter()
+    entities = backend.predict_entities(text)
+    backend.predict_relations(entities, text)
+    return time.perf_counter() - started
+
+
+def configure(max_wait_ms):
+    """None -- без батчинга, иначе новые планировщики с заданным ожиданием"""
+    if max_wait_ms is None:
+        backend.ner_scheduler = None
+        backend.re_scheduler = None
+        return
+    backend.ner_scheduler = BatchScheduler(
+        backend.run_ner_batch, max_batch_size=backend.app.config['NER_BATCH_MAX_SIZE'], max_wait_ms=max_wait_ms)
+    backend.re_scheduler = BatchScheduler(
+        backend.score_relation_batch, max_batch_size=backend.app.config['RE_BATCH_SIZE'], max_wait_ms=max_wait_ms)
+
+
+def run(concurrency_levels, n_requests, n_entities, waits):
+    backend.models.load()
+    texts = [synthetic_document(n_entities)[0] + f" Request {i}." for i in range(n_requests)]
+    print(f"{'wait ms':>8} {'clients':>7} {'req/sec':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean batch':>10}")
+    for max_wait_ms in waits:
+        for concurrency in concurrency_levels:
+            configure(max_wait_ms)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                latencies = sorted(executor.map(extract, texts))
+            elapsed = time.perf_counter() - started
+            p50 = statistics.median(latencies) * 1000
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+            mean_batch = backend.re_scheduler.stats()["mean_batch_size"] if backend.re_scheduler else 0.0
+            label = "off" if max_wait_ms is None else f"{max_wait_ms:g}"
+            print(f"{label:>8} {concurrency:>7} {n_requests / elapsed:>8.2f} {p50:>8.1f} {p95:>8.1f} {mean_batch:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dynamic batching benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--entities", type=int, default=6)
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[2, 5, 20])
+    args = parser.parse_args()
+    run(args.concurrency, args.requests, args.entities, [None] + args.max_wait_ms)
+
+
+if __name__ == "__main__":
+    main()
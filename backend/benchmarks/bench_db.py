@@ -0,0 +1,102 @@
+"""Нагрузочный тест /register и /login несколькими процессами на одной БД SQLite.
+
+Сравниваются профили: legacy -- прежние настройки (журнал DELETE, synchronous
+FULL) и tuned -- WAL, synchronous NORMAL, busy_timeout (см. db_config).
+Каждый процесс-воркер -- отдельное приложение, как воркер gunicorn.
+Хеширование паролей удешевлено (PASSWORD_HASH_METHOD), чтобы измерялась работа с БД.
+
+    python -m benchmarks.bench_db --workers 4 --users 100
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.results import percentile
+
+PROFILES = {
+    "legacy": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "tuned": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL"}
+}
+
+
+def worker(worker_id, users, start_at):
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    import app as backend
+
+    client = backend.app.test_client()
+    # Все воркеры начинают одновременно, после импорта приложения
+    time.sleep(max(0.0, start_at - time.time()))
+    latencies = []
+    errors = 0
+    for idx in range(users):
+        username = f"w{worker_id}-u{idx}"
+        for path in ("/register", "/login"):
+            started = time.perf_counter()
+            try:
+                response = client.post(path, json={"username": username, "password": "secret"})
+                ok = response.status_code in (200, 201)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += 0 if ok else 1
+    print(json.dumps({"latencies": latencies, "errors": errors, "finished_at": time.time()}))
+
+
+def run_profile(name, workers, users):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, **PROFILES[name])
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        env["MODEL_LOADING"] = "lazy"
+        env["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1"
+        subprocess.run(
+            [sys.executable, "-c", "import app; app.app.app_context().push(); app.db.create_all()"],
+            env=env, check=True, capture_output=True
+        )
+        start_at = time.time() + 10
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.bench_db", "--worker", str(idx), "--users", str(users),
+                 "--start-at", str(start_at)],
+                env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+            for idx in range(workers)
+        ]
+        latencies = []
+        errors = 0
+        finished_at = start_at
+        for process in processes:
+            output, _ = process.communicate()
+            result = json.loads(output.strip().splitlines()[-1])
+            latencies.extend(result["latencies"])
+            errors += result["errors"]
+            finished_at = max(finished_at, result["finished_at"])
+        elapsed = finished_at - start_at
+    print(f"{name:>7} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} "
+          f"{1000 * percentile(latencies, 0.5):>8.1f} {1000 * percentile(latencies, 0.95):>8.1f} "
+          f"{1000 * max(latencies):>8.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent auth load test")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, default=0.0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker is not None:
+        worker(args.worker, args.users, args.start_at)
+        return
+    print(f"{'profile':>7} {'requests':>9} {'req/sec':>8} {'p50_ms':>8} {'p95_ms':>8} {'max_ms':>8} {'errors':>7}")
+    for name in args.profiles:
+        run_profile(name, args.workers, args.users)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Бенчмарк build_c4_hierarchy на синтетических графах разного размера.
+
+    python -m benchmarks.bench_hierarchy --elements 1000 10000 100000
+"""
+import argparse
+import time
+
+import app as backend
+from benchmarks.synthetic import synthetic_graph
+
+
+def run(sizes, repeat):
+    print(f"{'elements':>9} {'relations':>10} {'seconds':>9} {'elements/sec':>13}")
+    for size in sizes:
+        entities, relations = synthetic_graph(size)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            backend.build_c4_hierarchy(entities, relations)
+            best = min(best, time.perf_counter() - started)
+        print(f"{len(entities):>9} {len(relations):>10} {best:>9.3f} {len(entities) / best:>13.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="C4 hierarchy builder benchmark")
+    parser.add_argument("--elements", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.elements, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
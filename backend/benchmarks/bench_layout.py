@@ -0,0 +1,90 @@
+"""Бенчмарк раскладки convert_to_diagram_elements: время, попадание в кеш и
+число пересечений ребер между соседними уровнями (grid против layered).
+
+    python -m benchmarks.bench_layout --elements 1000 5000 20000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import app as backend
+from benchmarks.synthetic import synthetic_graph
+
+
+def count_crossings(nodes, edges):
+    """Пересечения ребер между соседними уровнями при порядке узлов по (y, x) внутри уровня"""
+    index_of_id = {}
+    for idx, node in enumerate(nodes):
+        index_of_id.setdefault(node["id"], idx)
+    levels = np.array([node["data"]["level"] for node in nodes])
+    xs = np.array([node["position"]["x"] for node in nodes])
+    ys = np.array([node["position"]["y"] for node in nodes])
+    rank = np.zeros(len(nodes), dtype=np.int64)
+    for level in np.unique(levels):
+        members = np.flatnonzero(levels == level)
+        rank[members[np.lexsort((xs[members], ys[members]))]] = np.arange(len(members))
+
+    pairs_by_level = {}
+    for edge in edges:
+        source, target = index_of_id[edge["source"]], index_of_id[edge["target"]]
+        if levels[target] - levels[source] == 1:
+            pairs_by_level.setdefault(levels[source], []).append((rank[source], rank[target]))
+
+    total = 0
+    for pairs in pairs_by_level.values():
+        # Инверсии по нижнему концу при сортировке по верхнему (дерево Фенвика)
+        pairs.sort()
+        size = max(target for _, target in pairs) + 2
+        tree = [0] * size
+        seen = 0
+        for _, target in pairs:
+            position = target + 1
+            not_greater = 0
+            while position > 0:
+                not_greater += tree[position]
+                position -= position & -position
+            total += seen - not_greater
+            position = target + 1
+            while position < size:
+                tree[position] += 1
+                position += position & -position
+            seen += 1
+    return total
+
+
+def run(sizes, repeat):
+    print(f"{'elements':>9} {'nodes':>7} {'grid_x':>9} {'layered_s':>10} {'cached_s':>9} "
+          f"{'cross_grid':>11} {'cross_layered':>14}")
+    for size in sizes:
+        hierarchy = backend.build_c4_hierarchy(*synthetic_graph(size, extra_relations=0.0))
+
+        backend.app.config['DIAGRAM_LAYOUT'] = 'grid'
+        grid_nodes, edges = backend.convert_to_diagram_elements(hierarchy)
+        grid_width = max(node["position"]["x"] for node in grid_nodes)
+
+        backend.app.config['DIAGRAM_LAYOUT'] = 'layered'
+        best = float("inf")
+        for _ in range(repeat):
+            backend.diagram_layout.clear()
+            started = time.perf_counter()
+            nodes, _ = backend.convert_to_diagram_elements(hierarchy)
+            best = min(best, time.perf_counter() - started)
+        started = time.perf_counter()
+        backend.convert_to_diagram_elements(hierarchy)
+        cached = time.perf_counter() - started
+
+        print(f"{size:>9} {len(nodes):>7} {grid_width:>9.0f} {best:>10.3f} {cached:>9.3f} "
+              f"{count_crossings(grid_nodes, edges):>11} {count_crossings(nodes, edges):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagram layout benchmark")
+    parser.add_argument("--elements", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.elements, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Бенчмарк разбора C4-PlantUML (parse_c4_plantuml) на файлах из generate_c4_code.
+
+    python -m benchmarks.bench_parser --elements 1000 10000 100000
+"""
+import argparse
+import time
+
+import app as backend
+from benchmarks.synthetic import synthetic_graph
+from plantuml_parser import parse_c4_plantuml
+
+
+def run(sizes, repeat):
+    print(f"{'elements':>9} {'lines':>9} {'seconds':>9} {'lines/sec':>11} {'round_trip':>11}")
+    for size in sizes:
+        code = backend.generate_c4_code(backend.build_c4_hierarchy(*synthetic_graph(size)))
+        lines = code.count("\n") + 1
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hierarchy, _ = parse_c4_plantuml(code)
+            best = min(best, time.perf_counter() - started)
+        same = backend.generate_c4_code(hierarchy) == code
+        print(f"{size:>9} {lines:>9} {best:>9.3f} {lines / best:>11.0f} {str(same):>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PlantUML parser benchmark")
+    parser.add_argument("--elements", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.elements, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Бенчмарк всплеска логинов: задержка хеширования и пропускная способность
+параллельной CPU-нагрузки (умножение матриц NumPy вместо инференса) при
+разном размере пула хеширования.
+
+workers = burst -- прежнее поведение: каждый запрос хеширует в своем потоке.
+На машине с одним ядром выигрыш ограниченного пула виден только в доле
+CPU, остающейся инференсу, а не в задержке логина.
+
+    python -m benchmarks.bench_password --burst 32 --workers 1 2 32
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.results import percentile
+from password_hashing import PasswordHasher, PasswordHashingBusy
+
+
+def probe(stop, counter):
+    """Имитация инференса: считает выполненные умножения матриц"""
+    matrix = np.random.rand(128, 128)
+    while not stop.is_set():
+        matrix @ matrix
+        counter[0] += 1
+
+
+def probe_rate(seconds):
+    stop = threading.Event()
+    counter = [0]
+    thread = threading.Thread(target=probe, args=(stop, counter))
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return counter[0] / seconds
+
+
+def run(method, burst, workers):
+    hasher = PasswordHasher(method=method, workers=workers, max_pending=burst, timeout=60)
+    stored = hasher.hash("secret")
+    stop = threading.Event()
+    counter = [0]
+    thread = threading.Thread(target=probe, args=(stop, counter))
+    latencies = []
+    rejected = 0
+
+    def login(_):
+        started = time.perf_counter()
+        try:
+            hasher.verify(stored, "secret")
+        except PasswordHashingBusy:
+            return None
+        return time.perf_counter() - started
+
+    thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=burst) as clients:
+        for latency in clients.map(login, range(burst)):
+            if latency is None:
+                rejected += 1
+            else:
+                latencies.append(latency)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+    return {
+        "latencies": latencies,
+        "rejected": rejected,
+        "elapsed": elapsed,
+        "probe_rate": counter[0] / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing burst benchmark")
+    parser.add_argument("--method", default="scrypt:32768:8:1")
+    parser.add_argument("--burst", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 32])
+    args = parser.parse_args()
+
+    idle = probe_rate(1.0)
+    print(f"cpus={os.cpu_count()} method={args.method} burst={args.burst} idle_probe={idle:.1f}/s")
+    print(f"{'workers':>7} {'burst_s':>8} {'p50_ms':>8} {'p95_ms':>8} {'rejected':>8} {'probe/s':>8} {'probe_%':>8}")
+    for workers in args.workers:
+        result = run(args.method, args.burst, workers)
+        latencies = result["latencies"]
+        print(f"{workers:>7} {result['elapsed']:>8.2f} {1000 * percentile(latencies, 0.5):>8.1f} "
+              f"{1000 * percentile(latencies, 0.95):>8.1f} {result['rejected']:>8} "
+              f"{result['probe_rate']:>8.1f} {100 * result['probe_rate'] / idle:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Бенчмарк генерации PlantUML (generate_c4_code) на синтетических иерархиях.
+
+    python -m benchmarks.bench_plantuml --elements 1000 10000 100000
+"""
+import argparse
+import time
+
+import app as backend
+from benchmarks.synthetic import synthetic_graph
+
+
+def run(sizes, repeat):
+    print(f"{'elements':>9} {'bytes':>11} {'seconds':>9} {'MB/sec':>8}")
+    for size in sizes:
+        hierarchy = backend.build_c4_hierarchy(*synthetic_graph(size))
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            code = backend.generate_c4_code(hierarchy)
+            best = min(best, time.perf_counter() - started)
+        print(f"{size:>9} {len(code):>11} {best:>9.3f} {len(code) / best / 1e6:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PlantUML emitter benchmark")
+    parser.add_argument("--elements", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.elements, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Бенчмарк извлечения отношений: пар в секунду в зависимости от числа сущностей.
+
+Сравнивает поштучный инференс (микробатч из одной пары, как раньше)
+с пакетным режимом predict_relations, а также режимы RE_SCORING_MODE
+('pair' -- контекст на каждую пару, 'shared' -- общая токенизация документа).
+
+    python -m benchmarks.bench_relations --entities 10 20 40 60 --batch-size 1 8 32 --mode pair shared
+"""
+import argparse
+import time
+
+import app as backend
+from benchmarks.synthetic import synthetic_document
+
+
+def run(entity_counts, batch_sizes, modes, repeat):
+    backend.models.load()
+    print(f"{'mode':>6} {'entities':>8} {'pairs':>7} {'batch':>6} {'seconds':>9} {'pairs/sec':>10}")
+    for mode in modes:
+        backend.app.config['RE_SCORING_MODE'] = mode
+        for n_entities in entity_counts:
+            text, entities = synthetic_document(n_entities)
+            pairs = backend.candidate_pairs(entities, text)
+            for batch_size in batch_sizes:
+                best = float("inf")
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    backend.score_entity_pairs(pairs, text, batch_size=batch_size)
+                    best = min(best, time.perf_counter() - started)
+                rate = len(pairs) / best if best else 0.0
+                print(f"{mode:>6} {n_entities:>8} {len(pairs):>7} {batch_size:>6} {best:>9.3f} {rate:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relation extraction throughput benchmark")
+    parser.add_argument("--entities", type=int, nargs="+", default=[10, 20, 40, 60])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--mode", nargs="+", default=["pair"], choices=["pair", "shared"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.entities, args.batch_size, args.mode, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
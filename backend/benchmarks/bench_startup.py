@@ -0,0 +1,51 @@
+"""Бенчмарк старта приложения: время импорта app и готовности моделей.
+
+Каждый замер идет в отдельном процессе, чтобы не мешал кеш импортов:
+
+    python -m benchmarks.bench_startup --mode eager lazy background --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app as backend
+imported = time.perf_counter() - started
+torch_loaded = 'torch' in __import__('sys').modules
+backend.models.load()
+ready = time.perf_counter() - started
+print(json.dumps({"import_seconds": imported, "ready_seconds": ready, "torch_at_import": torch_loaded}))
+"""
+
+
+def measure(mode):
+    env = dict(os.environ, MODEL_LOADING=mode)
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Application startup benchmark")
+    parser.add_argument("--mode", nargs="+", default=["eager", "lazy", "background"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'import s':>9} {'ready s':>9} {'torch at import':>16}")
+    for mode in args.mode:
+        runs = [measure(mode) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run["import_seconds"])
+        print(f"{mode:>10} {best['import_seconds']:>9.3f} {best['ready_seconds']:>9.3f} {str(best['torch_at_import']):>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Бенчмарк пула воркеров: память на воркер и общая пропускная способность.
+
+Режим shared -- модели загружены в сервере форков до форка воркеров (веса
+общие), режим separate -- каждый воркер загружает свою копию моделей (как
+при независимых процессах без preload).
+
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --documents 32
+"""
+import argparse
+import os
+import sys
+import time
+
+import app as backend
+from benchmarks.synthetic import synthetic_document
+
+
+def _quiet_worker():
+    # Отладочный вывод конвейера не должен влиять на замер
+    sys.stdout = open(os.devnull, "w")
+
+
+def _load_private_models():
+    # Отдельная копия моделей в воркере (базовая линия для сравнения)
+    _quiet_worker()
+    backend.models = backend.ModelRegistry(backend.ner_model_path, backend.re_model_path, mode="eager")
+    backend.models.load()
+
+
+def _warmup(_):
+    return True
+
+
+def run(worker_counts, n_documents, n_entities, modes):
+    text, _ = synthetic_document(n_entities)
+    print(f"{'mode':>9} {'workers':>7} {'docs/sec':>9} {'rss MB/w':>9} {'pss MB/w':>9} {'uss MB/w':>9} {'total pss MB':>12}")
+    for mode in modes:
+        for workers in worker_counts:
+            pool = backend.create_inference_pool(workers)
+            pool.start(initializer=_load_private_models if mode == "separate" else _quiet_worker)
+            try:
+                pool.run(_warmup, None)
+                started = time.perf_counter()
+                pending = [pool.submit(backend.run_extraction, f"{text} {i}") for i in range(n_documents)]
+                for result in pending:
+                    result.get()
+                elapsed = time.perf_counter() - started
+
+                memory = [value for value in pool.memory().values() if value]
+                rss = sum(value["rss_kb"] for value in memory) / len(memory) / 1024
+                pss = sum(value["pss_kb"] for value in memory) / len(memory) / 1024
+                uss = sum(value["uss_kb"] for value in memory) / len(memory) / 1024
+                total_pss = sum(value["pss_kb"] for value in memory) / 1024
+                print(f"{mode:>9} {workers:>7} {n_documents / elapsed:>9.2f} {rss:>9.1f} {pss:>9.1f} {uss:>9.1f} {total_pss:>12.1f}")
+            finally:
+                pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference pool memory and throughput benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--documents", type=int, default=32)
+    parser.add_argument("--entities", type=int, default=20)
+    parser.add_argument("--mode", nargs="+", default=["shared", "separate"], choices=["shared", "separate"])
+    args = parser.parse_args()
+    run(args.workers, args.documents, args.entities, args.mode)
+
+
+if __name__ == "__main__":
+    main()
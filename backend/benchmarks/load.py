@@ -0,0 +1,275 @@
+"""HTTP нагрузка на /process и /update-diagram.
+
+Без --url запускает приложение (`flask run`, многопоточный сервер) с
+временной SQLite базой и моделями-заглушками (--stand-in) или
+чекпоинтами, регистрирует пользователя и гоняет сценарии при каждом
+уровне параллелизма: N клиентских потоков, каждый шлет запрос за
+запросом в течение --duration секунд.
+
+Сценарии:
+    process       -- POST /process, у каждого запроса свой текст
+                     (кеш результатов не срабатывает);
+    update        -- POST /update-diagram с полной иерархией из --elements элементов;
+    update-patch  -- POST /update-diagram с патчем rename против версии,
+                     сохраненной клиентом в начале сценария.
+
+Для запущенного здесь сервера peak_mb -- пиковый RSS процесса сервера (VmHWM)
+на момент конца сценария.
+
+    python -m benchmarks.load --stand-in --concurrency 1 4 --duration 10 --output load.json
+    python -m benchmarks.load --url http://localhost:5000 --scenarios process
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.results import (compare, environment, latency_summary, load_results, print_comparison,
+                                write_results)
+from benchmarks.synthetic import architecture_text, synthetic_graph
+
+SCENARIOS = ("process", "update", "update-patch")
+
+
+class Client:
+    def __init__(self, url, token=None):
+        self.url = url.rstrip("/")
+        self.token = token
+
+    def post(self, path, payload, timeout=300):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(
+            self.url + path, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def get(self, path, timeout=10):
+        with urllib.request.urlopen(self.url + path, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env, port, timeout=300):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--no-reload", "--no-debugger"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    client = Client(f"http://127.0.0.1:{port}")
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            _, status = client.get("/status")
+            if status["models"]["state"] == "ready":
+                return process
+        except (OSError, ValueError, KeyError):
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not become ready")
+
+
+def peak_rss_mb(pid):
+    """VmHWM процесса в МБ (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+def authenticate(url):
+    client = Client(url)
+    username = f"load-{os.getpid()}-{int(time.time())}"
+    client.post("/register", {"username": username, "password": "load-test"})
+    status, body = client.post("/login", {"username": username, "password": "load-test"})
+    if status != 200:
+        raise RuntimeError(f"Login failed with status {status}")
+    return Client(url, body["token"])
+
+
+def scenario_requests(scenario, client, worker_id, sentences, hierarchy):
+    """Генератор функций запроса для одного клиентского потока"""
+    if scenario == "process":
+        idx = 0
+        while True:
+            text = architecture_text(sentences, seed=worker_id * 1000003 + idx)
+            idx += 1
+            yield lambda text=text: client.post("/process", {"text": text})
+    elif scenario == "update":
+        while True:
+            yield lambda: client.post("/update-diagram", {"hierarchy": hierarchy})
+    else:
+        diagram_id = f"load-{worker_id}"
+        status, body = client.post("/update-diagram", {"hierarchy": hierarchy, "diagram_id": diagram_id})
+        if status != 200 or not body.get("success"):
+            raise RuntimeError(f"Could not create diagram for patches (status {status})")
+        state = {"version": body["version"]}
+        system_id = hierarchy["systems"][0]["id"]
+        idx = 0
+
+        def patch(name):
+            status, body = client.post("/update-diagram", {
+                "diagram_id": diagram_id,
+                "version": state["version"],
+                "ops": [{"op": "rename", "id": system_id, "name": name}]
+            })
+            if status == 200 and body and body.get("success"):
+                state["version"] = body["version"]
+            return status, body
+
+        while True:
+            idx += 1
+            yield lambda name=f"System {idx}": patch(name)
+
+
+def run_scenario(scenario, client, concurrency, duration, sentences, hierarchy):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = [0.0]
+
+    def begin():
+        # Отсчет начинается, когда все клиенты подготовлены (для патчей -- диаграммы созданы)
+        deadline[0] = time.perf_counter() + duration
+
+    start = threading.Barrier(concurrency + 1, action=begin)
+
+    def worker(worker_id):
+        requests = scenario_requests(scenario, client, worker_id, sentences, hierarchy)
+        first = next(requests)
+        start.wait()
+        call = first
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            try:
+                status, body = call()
+                ok = status == 200 and not (isinstance(body, dict) and body.get("success") is False)
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += 0 if ok else 1
+            call = next(requests)
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = deadline[0] - duration
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return latencies, errors[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load generator for /process and /update-diagram")
+    parser.add_argument("--url", help="Target an already running server instead of starting one")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--sentences", type=int, default=8, help="Sentences per /process text")
+    parser.add_argument("--elements", type=int, default=200, help="Elements in the /update-diagram hierarchy")
+    parser.add_argument("--stand-in", action="store_true", help="Start the server with generated tiny models")
+    parser.add_argument("--output", help="Write results JSON")
+    parser.add_argument("--compare", help="Baseline results JSON")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # Иерархия для /update-diagram строится тем же кодом, что и в /process
+    import app as backend
+    hierarchy = backend.build_c4_hierarchy(*synthetic_graph(args.elements, extra_relations=0.0))
+
+    server = None
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url
+        if url is None:
+            env = dict(os.environ)
+            if args.stand_in:
+                from benchmarks.stand_in_models import create_stand_in_models
+
+                env["NER_MODEL_PATH"], env["RE_MODEL_PATH"] = create_stand_in_models(tmp)
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+            env["MODEL_LOADING"] = "eager"
+            env.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+            subprocess.run(
+                [sys.executable, "-c", "import app; app.app.app_context().push(); app.db.create_all()"],
+                env=dict(env, MODEL_LOADING="lazy"), check=True, capture_output=True
+            )
+            port = free_port()
+            server = start_server(env, port)
+            url = f"http://127.0.0.1:{port}"
+        try:
+            client = authenticate(url)
+            results = []
+            print(f"{'scenario':>13} {'conc':>5} {'requests':>9} {'req/sec':>8} {'p50_ms':>8} {'p95_ms':>8} "
+                  f"{'p99_ms':>8} {'errors':>7} {'peak_mb':>8}")
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    latencies, errors, elapsed = run_scenario(
+                        scenario, client, concurrency, args.duration, args.sentences, hierarchy
+                    )
+                    summary = latency_summary(latencies)
+                    peak_mb = peak_rss_mb(server.pid) if server is not None else None
+                    result = {
+                        "benchmark": "load",
+                        "name": scenario,
+                        "size": concurrency,
+                        "requests": len(latencies),
+                        "errors": errors,
+                        **summary,
+                        "throughput": len(latencies) / elapsed if elapsed else 0.0
+                    }
+                    if peak_mb is not None:
+                        result["peak_mb"] = peak_mb
+                    results.append(result)
+                    print(f"{scenario:>13} {concurrency:>5} {len(latencies):>9} {result['throughput']:>8.1f} "
+                          f"{summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} "
+                          f"{errors:>7} {peak_mb or 0.0:>8.1f}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    meta = environment(
+        suite="load",
+        url=args.url,
+        models="stand-in" if args.stand_in else "checkpoint",
+        duration=args.duration,
+        sentences=args.sentences,
+        elements=args.elements
+    )
+    if args.output:
+        write_results(args.output, meta, results)
+    if args.compare:
+        rows = compare(load_results(args.compare), {"meta": meta, "results": results}, args.threshold)
+        print_comparison(rows)
+        sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
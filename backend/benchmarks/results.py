@@ -0,0 +1,119 @@
+"""Результаты бенчмарков в JSON и сравнение двух прогонов (например, двух коммитов).
+
+Файл результатов:
+
+    {"meta": {"commit": ..., "created_at": ..., "python": ..., ...},
+     "results": [{"benchmark": "stage", "name": "predict_entities", "size": 10,
+                  "mean_ms": ..., "p95_ms": ..., "throughput": ..., "peak_mb": ...}, ...]}
+
+Запись идентифицируется тройкой (benchmark, name, size). compare() считает
+отношение новых значений к старым: для задержек и памяти рост -- регрессия,
+для throughput -- падение.
+
+    python -m benchmarks.results old.json new.json --threshold 0.1
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+
+# Метрика -> True, если большее значение лучше
+METRICS = {"mean_ms": False, "p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput": True, "peak_mb": False}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def latency_summary(seconds):
+    """Задержки в мс: среднее и перцентили по списку длительностей в секундах"""
+    return {
+        "mean_ms": 1000.0 * sum(seconds) / len(seconds) if seconds else 0.0,
+        "p50_ms": 1000.0 * percentile(seconds, 0.5),
+        "p95_ms": 1000.0 * percentile(seconds, 0.95),
+        "p99_ms": 1000.0 * percentile(seconds, 0.99)
+    }
+
+
+def max_rss_mb():
+    """Пиковый RSS текущего процесса (ru_maxrss в КБ на Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(**extra):
+    """Метаданные прогона: коммит, интерпретатор, число ядер и переданные параметры"""
+    meta = {
+        "commit": git_commit(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count()
+    }
+    meta.update(extra)
+    return meta
+
+
+def write_results(path, meta, results):
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold=0.1):
+    """Строки сравнения (benchmark, name, size, metric, old, new, ratio, regression)"""
+    previous = {(r["benchmark"], r["name"], r["size"]): r for r in old["results"]}
+    rows = []
+    for result in new["results"]:
+        before = previous.get((result["benchmark"], result["name"], result["size"]))
+        if before is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in result or not before.get(metric):
+                continue
+            ratio = result[metric] / before[metric]
+            regression = ratio < 1.0 - threshold if higher_is_better else ratio > 1.0 + threshold
+            rows.append((result["benchmark"], result["name"], result["size"], metric,
+                         before[metric], result[metric], ratio, regression))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'benchmark':>10} {'name':>28} {'size':>7} {'metric':>10} {'old':>10} {'new':>10} {'ratio':>7}")
+    for benchmark, name, size, metric, before, after, ratio, regression in rows:
+        print(f"{benchmark:>10} {name:>28} {size:>7} {metric:>10} {before:>10.2f} {after:>10.2f} "
+              f"{ratio:>7.2f}{'  REGRESSION' if regression else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed relative change")
+    args = parser.parse_args()
+    old, new = load_results(args.old), load_results(args.new)
+    print(f"old: {old['meta'].get('commit')}  new: {new['meta'].get('commit')}")
+    rows = compare(old, new, args.threshold)
+    print_comparison(rows)
+    sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
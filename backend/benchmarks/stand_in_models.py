@@ -0,0 +1,78 @@
+"""Маленькие случайные NER/RE модели с тем же интерфейсом, что и настоящие чекпоинты.
+
+Нужны, чтобы бенчмарки работали без весов моделей: архитектура BERT
+уменьшена (hidden 32, 2 слоя), метки NER -- B-/I- для ENTITY_TYPES, RE --
+классы RELATION_TYPES плюс "нет отношения". Качество предсказаний
+случайное, поэтому такие модели годятся для сравнения задержек и памяти
+между коммитами, но не для оценки точности. Смещение метки O задает
+примерную долю токенов, помеченных как сущности.
+
+    python -m benchmarks.stand_in_models --output /tmp/stand-in
+    NER_MODEL_PATH=/tmp/stand-in/ner RE_MODEL_PATH=/tmp/stand-in/re python -m benchmarks.suite
+"""
+import argparse
+import os
+
+from benchmarks.synthetic import vocabulary
+
+# Совпадают с app.ENTITY_TYPES и app.RELATION_TYPES (app здесь не импортируется)
+ENTITY_TYPES = ["SYSTEM", "CONTAINER", "COMPONENT", "ACTOR", "EXTERNAL_SYSTEM", "DATABASE", "QUEUE", "VERB"]
+RELATION_LABELS = 12
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+
+def create_stand_in_models(output, hidden_size=32, layers=2, outside_bias=15.0, seed=0):
+    """Сохраняет модели в <output>/ner и <output>/re, возвращает (ner_path, re_path)"""
+    import torch
+    from transformers import (BertConfig, BertForSequenceClassification, BertForTokenClassification,
+                              BertTokenizerFast)
+
+    torch.manual_seed(seed)
+    vocab = SPECIAL_TOKENS + vocabulary() + [f"w{i}" for i in range(200)]
+    config = dict(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        num_hidden_layers=layers,
+        num_attention_heads=2,
+        intermediate_size=2 * hidden_size,
+        max_position_embeddings=512
+    )
+    labels = ["O"] + [f"{prefix}-{entity_type}" for entity_type in ENTITY_TYPES for prefix in ("B", "I")]
+
+    ner_path = os.path.join(output, "ner")
+    re_path = os.path.join(output, "re")
+    for path in (ner_path, re_path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "vocab.txt"), "w") as f:
+            f.write("\n".join(vocab))
+        BertTokenizerFast(vocab_file=os.path.join(path, "vocab.txt"), do_lower_case=True).save_pretrained(path)
+
+    ner_model = BertForTokenClassification(BertConfig(
+        **config,
+        num_labels=len(labels),
+        id2label=dict(enumerate(labels)),
+        label2id={label: idx for idx, label in enumerate(labels)}
+    ))
+    re_model = BertForSequenceClassification(BertConfig(**config, num_labels=RELATION_LABELS))
+    with torch.no_grad():
+        # Уверенные предсказания вместо почти равномерных, чтобы работали пороги пайплайна
+        ner_model.classifier.weight.mul_(40)
+        ner_model.classifier.bias[0] += outside_bias
+        re_model.classifier.weight.mul_(60)
+    ner_model.save_pretrained(ner_path)
+    re_model.save_pretrained(re_path)
+    return ner_path, re_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create tiny stand-in NER/RE models")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--hidden-size", type=int, default=32)
+    parser.add_argument("--layers", type=int, default=2)
+    args = parser.parse_args()
+    for path in create_stand_in_models(args.output, args.hidden_size, args.layers):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
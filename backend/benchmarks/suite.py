@@ -0,0 +1,155 @@
+"""Бенчмарк этапов конвейера /process на данных возрастающего размера.
+
+Этапы и единица пропускной способности:
+    predict_entities            -- слов текста в секунду;
+    predict_relations           -- пар-кандидатов в секунду (сущности из predict_entities);
+    run_extraction              -- слов в секунду, весь конвейер как в /process;
+    build_c4_hierarchy, generate_c4_code, convert_to_diagram_elements
+                                -- элементов синтетического графа в секунду.
+Размер текстовых этапов -- число предложений, графовых -- число элементов.
+Длинные тексты NER обрабатывает по фрагментам (NER_CHUNK_TOKENS), но число
+пар-кандидатов RE без RE_CANDIDATE_SENTENCE_WINDOW растет квадратично, поэтому
+тексты по умолчанию не длиннее 48 предложений.
+
+peak_mb -- пик памяти Python (tracemalloc) за вызов, отдельным прогоном:
+выделения внутри torch и tokenizers в него не попадают, поэтому в meta
+записывается еще и пиковый RSS процесса.
+
+С --stand-in модели-заглушки создаются во временном каталоге (см.
+stand_in_models) и реальные чекпоинты не нужны.
+
+    python -m benchmarks.suite --stand-in --output results.json
+    python -m benchmarks.suite --stand-in --output new.json --compare results.json
+"""
+import argparse
+import contextlib
+import importlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.results import (compare, environment, latency_summary, load_results, max_rss_mb,
+                                print_comparison, write_results)
+from benchmarks.synthetic import architecture_text, synthetic_graph
+
+TEXT_STAGES = ("predict_entities", "predict_relations", "run_extraction")
+GRAPH_STAGES = ("build_c4_hierarchy", "generate_c4_code", "convert_to_diagram_elements")
+
+
+def stage_cases(backend, stages, sentence_sizes, element_sizes):
+    """(stage, size, items, fn) для каждого этапа и размера"""
+    for size in sentence_sizes:
+        text = architecture_text(size, seed=size)
+        words = len(text.split())
+        entities = backend.predict_entities(text)
+        pairs = len(backend.candidate_pairs(entities, text))
+        cases = {
+            "predict_entities": (words, lambda: backend.predict_entities(text)),
+            "predict_relations": (pairs, lambda: backend.predict_relations(entities, text)),
+            "run_extraction": (words, lambda: backend.run_extraction(text))
+        }
+        for stage in TEXT_STAGES:
+            if stage in stages:
+                yield (stage, size) + cases[stage]
+
+    for size in element_sizes:
+        entities, relations = synthetic_graph(size)
+        hierarchy = backend.build_c4_hierarchy(entities, relations)
+
+        def convert():
+            # Раскладка без кеша: повторы измеряют расчет, а не попадание в кеш
+            backend.diagram_layout.clear()
+            return backend.convert_to_diagram_elements(hierarchy)
+
+        cases = {
+            "build_c4_hierarchy": lambda: backend.build_c4_hierarchy(entities, relations),
+            "generate_c4_code": lambda: backend.generate_c4_code(hierarchy),
+            "convert_to_diagram_elements": convert
+        }
+        for stage in GRAPH_STAGES:
+            if stage in stages:
+                yield stage, size, len(entities), cases[stage]
+
+
+def measure(fn, repeat):
+    fn()
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return durations, peak / (1024.0 * 1024.0)
+
+
+def run(backend, stages, sentence_sizes, element_sizes, repeat):
+    results = []
+    print(f"{'stage':>28} {'size':>7} {'items':>8} {'mean_ms':>9} {'p95_ms':>9} {'items/sec':>11} {'peak_mb':>8}")
+    # Отладочный вывод конвейера не должен попадать в замеры консоли
+    with open(os.devnull, "w") as devnull:
+        for stage, size, items, fn in stage_cases(backend, stages, sentence_sizes, element_sizes):
+            with contextlib.redirect_stdout(devnull):
+                durations, peak_mb = measure(fn, repeat)
+            summary = latency_summary(durations)
+            throughput = items / (summary["mean_ms"] / 1000.0) if summary["mean_ms"] else 0.0
+            results.append({
+                "benchmark": "stage",
+                "name": stage,
+                "size": size,
+                "items": items,
+                "repeat": repeat,
+                **summary,
+                "throughput": throughput,
+                "peak_mb": peak_mb
+            })
+            print(f"{stage:>28} {size:>7} {items:>8} {summary['mean_ms']:>9.2f} {summary['p95_ms']:>9.2f} "
+                  f"{throughput:>11.1f} {peak_mb:>8.2f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction pipeline stage benchmarks")
+    parser.add_argument("--stages", nargs="+", default=list(TEXT_STAGES + GRAPH_STAGES),
+                        choices=TEXT_STAGES + GRAPH_STAGES)
+    parser.add_argument("--sentences", type=int, nargs="+", default=[4, 16, 48])
+    parser.add_argument("--elements", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stand-in", action="store_true", help="Use generated tiny models")
+    parser.add_argument("--output", help="Write results JSON")
+    parser.add_argument("--compare", help="Baseline results JSON")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.stand_in:
+            from benchmarks.stand_in_models import create_stand_in_models
+
+            os.environ["NER_MODEL_PATH"], os.environ["RE_MODEL_PATH"] = create_stand_in_models(tmp)
+        os.environ.setdefault("MODEL_LOADING", "lazy")
+        # Окружение задается до импорта приложения: пути моделей читаются при импорте
+        backend = importlib.import_module("app")
+        if set(args.stages) & set(TEXT_STAGES):
+            backend.models.load()
+        results = run(backend, set(args.stages), args.sentences, args.elements, args.repeat)
+
+    meta = environment(
+        suite="stage",
+        models="stand-in" if args.stand_in else "checkpoint",
+        inference_backend=backend.app.config['INFERENCE_BACKEND'],
+        max_rss_mb=max_rss_mb()
+    )
+    if args.output:
+        write_results(args.output, meta, results)
+    if args.compare:
+        rows = compare(load_results(args.compare), {"meta": meta, "results": results}, args.threshold)
+        print_comparison(rows)
+        sys.exit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Синтетические данные для бенчмарков: тексты архитектуры и графы C4 заданного размера.
+
+Модуль не импортирует app на уровне модуля, чтобы бенчмарки могли задать
+окружение (пути моделей, БД) до импорта приложения.
+"""
+import random
+
+# Типы сущностей по уровням C4 и доля элементов на уровнях 1..4
+LEVEL_TYPES = {
+    1: ["SYSTEM", "SYSTEM", "ACTOR", "EXTERNAL_SYSTEM"],
+    2: ["CONTAINER", "CONTAINER", "DATABASE", "QUEUE"],
+    3: ["COMPONENT"],
+    4: ["VERB"]
+}
+LEVEL_SHARE = {1: 0.1, 2: 0.2, 3: 0.3, 4: 0.4}
+
+ENTITY_NAMES = [
+    ("SYSTEM", "Payment System"), ("CONTAINER", "Order Service"), ("DATABASE", "Postgres Database"),
+    ("QUEUE", "Kafka Queue"), ("COMPONENT", "Auth Controller"), ("ACTOR", "User"),
+    ("EXTERNAL_SYSTEM", "Bank Gateway"), ("CONTAINER", "Web App"), ("COMPONENT", "Billing Module"),
+]
+
+PHRASES = [
+    "The {a} sends requests to the {b}.", "{a} stores orders in the {b}.",
+    "The {a} publishes events to {b}.", "Users interact with the {a} through the {b}.",
+    "The {a} contains the {b}.", "{a} depends on {b} for authentication."
+]
+NAMES = [
+    "Payment Service", "Order API", "Postgres Database", "Kafka Queue", "Web Application",
+    "Auth Controller", "Billing Module", "Bank Gateway", "Admin", "Redis Cache", "Mobile App"
+]
+
+
+def vocabulary():
+    """Слова синтетических текстов (словарь для моделей-заглушек)"""
+    words = set()
+    for text in PHRASES + NAMES + [name for _, name in ENTITY_NAMES]:
+        words.update(text.replace("{a}", " ").replace("{b}", " ").lower().replace(".", " . ").split())
+    words.update(["uses", "data", "request", "in", ":"])
+    return sorted(words)
+
+
+def architecture_text(sentences, seed=0):
+    """Текст описания архитектуры из sentences предложений"""
+    rng = random.Random(seed)
+    return " ".join(
+        rng.choice(PHRASES).format(a=rng.choice(NAMES), b=rng.choice(NAMES)) for _ in range(sentences)
+    )
+
+
+def synthetic_documents(count, sentences, seed=0):
+    """count текстов архитектуры по sentences предложений"""
+    rng = random.Random(seed)
+    return [architecture_text(sentences, rng.randrange(1 << 30)) for _ in range(count)]
+
+
+def synthetic_document(n_entities):
+    """Синтетический текст и список сущностей в формате predict_entities"""
+    from app import C4_LEVELS
+
+    parts = []
+    entities = []
+    offset = 0
+    for i in range(n_entities):
+        entity_type, name = ENTITY_NAMES[i % len(ENTITY_NAMES)]
+        name = f"{name} {i}"
+        sentence = f"The {name} uses data. "
+        start = offset + len("The ")
+        entities.append({
+            "text": name,
+            "type": entity_type,
+            "start": start,
+            "end": start + len(name),
+            "id": f"ent-{i}",
+            "level": C4_LEVELS[entity_type]
+        })
+        parts.append(sentence)
+        offset += len(sentence)
+    return "".join(parts), entities
+
+
+def synthetic_graph(n_elements, extra_relations=1.0, seed=0):
+    """Сущности по уровням C4 и отношения: у каждого элемента родитель на уровень выше
+    плюс extra_relations * n случайных отношений между соседними уровнями"""
+    rng = random.Random(seed)
+    entities = []
+    by_level = {level: [] for level in LEVEL_SHARE}
+    for level, share in LEVEL_SHARE.items():
+        for _ in range(max(1, int(n_elements * share))):
+            entity_type = rng.choice(LEVEL_TYPES[level])
+            entity = {
+                "text": f"{entity_type.lower()} {len(entities)}",
+                "type": entity_type,
+                "start": 0,
+                "end": 0,
+                "id": f"ent-{len(entities)}",
+                "level": level
+            }
+            entities.append(entity)
+            by_level[level].append(entity)
+
+    relations = []
+
+    def relate(parent, child):
+        relations.append({
+            "source": parent["id"],
+            "target": child["id"],
+            "type": "contains",
+            "confidence": 0.9,
+            "level": parent["level"]
+        })
+
+    for level in (2, 3, 4):
+        for child in by_level[level]:
+            relate(rng.choice(by_level[level - 1]), child)
+    for _ in range(int(n_elements * extra_relations)):
+        level = rng.choice((2, 3, 4))
+        relate(rng.choice(by_level[level - 1]), rng.choice(by_level[level]))
+    return entities, relations
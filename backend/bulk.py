@@ -0,0 +1,150 @@
+"""Пакетное преобразование корпусов текстов в диаграммы C4.
+
+Источник -- каталог с текстовыми файлами (*.txt, *.md; id документа --
+путь относительно каталога) или JSONL со строками {"id": ..., "text": ...}
+(без id -- номер строки). Результаты пишутся построчно в JSONL или
+файлами .puml в каталог (с подкаталогами из id). Контрольная точка -- файл с id завершенных
+документов, дописываемый после записи каждого результата: повторный
+запуск пропускает уже обработанные документы.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+TEXT_EXTENSIONS = (".txt", ".md")
+OUTPUT_FORMATS = ("jsonl", "plantuml")
+
+
+def iter_documents(source):
+    """(id, text) документов из каталога или JSONL файла"""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(TEXT_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    with open(path, encoding="utf-8") as f:
+                        yield os.path.relpath(path, source), f.read()
+        return
+    with open(source, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{source}:{line_number}: invalid JSON ({e})")
+            if isinstance(record, str):
+                record = {"text": record}
+            yield str(record.get("id", line_number)), record.get("text", "")
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def document_record(doc_id, result, output_format="jsonl"):
+    """Строка результата: полный результат конвейера или только PlantUML"""
+    if output_format == "plantuml":
+        return {"id": doc_id, "plantuml_code": result["plantuml_code"]}
+    return {"id": doc_id, **result}
+
+
+def plantuml_filename(doc_id):
+    """Относительный путь .puml файла для id документа: подкаталоги id сохраняются,
+    к имени добавляется .puml (a/b.txt -> a/b.txt.puml). Если id пришлось изменить
+    (спецсимволы, "..", пустые части пути), к имени добавляется короткий хеш id,
+    чтобы разные документы не записывались в один файл"""
+    parts = doc_id.replace(os.sep, "/").split("/")
+    names = [name for name in (re.sub(r"[^\w.-]+", "_", part).strip(".") for part in parts) if name]
+    if names != parts:
+        names = names or ["document"]
+        names[-1] += "-" + hashlib.sha1(doc_id.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(*names) + ".puml"
+
+
+class Checkpoint:
+    """Множество id завершенных документов, сохраняемое построчно в файл"""
+
+    def __init__(self, path, resume=True):
+        self.path = path
+        self.done = set()
+        if resume and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done.update(line.rstrip("\n") for line in f if line.strip())
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def __contains__(self, doc_id):
+        return doc_id in self.done
+
+    def mark(self, doc_id):
+        self.done.add(doc_id)
+        self._file.write(doc_id + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ResultWriter:
+    """Запись результатов в JSONL файл или .puml файлы каталога"""
+
+    def __init__(self, output, output_format="jsonl", resume=True):
+        self.output = output
+        self.output_format = output_format
+        self._file = None
+        if output_format == "plantuml":
+            os.makedirs(output, exist_ok=True)
+        else:
+            self._file = open(output, "a" if resume else "w", encoding="utf-8")
+
+    def write(self, doc_id, result):
+        if self.output_format == "plantuml":
+            path = os.path.join(self.output, plantuml_filename(doc_id))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(result["plantuml_code"])
+        else:
+            self._file.write(json.dumps(document_record(doc_id, result), ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ThroughputMeter:
+    """Документы и символы в секунду с начала обработки"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.documents = 0
+        self.chars = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def add(self, text, failed=False):
+        self.documents += 1
+        self.chars += len(text)
+        self.failed += int(failed)
+
+    def stats(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            "documents": self.documents,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "seconds": seconds,
+            "docs_per_sec": self.documents / seconds if seconds else 0.0,
+            "chars_per_sec": self.chars / seconds if seconds else 0.0
+        }
@@ -0,0 +1,132 @@
+"""Генерация пар сущностей-кандидатов для RE модели.
+
+Вместо перебора всех n² пар документа кандидаты берутся из индекса по
+смещениям start/end, которые возвращает predict_entities: пары ищутся только
+в окне соседних предложений и/или на ограниченном расстоянии в токенах,
+после чего отсекаются по уровню C4 и по допустимым сочетаниям типов.
+"""
+import re
+from bisect import bisect_right
+
+from coreference import entity_mentions
+
+SENTENCE_BOUNDARY_RE = re.compile(r"[.!?]+(?=\s)|\n+")
+TOKEN_RE = re.compile(r"\S+")
+
+
+def type_pair_allowlist(relation_signatures):
+    """Множество допустимых пар типов (в обе стороны) из сигнатур отношений"""
+    allowed = set()
+    for head_types, tail_types in relation_signatures.values():
+        for head_type in head_types:
+            for tail_type in tail_types:
+                allowed.add((head_type, tail_type))
+                allowed.add((tail_type, head_type))
+    return allowed
+
+
+class TextIndex:
+    """Индекс предложений и токенов текста для перевода смещений в позиции"""
+
+    def __init__(self, text):
+        self.sentence_starts = [0] + [m.end() for m in SENTENCE_BOUNDARY_RE.finditer(text)]
+        self.token_starts = [m.start() for m in TOKEN_RE.finditer(text)]
+
+    def sentence_of(self, offset):
+        return bisect_right(self.sentence_starts, offset) - 1
+
+    def token_of(self, offset):
+        return max(bisect_right(self.token_starts, offset) - 1, 0)
+
+
+class CandidateGenerator:
+    """Генератор пар (head, tail) для классификации отношений.
+
+    max_level_distance -- максимальная разница уровней C4 (как и раньше, 1);
+    sentence_window -- сущности не дальше чем через столько предложений;
+    max_token_distance -- максимальный зазор между сущностями в токенах;
+    allowed_type_pairs -- допустимые пары типов, None отключает фильтр.
+    """
+
+    def __init__(self, max_level_distance=1, sentence_window=None,
+                 max_token_distance=None, allowed_type_pairs=None):
+        self.max_level_distance = max_level_distance
+        self.sentence_window = sentence_window
+        self.max_token_distance = max_token_distance
+        self.allowed_type_pairs = allowed_type_pairs
+
+    @property
+    def uses_positions(self):
+        return self.sentence_window is not None or self.max_token_distance is not None
+
+    def generate(self, entities, text, stats=None):
+        """Список пар (head, tail) в порядке исходного перебора i < j"""
+        n = len(entities)
+        counters = {
+            "entities": n,
+            "total_pairs": n * (n - 1) // 2,
+            "pruned_by_distance": 0,
+            "pruned_by_level": 0,
+            "pruned_by_type": 0,
+            "candidate_pairs": 0
+        }
+
+        if self.uses_positions:
+            index_pairs = self._positional_pairs(entities, text)
+            counters["pruned_by_distance"] = counters["total_pairs"] - len(index_pairs)
+        else:
+            index_pairs = ((i, j) for i in range(n) for j in range(i + 1, n))
+
+        pairs = []
+        for i, j in index_pairs:
+            head = entities[i]
+            tail = entities[j]
+            # Только если сущности на одном уровне или соседних уровнях
+            if abs(head['level'] - tail['level']) > self.max_level_distance:
+                counters["pruned_by_level"] += 1
+                continue
+            if self.allowed_type_pairs is not None and \
+                    (head['type'], tail['type']) not in self.allowed_type_pairs:
+                counters["pruned_by_type"] += 1
+                continue
+            pairs.append((head, tail))
+
+        counters["candidate_pairs"] = len(pairs)
+        if stats is not None:
+            stats.update(counters)
+        return pairs
+
+    def _positional_pairs(self, entities, text):
+        """Пары индексов, попадающие в окно предложений и/или расстояние в токенах.
+
+        Упоминания сущностей обходятся в порядке смещений, и для каждого
+        просматриваются только следующие за ним в пределах окна, поэтому число
+        проверок пропорционально числу кандидатов, а не n². Объединенные
+        сущности (coreference) образуют пару, если в окно попадает любая пара
+        их упоминаний."""
+        text_index = TextIndex(text)
+        positions = []
+        for idx, entity in enumerate(entities):
+            for mention in entity_mentions(entity):
+                positions.append((
+                    mention['start'],
+                    text_index.sentence_of(mention['start']),
+                    text_index.token_of(mention['start']),
+                    text_index.token_of(max(mention['end'] - 1, mention['start'])),
+                    idx
+                ))
+        positions.sort()
+
+        index_pairs = set()
+        for a, (_, sentence_a, _, token_end_a, idx_a) in enumerate(positions):
+            for b in range(a + 1, len(positions)):
+                _, sentence_b, token_start_b, _, idx_b = positions[b]
+                if self.sentence_window is not None and sentence_b - sentence_a > self.sentence_window:
+                    break
+                if self.max_token_distance is not None and \
+                        token_start_b - token_end_a > self.max_token_distance:
+                    break
+                if idx_a != idx_b:
+                    index_pairs.add((min(idx_a, idx_b), max(idx_a, idx_b)))
+
+        return sorted(index_pairs)
@@ -0,0 +1,89 @@
+"""Разбиение длинных текстов на перекрывающиеся фрагменты для NER.
+
+NER модель принимает ограниченное число токенов, поэтому текст длиннее
+max_tokens делится по границам предложений (split_sentences) на фрагменты,
+соседние фрагменты перекрываются на overlap предложений. Предложение длиннее
+max_tokens режется по границам токенов. Каждое предложение перекрытия
+«принадлежит» одному фрагменту: первая половина перекрытия -- левому,
+вторая -- правому, так что у каждой сущности есть контекст с обеих сторон.
+При склейке сущность берется из фрагмента, которому принадлежит ее начало.
+"""
+from bisect import bisect_left
+from collections import namedtuple
+
+from incremental import renumber_entities, split_sentences
+
+# Символьные границы фрагмента [start, end) и принадлежащей ему части [own_start, own_end)
+Chunk = namedtuple("Chunk", ["start", "end", "own_start", "own_end"])
+
+
+def sentence_units(text, token_starts, max_tokens):
+    """Предложения [(start, end, tokens)]; предложения длиннее max_tokens режутся по токенам"""
+    units = []
+    for start, end in split_sentences(text):
+        first = bisect_left(token_starts, start)
+        last = bisect_left(token_starts, end)
+        for piece in range(first, max(last, first + 1), max_tokens):
+            piece_end = piece + max_tokens
+            units.append((
+                token_starts[piece] if piece > first else start,
+                token_starts[piece_end] if piece_end < last else end,
+                min(piece_end, last) - piece
+            ))
+    return units
+
+
+def plan_chunks(text, token_offsets, max_tokens, overlap=2):
+    """Фрагменты текста для NER. token_offsets -- смещения (start, end) токенов
+    всего текста без служебных токенов; короткий текст -- один фрагмент"""
+    if len(token_offsets) <= max_tokens:
+        return [Chunk(0, len(text), 0, len(text))] if text else []
+    units = sentence_units(text, [start for start, _ in token_offsets], max_tokens)
+
+    spans = []
+    first = 0
+    while first < len(units):
+        last = first
+        tokens = 0
+        while last < len(units) and (last == first or tokens + units[last][2] <= max_tokens):
+            tokens += units[last][2]
+            last += 1
+        spans.append((first, last))
+        if last == len(units):
+            break
+        first = max(first + 1, last - overlap)
+
+    chunks = []
+    own_start = 0
+    for idx, (first, last) in enumerate(spans):
+        if idx + 1 < len(spans):
+            # Середина перекрытия с правым соседом: дальше предложения принадлежат ему
+            boundary = (spans[idx + 1][0] + last + 1) // 2
+            own_end = units[boundary][0] if boundary < len(units) else len(text)
+        else:
+            own_end = len(text)
+        chunks.append(Chunk(units[first][0], units[last - 1][1], own_start, own_end))
+        own_start = own_end
+    return chunks
+
+
+def stitch_entities(chunk_entities, chunks, offset=0):
+    """Склейка сущностей фрагментов (смещения уже глобальные): сущность остается
+    из фрагмента, которому принадлежит ее начало, из пересекающихся остается
+    более длинная; id ent-N выдаются заново в порядке текста"""
+    entities = []
+    for chunk, found in zip(chunks, chunk_entities):
+        entities.extend(
+            entity for entity in found
+            if offset + chunk.own_start <= entity['start'] < offset + chunk.own_end
+        )
+    entities.sort(key=lambda entity: (entity['start'], -entity['end']))
+    stitched = []
+    for entity in entities:
+        if stitched and entity['start'] < stitched[-1]['end']:
+            if entity['end'] - entity['start'] > stitched[-1]['end'] - stitched[-1]['start']:
+                stitched[-1] = entity
+            continue
+        stitched.append(entity)
+    renumber_entities(stitched)
+    return stitched
@@ -0,0 +1,136 @@
+"""Объединение повторных упоминаний сущности (кореферентность по именам).
+
+NER возвращает каждое упоминание отдельной сущностью, поэтому «Payment
+Service», встреченный в тексте десять раз, дает десять узлов диаграммы и
+все их попарные сочетания в RE. Упоминания одного типа объединяются, если
+их нормализованные имена совпадают (регистр, пунктуация и артикли не
+учитываются) или достаточно похожи: доля совпавших токенов (Жаккар, где
+длинные токены сравниваются нечетко -- «services» и «service») не ниже
+порога. Для нечеткого сравнения берутся только группы с общим префиксом
+токена, так что упоминания не сравниваются все со всеми.
+
+Объединенная сущность -- первое упоминание (text, start, end) со списком
+всех упоминаний в "mentions"; id ent-N выдаются в порядке первого упоминания.
+"""
+import re
+from difflib import SequenceMatcher
+
+ARTICLES = {"a", "an", "the"}
+WORD_RE = re.compile(r"\w+")
+# Токены короче сравниваются только точно (иначе «v1» совпадает с «v2»)
+FUZZY_TOKEN_MIN_LENGTH = 4
+FUZZY_TOKEN_SIMILARITY = 0.85
+BLOCK_PREFIX = 4
+
+
+def name_tokens(text):
+    """Токены имени в нижнем регистре без пунктуации и артиклей"""
+    return [token for token in WORD_RE.findall(text.lower()) if token not in ARTICLES]
+
+
+def tokens_match(a, b):
+    if a == b:
+        return True
+    if min(len(a), len(b)) < FUZZY_TOKEN_MIN_LENGTH:
+        return False
+    return SequenceMatcher(None, a, b).ratio() >= FUZZY_TOKEN_SIMILARITY
+
+
+def name_similarity(a, b):
+    """Коэффициент Жаккара наборов токенов с нечетким совпадением токенов"""
+    left, right = sorted(set(a)), sorted(set(b))
+    if not left or not right:
+        return 0.0
+    unmatched = list(right)
+    matched = 0
+    for token in left:
+        for idx, other in enumerate(unmatched):
+            if tokens_match(token, other):
+                matched += 1
+                del unmatched[idx]
+                break
+    return matched / (len(left) + len(right) - matched)
+
+
+def entity_mentions(entity):
+    """Упоминания сущности [{start, end, text}] (у необъединенной -- она сама)"""
+    return entity.get("mentions") or [{"start": entity["start"], "end": entity["end"], "text": entity["text"]}]
+
+
+def merge_group(entities, group):
+    """Сущность из группы упоминаний: первое упоминание и список всех упоминаний"""
+    mentions = [mention for idx in group for mention in entity_mentions(entities[idx])]
+    mentions.sort(key=lambda mention: (mention["start"], mention["end"]))
+    return {**entities[group[0]], "mentions": mentions}
+
+
+class CoreferenceIndex:
+    """Группировка упоминаний по именам. threshold -- минимальное сходство
+    имен для нечеткого объединения (1.0 -- только точное совпадение)"""
+
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+
+    def group(self, entities, stats=None):
+        """Группы индексов entities, относящихся к одной сущности, в порядке первого упоминания"""
+        groups = []
+        names = []
+        exact = {}
+        blocks = {}
+        exact_merges = 0
+        fuzzy_merges = 0
+        for idx, entity in enumerate(entities):
+            tokens = name_tokens(entity["text"])
+            key = (entity["type"], " ".join(tokens))
+            target = exact.get(key) if tokens else None
+            if target is not None:
+                exact_merges += 1
+            elif tokens and self.threshold < 1.0:
+                candidates = set()
+                for token in set(tokens):
+                    candidates.update(blocks.get((entity["type"], token[:BLOCK_PREFIX]), ()))
+                best_score = self.threshold
+                for candidate in sorted(candidates):
+                    score = name_similarity(tokens, names[candidate])
+                    if score >= best_score and (target is None or score > best_score):
+                        target, best_score = candidate, score
+                if target is not None:
+                    fuzzy_merges += 1
+                    exact[key] = target
+
+            if target is None:
+                target = len(groups)
+                groups.append([])
+                names.append(tokens)
+                if tokens:
+                    exact[key] = target
+                    for token in set(tokens):
+                        blocks.setdefault((entity["type"], token[:BLOCK_PREFIX]), []).append(target)
+            groups[target].append(idx)
+
+        if stats is not None:
+            stats.update({
+                "exact_merges": exact_merges,
+                "fuzzy_merges": fuzzy_merges
+            })
+        return groups
+
+    def merge(self, entities, stats=None):
+        """Сущности с объединенными упоминаниями. entities -- в порядке текста.
+        В stats -- число упоминаний и сущностей, слияний и всех пар до и после"""
+        counters = {}
+        groups = self.group(entities, counters)
+        merged = []
+        for group in groups:
+            merged.append({**merge_group(entities, group), "id": f"ent-{len(merged)}"})
+
+        if stats is not None:
+            n, m = len(entities), len(merged)
+            stats.update({
+                "mentions": n,
+                "entities": m,
+                **counters,
+                "pairs_before": n * (n - 1) // 2,
+                "pairs_after": m * (m - 1) // 2
+            })
+        return merged
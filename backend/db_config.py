@@ -0,0 +1,65 @@
+"""Настройки подключения к БД из окружения.
+
+    DATABASE_URL             -- URL SQLAlchemy (по умолчанию sqlite:///c4architect.db
+                                в каталоге instance)
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+                             -- пул соединений
+    SQLITE_JOURNAL_MODE      -- WAL: читатели не блокируют писателя и наоборот
+    SQLITE_SYNCHRONOUS       -- NORMAL: в режиме WAL безопасно и без fsync на каждый коммит
+    SQLITE_BUSY_TIMEOUT_MS   -- ожидание блокировки вместо "database is locked"
+    SQLITE_CACHE_SIZE_KB     -- размер страничного кеша на соединение
+"""
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DEFAULT_DATABASE_URL = 'sqlite:///c4architect.db'
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def engine_options(url, environ):
+    """Параметры create_engine для SQLALCHEMY_ENGINE_OPTIONS"""
+    options = {"pool_pre_ping": environ.get('DB_POOL_PRE_PING', '1') == '1'}
+    if is_sqlite(url):
+        options["connect_args"] = {"timeout": int(environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000.0}
+        database = make_url(url).database
+        if not database or database == ':memory:':
+            # База в памяти живет в одном соединении, пул для нее не настраивается
+            return options
+    options.update({
+        "pool_size": int(environ.get('DB_POOL_SIZE', 10)),
+        "max_overflow": int(environ.get('DB_MAX_OVERFLOW', 20)),
+        "pool_timeout": float(environ.get('DB_POOL_TIMEOUT', 30)),
+        "pool_recycle": int(environ.get('DB_POOL_RECYCLE', 1800))
+    })
+    return options
+
+
+def sqlite_pragmas(environ):
+    """PRAGMA для каждого нового соединения SQLite"""
+    return [
+        ("journal_mode", environ.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ("synchronous", environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ("busy_timeout", int(environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))),
+        ("cache_size", -int(environ.get('SQLITE_CACHE_SIZE_KB', 20000))),
+        ("temp_store", "MEMORY")
+    ]
+
+
+def install_sqlite_pragmas(pragmas):
+    """Выполнение pragmas при открытии каждого соединения SQLite"""
+
+    @event.listens_for(Engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return set_sqlite_pragmas
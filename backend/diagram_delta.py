@@ -0,0 +1,617 @@
+"""Патчи диаграммы: операции над иерархией C4, хранящейся на сервере.
+
+Клиент один раз присылает полную иерархию (она становится версией 1),
+дальше -- списки операций против известной ему версии:
+
+    {"op": "add", "kind": "container", "id": "c1", "name": "API", "type": "container", "parent": "s1"}
+    {"op": "remove", "id": "c1"}
+    {"op": "rename", "id": "c1", "name": "Public API"}
+    {"op": "move", "id": "c1", "parent": "s2"}              -- смена родителя
+    {"op": "move", "id": "c1", "position": {"x": 10, "y": 20}}  -- перенос узла
+
+Ответ содержит только затронутые узлы, ребра и фрагменты PlantUML, так что
+размер ответа и работа сервера пропорциональны правке, а не диаграмме.
+Полный код собирается из фрагментов в порядке generate_c4_code: заголовок,
+system:<id> по порядку систем, "\\n\\n' Relations\\n", rels:<id> и затем
+boundary:<id> по порядку систем, контейнеров и компонентов, "@enduml".
+Для каждого фрагмента передается ключ предыдущего фрагмента (after).
+
+Патч применяется целиком или не применяется: изменения пишутся в журнал
+отката, при ошибке любой операции журнал проигрывается в обратном порядке.
+
+Документ восстанавливается из снимка (snapshot: иерархия, узлы, ребра), так
+что его можно хранить в БД и продолжать патчи в любом процессе.
+
+Списки уровней хранятся как OrderedElements (связный список с индексом),
+поэтому удаление элемента и поиск предыдущего фрагмента не просматривают
+весь уровень: операция стоит O(числа детей затронутого родителя).
+"""
+import threading
+from collections import OrderedDict
+
+# Уровень C4 -> (список в иерархии, ключ списка детей в элементе)
+LEVELS = {
+    1: ("systems", "containers"),
+    2: ("containers", "components"),
+    3: ("components", "code_elements"),
+    4: ("code_elements", None)
+}
+KINDS = {"system": 1, "container": 2, "component": 3, "code": 4}
+# Разделы кода, состоящие из фрагментов по элементам уровней 1..3
+FRAGMENT_SECTIONS = ("rels", "boundary")
+
+NODE_SPACING = 220
+LAYER_GAP = 200
+MARGIN = 100
+
+
+# Обязательные поля операций и типы полей
+OP_FIELDS = {
+    "add": ("id", "name"),
+    "remove": ("id",),
+    "rename": ("id", "name"),
+    "move": ("id",)
+}
+FIELD_TYPES = {"id": str, "name": str, "parent": str, "kind": str, "type": str, "level": int}
+
+
+class PatchError(Exception):
+    """Некорректная операция патча"""
+
+
+class VersionConflict(Exception):
+    """Патч составлен для устаревшей версии диаграммы"""
+
+
+def validate_op(op):
+    """Проверка полей операции до применения: некорректный ввод -- PatchError, а не TypeError/KeyError"""
+    for field in OP_FIELDS[op["op"]]:
+        if op.get(field) is None:
+            raise PatchError(f"{op['op']} requires {field}")
+    for field, field_type in FIELD_TYPES.items():
+        value = op.get(field)
+        if value is not None and (not isinstance(value, field_type) or isinstance(value, bool)):
+            raise PatchError(f"{field} must be a {'string' if field_type is str else 'number'}")
+    position = op.get("position")
+    if position is not None:
+        if not isinstance(position, dict) or any(
+                not isinstance(position.get(axis), (int, float)) or isinstance(position.get(axis), bool)
+                for axis in ("x", "y")):
+            raise PatchError("position requires numeric x and y")
+
+
+class OrderedElements:
+    """Элементы уровня в порядке иерархии: добавление, удаление и поиск
+    соседа за O(1). Элементы различаются по identity (id в иерархии могут повторяться)"""
+
+    def __init__(self, elements=()):
+        self._links = {}
+        self._head = None
+        self._tail = None
+        for element in elements:
+            self.append(element)
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, element):
+        return id(element) in self._links
+
+    def __iter__(self):
+        element = self._head
+        while element is not None:
+            yield element
+            element = self._links[id(element)][1]
+
+    def append(self, element):
+        self.insert_after(self._tail, element)
+
+    def insert_after(self, previous, element):
+        """Вставка после previous (None -- в начало)"""
+        if id(element) in self._links:
+            raise ValueError(f"Element {element.get('id')} is already in the list")
+        following = self._links[id(previous)][1] if previous is not None else self._head
+        self._links[id(element)] = [previous, following, element]
+        if previous is not None:
+            self._links[id(previous)][1] = element
+        else:
+            self._head = element
+        if following is not None:
+            self._links[id(following)][0] = element
+        else:
+            self._tail = element
+
+    def remove(self, element):
+        """Удаление элемента; возвращает предыдущий элемент (для отката)"""
+        previous, following, _ = self._links.pop(id(element))
+        if previous is not None:
+            self._links[id(previous)][1] = following
+        else:
+            self._head = following
+        if following is not None:
+            self._links[id(following)][0] = previous
+        else:
+            self._tail = previous
+        return previous
+
+    def pop(self):
+        element = self._tail
+        self.remove(element)
+        return element
+
+    def previous(self, element):
+        return self._links[id(element)][0]
+
+    def last(self):
+        return self._tail
+
+
+def plantuml_system_line(system):
+    """Объявление системы или актора"""
+    if system.get("type") == "actor":
+        return f'Person({system["id"]}, "{system["name"]}", "")\n'
+    if system.get("type") == "external":
+        return f'System_Ext({system["id"]}, "{system["name"]}", "")\n'
+    return f'System({system["id"]}, "{system["name"]}", "")\n'
+
+
+def plantuml_relation_lines(element, level):
+    """Связи Rel от элемента к его детям"""
+    children_key = LEVELS[level][1]
+    if children_key is None or children_key not in element:
+        return ""
+    return "".join(f'Rel({element["id"]}, {child["id"]}, "Uses")\n' for child in element[children_key])
+
+
+def plantuml_boundary(element, level):
+    """Блок *_Boundary с детьми элемента (пустая строка, если детей нет)"""
+    children_key = LEVELS[level][1]
+    children = element.get(children_key) if children_key else None
+    if not children:
+        return ""
+    if level == 1:
+        lines = [f'System_Boundary({element["id"]}_boundary, "{element["name"]} Boundary") {{\n']
+        for container in children:
+            if container["type"] == "database":
+                lines.append(f'  ContainerDb({container["id"]}, "{container["name"]}", "")\n')
+            elif container["type"] == "queue":
+                lines.append(f'  Queue({container["id"]}, "{container["name"]}", "")\n')
+            else:
+                lines.append(f'  Container({container["id"]}, "{container["name"]}", "")\n')
+    elif level == 2:
+        lines = [f'Container_Boundary({element["id"]}_boundary, "{element["name"]} Components") {{\n']
+        for component in children:
+            lines.append(f'  Component({component["id"]}, "{component["name"]}", "")\n')
+    else:
+        lines = [f'Component_Boundary({element["id"]}_boundary, "{element["name"]} Code") {{\n']
+        for code_elem in children:
+            lines.append(f'  Component({code_elem["id"]}, "{code_elem["name"]}", "{code_elem["type"]}")\n')
+    lines.append("}\n\n")
+    return "".join(lines)
+
+
+def diagram_node(element, level, parent_id=None, position=None):
+    """Узел ReactFlow для элемента иерархии"""
+    if level == 1:
+        entity_type = element.get("type", "SYSTEM").upper()
+    elif level == 2:
+        entity_type = element["type"].upper()
+    elif level == 3:
+        entity_type = "COMPONENT"
+    else:
+        entity_type = "CODE"
+    data = {
+        "label": element["name"],
+        "entityType": entity_type,
+        "level": level
+    }
+    if level > 1:
+        data["parent"] = parent_id
+    return {
+        "id": element["id"],
+        "type": "c4",
+        "position": position or {"x": 0, "y": 0},
+        "data": data
+    }
+
+
+def diagram_edge(parent_id, child_id, parent_level):
+    """Ребро ReactFlow от родителя к ребенку"""
+    return {
+        "id": f"edge-{parent_id}-{child_id}",
+        "source": parent_id,
+        "target": child_id,
+        "label": "Implements" if parent_level == 3 else "Contains",
+        "level": parent_level
+    }
+
+
+class DiagramDocument:
+    """Иерархия диаграммы на сервере с индексами для применения патчей.
+    source -- исходные данные версии (текст, сущности, отношения), которые
+    переносятся в следующие версии без изменений"""
+
+    def __init__(self, hierarchy, nodes, edges, version=1, source=None):
+        self.hierarchy = {name: OrderedElements(hierarchy.get(name, [])) for name, _ in LEVELS.values()}
+        self.version = version
+        self.source = source or {}
+        self.lock = threading.Lock()
+        self.levels = {}
+        self.parents = {}
+        self.elements = {}
+        for level, (list_key, children_key) in LEVELS.items():
+            for element in self.hierarchy[list_key]:
+                self.levels.setdefault(element["id"], level)
+                self.parents.setdefault(element["id"], [])
+                self.elements.setdefault(element["id"], element)
+        for level, (list_key, children_key) in LEVELS.items():
+            if children_key is None:
+                continue
+            for element in self.hierarchy[list_key]:
+                children = element.get(children_key)
+                if not children:
+                    continue
+                # После JSON ребенок -- копия элемента уровня: связываем с самим элементом,
+                # как в иерархии из build_c4_hierarchy, чтобы правки были видны у всех родителей
+                element[children_key] = [self.elements.get(child["id"], child) for child in children]
+                for child in element[children_key]:
+                    self.parents.setdefault(child["id"], []).append(element["id"])
+        # Узел на id (первое вхождение), ребра по id
+        self.nodes = {}
+        for node in nodes:
+            self.nodes.setdefault(node["id"], node)
+        self.edges = {edge["id"]: edge for edge in edges}
+        self._undo = None
+        self._changes = None
+
+    def snapshot(self):
+        """Иерархия, узлы и ребра текущей версии (сериализуемые в JSON)"""
+        return {
+            "hierarchy": {list_key: list(self.hierarchy[list_key]) for list_key, _ in LEVELS.values()},
+            "nodes": list(self.nodes.values()),
+            "edges": list(self.edges.values())
+        }
+
+    # Журналируемые изменения
+
+    def _set(self, mapping, key, value):
+        if key in mapping:
+            previous = mapping[key]
+            self._undo.append(lambda: mapping.__setitem__(key, previous))
+        else:
+            self._undo.append(lambda: mapping.pop(key, None))
+        mapping[key] = value
+
+    def _delete(self, mapping, key):
+        if key in mapping:
+            previous = mapping.pop(key)
+            self._undo.append(lambda: mapping.__setitem__(key, previous))
+
+    def _append(self, items, item):
+        items.append(item)
+        self._undo.append(items.pop)
+
+    def _remove_ordered(self, ordered, element):
+        # Как и _remove: отсутствующий элемент (повтор id в иерархии) пропускается
+        if element not in ordered:
+            return
+        previous = ordered.remove(element)
+        self._undo.append(lambda: ordered.insert_after(previous, element))
+
+    def _remove(self, items, item):
+        for idx, existing in enumerate(items):
+            # Элементы иерархии сравниваются по identity, id родителей -- по значению
+            if existing is item or (not isinstance(item, dict) and existing == item):
+                del items[idx]
+                self._undo.append(lambda: items.insert(idx, existing))
+                return
+
+    # Отметки об изменениях
+
+    def _touch_node(self, element_id):
+        self._changes["nodes"].add(element_id)
+
+    def _touch_edge(self, edge_id):
+        self._changes["edges"].add(edge_id)
+
+    def _touch_fragments(self, element_id, *sections):
+        for section in sections:
+            self._changes["fragments"].add(f"{section}:{element_id}")
+
+    # Операции
+
+    def _require(self, element_id):
+        if element_id not in self.elements:
+            raise PatchError(f"Unknown element: {element_id}")
+        return self.elements[element_id], self.levels[element_id]
+
+    def _require_parent(self, parent_id, level):
+        parent, parent_level = self._require(parent_id)
+        if parent_level != level - 1:
+            raise PatchError(f"Element {parent_id} cannot be a parent of a level {level} element")
+        return parent
+
+    def _attach(self, element, level, parent):
+        children_key = LEVELS[level - 1][1]
+        if children_key not in parent:
+            self._set(parent, children_key, [])
+        self._append(parent[children_key], element)
+        self._append(self.parents[element["id"]], parent["id"])
+        edge = diagram_edge(parent["id"], element["id"], level - 1)
+        self._set(self.edges, edge["id"], edge)
+        self._touch_edge(edge["id"])
+        self._touch_fragments(parent["id"], *FRAGMENT_SECTIONS)
+
+    def _detach(self, element, level, parent):
+        children_key = LEVELS[level - 1][1]
+        self._remove(parent.get(children_key, []), element)
+        self._remove(self.parents[element["id"]], parent["id"])
+        edge_id = f"edge-{parent['id']}-{element['id']}"
+        self._delete(self.edges, edge_id)
+        self._touch_edge(edge_id)
+        self._touch_fragments(parent["id"], *FRAGMENT_SECTIONS)
+
+    def _sync_node_parent(self, element_id):
+        node = self.nodes.get(element_id)
+        parents = self.parents.get(element_id, [])
+        if node is not None and self.levels[element_id] > 1 and parents:
+            if node["data"].get("parent") != parents[0]:
+                self._set(node, "data", dict(node["data"], parent=parents[0]))
+                self._touch_node(element_id)
+
+    def add(self, op):
+        level = op.get("level") or KINDS.get(op.get("kind"))
+        if level not in LEVELS:
+            raise PatchError("add requires kind: system, container, component or code")
+        element_id = op["id"]
+        name = op["name"]
+        if not element_id:
+            raise PatchError("add requires id and name")
+        if element_id in self.elements:
+            raise PatchError(f"Element already exists: {element_id}")
+        element_type = op.get("type")
+
+        if level == 1:
+            if element_type in ("actor", "external"):
+                element = {"id": element_id, "name": name, "type": element_type, "description": ""}
+            else:
+                element = {"id": element_id, "name": name, "description": "", "containers": []}
+        elif level == 2:
+            element = {"id": element_id, "name": name, "type": (element_type or "container").lower(), "components": []}
+        elif level == 3:
+            element = {"id": element_id, "name": name, "code_elements": []}
+        else:
+            element = {
+                "id": element_id,
+                "name": name,
+                "type": element_type or ("function" if "function" in name.lower() else "class")
+            }
+
+        parent = None
+        if level > 1:
+            if not op.get("parent"):
+                raise PatchError(f"add of a level {level} element requires parent")
+            parent = self._require_parent(op["parent"], level)
+
+        self._append(self.hierarchy[LEVELS[level][0]], element)
+        self._set(self.elements, element_id, element)
+        self._set(self.levels, element_id, level)
+        self._set(self.parents, element_id, [])
+        if parent is not None:
+            self._attach(element, level, parent)
+
+        position = op.get("position")
+        if position is None:
+            position = self._default_position(element_id, level, parent)
+        node = diagram_node(element, level, parent["id"] if parent else None, {"x": position["x"], "y": position["y"]})
+        self._set(self.nodes, element_id, node)
+        self._touch_node(element_id)
+        if level == 1:
+            self._touch_fragments(element_id, "system")
+        if level < 4:
+            self._touch_fragments(element_id, *FRAGMENT_SECTIONS)
+
+    def _default_position(self, element_id, level, parent):
+        """Позиция нового узла: под родителем правее его детей либо справа от систем"""
+        if parent is None:
+            index = len(self.hierarchy["systems"]) - 1
+            return {"x": MARGIN + index * NODE_SPACING, "y": MARGIN}
+        parent_node = self.nodes.get(parent["id"])
+        siblings = len(parent.get(LEVELS[level - 1][1], [])) - 1
+        base = parent_node["position"] if parent_node else {"x": MARGIN, "y": MARGIN + (level - 2) * LAYER_GAP}
+        return {"x": base["x"] + siblings * NODE_SPACING, "y": base["y"] + LAYER_GAP}
+
+    def remove(self, op):
+        element, level = self._require(op["id"])
+        self._remove_element(element, level)
+
+    def _remove_element(self, element, level):
+        element_id = element["id"]
+        for parent_id in list(self.parents[element_id]):
+            self._detach(element, level, self.elements[parent_id])
+        children_key = LEVELS[level][1]
+        for child in list(element.get(children_key) or ()):
+            self._detach(child, level + 1, element)
+            # Ребенок без других родителей удаляется вместе с элементом
+            if not self.parents[child["id"]]:
+                self._remove_element(child, level + 1)
+            else:
+                self._sync_node_parent(child["id"])
+
+        self._remove_ordered(self.hierarchy[LEVELS[level][0]], element)
+        self._delete(self.elements, element_id)
+        self._delete(self.levels, element_id)
+        self._delete(self.parents, element_id)
+        self._delete(self.nodes, element_id)
+        self._touch_node(element_id)
+        if level == 1:
+            self._touch_fragments(element_id, "system")
+        if level < 4:
+            self._touch_fragments(element_id, *FRAGMENT_SECTIONS)
+
+    def rename(self, op):
+        element, level = self._require(op["id"])
+        name = op["name"]
+        self._set(element, "name", name)
+        node = self.nodes.get(element["id"])
+        if node is not None:
+            self._set(node, "data", dict(node["data"], label=name))
+            self._touch_node(element["id"])
+        if level == 1:
+            self._touch_fragments(element["id"], "system")
+        if level < 4:
+            self._touch_fragments(element["id"], "boundary")
+        for parent_id in self.parents[element["id"]]:
+            self._touch_fragments(parent_id, "boundary")
+
+    def move(self, op):
+        element, level = self._require(op["id"])
+        if op.get("parent") is None and op.get("position") is None:
+            raise PatchError("move requires parent or position")
+        if op.get("parent") is not None:
+            if level == 1:
+                raise PatchError("Systems have no parent")
+            parent = self._require_parent(op["parent"], level)
+            for parent_id in list(self.parents[element["id"]]):
+                self._detach(element, level, self.elements[parent_id])
+            self._attach(element, level, parent)
+            if element["id"] in self.nodes:
+                self._sync_node_parent(element["id"])
+            else:
+                # Элемент без узла (не был достижим из систем) получает узел под новым родителем
+                position = self._default_position(element["id"], level, parent)
+                self._set(self.nodes, element["id"], diagram_node(element, level, parent["id"], position))
+                self._touch_node(element["id"])
+        if op.get("position") is not None:
+            position = op["position"]
+            node = self.nodes.get(element["id"])
+            if node is not None:
+                self._set(node, "position", {"x": position["x"], "y": position["y"]})
+                self._touch_node(element["id"])
+
+    OPERATIONS = {"add": add, "remove": remove, "rename": rename, "move": move}
+
+    def apply(self, ops, base_version):
+        """Применение операций к версии base_version; результат -- изменения для клиента"""
+        if base_version != self.version:
+            raise VersionConflict(f"Diagram is at version {self.version}, patch is for {base_version}")
+        if not isinstance(ops, list):
+            raise PatchError("ops must be a list")
+        self._undo = []
+        self._changes = {"nodes": set(), "edges": set(), "fragments": set()}
+        try:
+            for idx, op in enumerate(ops):
+                name = op.get("op") if isinstance(op, dict) else None
+                handler = self.OPERATIONS.get(name) if isinstance(name, str) else None
+                if handler is None:
+                    raise PatchError(f"Unknown operation at index {idx}")
+                try:
+                    validate_op(op)
+                    handler(self, op)
+                except PatchError as e:
+                    raise PatchError(f"Operation {idx} ({op['op']}): {e}")
+        except Exception:
+            for undo in reversed(self._undo):
+                undo()
+            raise
+        finally:
+            changes, self._changes, self._undo = self._changes, None, None
+
+        self.version += 1
+        return self._delta(changes)
+
+    # Ответ
+
+    def _delta(self, changes):
+        nodes, removed_nodes = [], []
+        for element_id in sorted(changes["nodes"]):
+            if element_id in self.nodes:
+                nodes.append(self.nodes[element_id])
+            else:
+                removed_nodes.append(element_id)
+        edges, removed_edges = [], []
+        for edge_id in sorted(changes["edges"]):
+            if edge_id in self.edges:
+                edges.append(self.edges[edge_id])
+            else:
+                removed_edges.append(edge_id)
+        fragments = [self._fragment(key) for key in sorted(changes["fragments"])]
+        return {
+            "version": self.version,
+            "nodes": nodes,
+            "removed_nodes": removed_nodes,
+            "edges": edges,
+            "removed_edges": removed_edges,
+            "plantuml_fragments": fragments
+        }
+
+    def fragments(self):
+        """Все фрагменты по порядку (для начальной загрузки клиента)"""
+        result = []
+        for section, levels in (("system", (1,)), ("rels", (1, 2, 3)), ("boundary", (1, 2, 3))):
+            after = None
+            for level in levels:
+                for element in self.hierarchy[LEVELS[level][0]]:
+                    key = f"{section}:{element['id']}"
+                    if section == "system":
+                        text = plantuml_system_line(element)
+                    elif section == "rels":
+                        text = plantuml_relation_lines(element, level)
+                    else:
+                        text = plantuml_boundary(element, level)
+                    result.append({"key": key, "text": text, "after": after})
+                    after = key
+        return result
+
+    def _fragment(self, key):
+        section, element_id = key.split(":", 1)
+        element = self.elements.get(element_id)
+        level = self.levels.get(element_id)
+        if element is None or (section == "system" and level != 1) or (section != "system" and level == 4):
+            return {"key": key, "text": None, "after": None}
+        if section == "system":
+            text = plantuml_system_line(element)
+        elif section == "rels":
+            text = plantuml_relation_lines(element, level)
+        else:
+            text = plantuml_boundary(element, level)
+        return {"key": key, "text": text, "after": self._previous_key(section, element, level)}
+
+    def _previous_key(self, section, element, level):
+        """Ключ предыдущего фрагмента того же раздела (None -- фрагмент первый)"""
+        previous = self.hierarchy[LEVELS[level][0]].previous(element)
+        if previous is not None:
+            return f"{section}:{previous['id']}"
+        if section != "system":
+            for previous_level in range(level - 1, 0, -1):
+                last = self.hierarchy[LEVELS[previous_level][0]].last()
+                if last is not None:
+                    return f"{section}:{last['id']}"
+        return None
+
+
+class DiagramStore:
+    """Документы диаграмм по ключу (пользователь, диаграмма), LRU"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def put(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._documents.pop(key, None)
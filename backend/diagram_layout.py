@@ -0,0 +1,161 @@
+"""Послойная (Sugiyama) раскладка узлов C4 диаграммы на сервере.
+
+Слои -- уровни C4 (data.level узла). Порядок узлов в слоях подбирается
+эвристикой барицентров с чередованием проходов сверху вниз и снизу вверх,
+что уменьшает число пересечений ребер. Координаты считаются векторно
+через NumPy: узел ставится под барицентр родителей, наложения снимаются
+накопительным максимумом. Слишком широкие слои переносятся на несколько
+строк, чтобы диаграмма не растягивалась в одну линию.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LayeredLayout:
+    """Раскладка с LRU кешем координат по ключу (например, хешу иерархии)"""
+
+    def __init__(self, node_spacing=220, layer_gap=200, row_gap=120, margin=100,
+                 max_per_row=40, iterations=4, max_cache=64):
+        self.node_spacing = node_spacing
+        self.layer_gap = layer_gap
+        self.row_gap = row_gap
+        self.margin = margin
+        self.max_per_row = max_per_row
+        self.iterations = iterations
+        self.max_cache = max_cache
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(hierarchy):
+        """Ключ кеша: хеш канонического JSON иерархии"""
+        material = json.dumps(hierarchy, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha1(material.encode("utf-8")).hexdigest()
+
+    def positions(self, nodes, edges, key=None):
+        """Список {"x", "y"} для каждого узла (в порядке nodes)"""
+        if key is not None:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return cached
+
+        result = self._compute(nodes, edges)
+
+        if key is not None:
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self.max_cache:
+                    self._cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _compute(self, nodes, edges):
+        n = len(nodes)
+        if n == 0:
+            return []
+
+        levels = np.array([node.get("data", {}).get("level", 1) for node in nodes])
+        layer_values = np.unique(levels)
+        layer_of = np.searchsorted(layer_values, levels)
+        n_layers = len(layer_values)
+
+        # Ребра между соседними слоями, направленные сверху вниз (по первому узлу с таким id)
+        index_of_id = {}
+        for idx, node in enumerate(nodes):
+            index_of_id.setdefault(node["id"], idx)
+        upper = []
+        lower = []
+        for edge in edges:
+            source = index_of_id.get(edge["source"])
+            target = index_of_id.get(edge["target"])
+            if source is None or target is None:
+                continue
+            if layer_of[source] > layer_of[target]:
+                source, target = target, source
+            if layer_of[target] - layer_of[source] == 1:
+                upper.append(source)
+                lower.append(target)
+        upper = np.array(upper, dtype=np.int64)
+        lower = np.array(lower, dtype=np.int64)
+        edge_layer = layer_of[lower] if len(lower) else np.array([], dtype=np.int64)
+
+        layers = [np.flatnonzero(layer_of == layer) for layer in range(n_layers)]
+        order = np.zeros(n)
+        for members in layers:
+            order[members] = np.arange(len(members))
+
+        # Снижение числа пересечений: барицентры соседей в соседнем слое
+        for _ in range(self.iterations):
+            for layer in range(1, n_layers):
+                mask = edge_layer == layer
+                layers[layer] = self._reorder(layers[layer], lower[mask], upper[mask], order, n)
+            for layer in range(n_layers - 2, -1, -1):
+                mask = edge_layer == layer + 1
+                layers[layer] = self._reorder(layers[layer], upper[mask], lower[mask], order, n)
+
+        # Координаты: x -- под барицентром родителей без наложений, широкие слои переносятся
+        x = np.zeros(n)
+        y = np.zeros(n)
+        wrapped = [len(members) > self.max_per_row for members in layers]
+        y_offset = float(self.margin)
+        for layer, members in enumerate(layers):
+            count = len(members)
+            if count == 0:
+                continue
+            idx = np.arange(count)
+            if wrapped[layer]:
+                rows = (count + self.max_per_row - 1) // self.max_per_row
+                x[members] = self.margin + (idx % self.max_per_row) * self.node_spacing
+                y[members] = y_offset + (idx // self.max_per_row) * self.row_gap
+                y_offset += (rows - 1) * self.row_gap + self.layer_gap
+                continue
+            mask = edge_layer == layer
+            x[members] = self._place(members, lower[mask], upper[mask], x, n)
+            y[members] = y_offset
+            y_offset += self.layer_gap
+
+        # Обратный проход: родители центрируются над своими потомками
+        for layer in range(n_layers - 2, -1, -1):
+            if wrapped[layer] or len(layers[layer]) == 0:
+                continue
+            mask = edge_layer == layer + 1
+            x[layers[layer]] = self._place(layers[layer], upper[mask], lower[mask], x, n)
+        x += self.margin - x.min()
+
+        return [{"x": float(round(px, 1)), "y": float(round(py, 1))} for px, py in zip(x, y)]
+
+    def _place(self, members, key_nodes, neighbor_nodes, x, n):
+        """x узлов слоя: барицентр x соседей, затем сдвиг вправо до шага node_spacing"""
+        count = len(members)
+        idx = np.arange(count)
+        desired = np.full(count, float(self.margin))
+        if len(key_nodes):
+            sums = np.bincount(key_nodes, weights=x[neighbor_nodes], minlength=n)
+            counts = np.bincount(key_nodes, minlength=n)
+            has_neighbors = counts[members] > 0
+            desired[has_neighbors] = sums[members][has_neighbors] / counts[members][has_neighbors]
+        # x_i = max(desired_i, x_(i-1) + шаг) для всех i сразу
+        base = np.maximum.accumulate(np.maximum(desired, self.margin) - idx * self.node_spacing)
+        return base + idx * self.node_spacing
+
+    @staticmethod
+    def _reorder(members, key_nodes, neighbor_nodes, order, n):
+        """Сортировка слоя по барицентру позиций соседей; узлы без соседей сохраняют позицию"""
+        if len(members) < 2 or len(key_nodes) == 0:
+            return members
+        sums = np.bincount(key_nodes, weights=order[neighbor_nodes], minlength=n)
+        counts = np.bincount(key_nodes, minlength=n)
+        member_counts = counts[members]
+        barycenter = np.where(member_counts > 0, sums[members] / np.maximum(member_counts, 1), order[members])
+        members = members[np.argsort(barycenter, kind="stable")]
+        order[members] = np.arange(len(members))
+        return members
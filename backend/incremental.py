@@ -0,0 +1,222 @@
+"""Инкрементальное переизвлечение сущностей и отношений для отредактированного текста.
+
+Новый текст сравнивается с предыдущей обработанной версией по предложениям:
+NER запускается только на измененных предложениях, сущности из неизменных
+предложений переносятся со сдвигом смещений start/end, а RE модель оценивает
+пары, которых не было среди кандидатов прошлого прогона (в них участвует
+новая сущность или сущности оказались рядом после правки), и пары, у которых
+изменился вход RE модели (relation_inputs): контекст пары может захватывать
+отредактированный фрагмент, даже если обе сущности перенесены. Идентификаторы
+ent-N перенумеровываются в порядке текста, как при полном прогоне.
+
+Объединенные сущности (coreference) переносятся по упоминаниям и после NER
+объединяются заново; сущность считается перенесенной, только если состоит
+ровно из всех упоминаний одной прежней сущности.
+"""
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from candidates import SENTENCE_BOUNDARY_RE
+from coreference import entity_mentions, merge_group
+
+
+def split_sentences(text):
+    """Границы предложений [(start, end)], покрывающие весь текст"""
+    starts = [0] + [m.end() for m in SENTENCE_BOUNDARY_RE.finditer(text)]
+    starts = sorted(set(start for start in starts if start < len(text)))
+    if not starts:
+        return []
+    return list(zip(starts, starts[1:] + [len(text)]))
+
+
+def renumber_entities(entities):
+    """Сортировка по смещению и выдача последовательных id. Возвращает {старый id: новый id}"""
+    entities.sort(key=lambda entity: (entity['start'], entity['end']))
+    id_map = {}
+    for idx, entity in enumerate(entities):
+        new_id = f"ent-{idx}"
+        if entity.get('id') is not None:
+            id_map[entity['id']] = new_id
+        entity['id'] = new_id
+    return id_map
+
+
+class ExtractionState:
+    """Результат предыдущего прогона: текст, предложения, сущности и отношения"""
+
+    def __init__(self, text, entities, relations):
+        self.text = text
+        self.sentences = split_sentences(text)
+        self.entities = entities
+        self.relations = relations
+
+
+class IncrementalExtractor:
+    """Обновление ExtractionState под новый текст.
+
+    ner_segments(segments) -- NER для списка (offset, segment_text), возвращает
+    список сущностей с глобальными смещениями для каждого сегмента;
+    candidate_pairs(entities, text) и score_pairs(pairs, text) -- отбор и
+    классификация пар, как в полном конвейере; relation_inputs(pairs, text) --
+    сравнимые ключи входа RE модели для пар (отношение переносится, только если
+    ключ не изменился; None -- вход зависит только от самих сущностей);
+    coreference -- CoreferenceIndex для объединения упоминаний (None -- без объединения)."""
+
+    def __init__(self, ner_segments, candidate_pairs, score_pairs, relation_inputs=None, coreference=None):
+        self.ner_segments = ner_segments
+        self.candidate_pairs = candidate_pairs
+        self.score_pairs = score_pairs
+        self.relation_inputs = relation_inputs
+        self.coreference = coreference
+
+    def update(self, previous, text, stats=None):
+        sentences = split_sentences(text)
+        old_strings = [previous.text[start:end] for start, end in previous.sentences]
+        new_strings = [text[start:end] for start, end in sentences]
+        matcher = SequenceMatcher(None, old_strings, new_strings, autojunk=False)
+
+        # Упоминания сущностей по предложениям старого текста
+        mentions = []
+        for entity in previous.entities:
+            base = {key: value for key, value in entity.items() if key != 'mentions'}
+            for mention in entity_mentions(entity):
+                mentions.append({**base, "start": mention['start'], "end": mention['end'], "text": mention['text']})
+        entities_by_sentence = {}
+        sentence_idx = 0
+        for entity in sorted(mentions, key=lambda entity: entity['start']):
+            while sentence_idx + 1 < len(previous.sentences) and \
+                    entity['start'] >= previous.sentences[sentence_idx + 1][0]:
+                sentence_idx += 1
+            entities_by_sentence.setdefault(sentence_idx, []).append(entity)
+
+        entities = []
+        reused_ids = set()
+        changed_segments = []
+        changed_sentences = 0
+        for tag, old_lo, old_hi, new_lo, new_hi in matcher.get_opcodes():
+            if tag == 'equal':
+                for old_idx, new_idx in zip(range(old_lo, old_hi), range(new_lo, new_hi)):
+                    shift = sentences[new_idx][0] - previous.sentences[old_idx][0]
+                    for entity in entities_by_sentence.get(old_idx, []):
+                        entities.append({**entity, "start": entity['start'] + shift, "end": entity['end'] + shift})
+                        reused_ids.add(entity['id'])
+            elif new_hi > new_lo:
+                # Подряд идущие измененные предложения обрабатываются одним сегментом
+                start = sentences[new_lo][0]
+                end = sentences[new_hi - 1][1]
+                changed_segments.append((start, text[start:end]))
+                changed_sentences += new_hi - new_lo
+
+        new_entities = []
+        if changed_segments:
+            for segment_entities in self.ner_segments(changed_segments):
+                for entity in segment_entities:
+                    entity['id'] = None
+                    new_entities.append(entity)
+        entities.extend(new_entities)
+        if self.coreference is not None:
+            entities, reused_ids = self._merge_mentions(entities, previous)
+
+        id_map = renumber_entities(entities)
+
+        # Пары между перенесенными сущностями, бывшие кандидатами и раньше, с тем же входом
+        # RE модели не переоцениваются: их отношения переносятся, а остальные пары (новые
+        # сущности, новые соседства после удаления предложений, измененный контекст)
+        # отправляются в RE модель
+        previous_pairs = {
+            (id_map[head['id']], id_map[tail['id']]): (head, tail)
+            for head, tail in self.candidate_pairs(previous.entities, previous.text)
+            if head['id'] in reused_ids and tail['id'] in reused_ids
+        }
+        previous_relations = {}
+        for relation in previous.relations:
+            if relation['source'] in reused_ids and relation['target'] in reused_ids:
+                previous_relations[(id_map[relation['source']], id_map[relation['target']])] = relation
+
+        kept = []
+        pairs = []
+        for head, tail in self.candidate_pairs(entities, text):
+            if (head['id'], tail['id']) in previous_pairs:
+                kept.append((head, tail))
+            else:
+                pairs.append((head, tail))
+        changed_contexts = 0
+        if kept and self.relation_inputs is not None:
+            old_inputs = self.relation_inputs([previous_pairs[(head['id'], tail['id'])] for head, tail in kept],
+                                              previous.text)
+            new_inputs = self.relation_inputs(kept, text)
+            unchanged = []
+            for pair, old_input, new_input in zip(kept, old_inputs, new_inputs):
+                if old_input == new_input:
+                    unchanged.append(pair)
+                else:
+                    pairs.append(pair)
+            changed_contexts = len(kept) - len(unchanged)
+            kept = unchanged
+
+        relations = []
+        for head, tail in kept:
+            relation = previous_relations.get((head['id'], tail['id']))
+            if relation is not None:
+                relations.append({**relation, "source": head['id'], "target": tail['id']})
+        reused_relations = len(relations)
+        relations.extend(self.score_pairs(pairs, text))
+
+        # Порядок отношений как при полном переборе пар i < j
+        position = {entity['id']: idx for idx, entity in enumerate(entities)}
+        relations.sort(key=lambda relation: (position[relation['source']], position[relation['target']]))
+
+        if stats is not None:
+            stats.update({
+                "sentences": len(sentences),
+                "changed_sentences": changed_sentences,
+                "reused_entities": len(reused_ids),
+                "new_entities": len(new_entities),
+                "reused_relations": reused_relations,
+                "changed_contexts": changed_contexts,
+                "rescored_pairs": len(pairs)
+            })
+
+        return ExtractionState(text, entities, relations)
+
+    def _merge_mentions(self, mentions, previous):
+        """Объединение упоминаний. Возвращает (сущности, id перенесенных прежних сущностей)"""
+        mention_counts = {entity['id']: len(entity_mentions(entity)) for entity in previous.entities}
+        mentions.sort(key=lambda mention: (mention['start'], mention['end']))
+        entities = []
+        reused_ids = set()
+        for group in self.coreference.group(mentions):
+            entity = merge_group(mentions, group)
+            old_ids = {mentions[idx]['id'] for idx in group}
+            old_id = old_ids.pop() if len(old_ids) == 1 else None
+            if old_id is not None and mention_counts.get(old_id) == len(group):
+                reused_ids.add(old_id)
+            else:
+                old_id = None
+            entity['id'] = old_id
+            entities.append(entity)
+        return entities, reused_ids
+
+
+class IncrementalStore:
+    """Последнее состояние извлечения на пару (пользователь, диаграмма), LRU"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def put(self, key, state):
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
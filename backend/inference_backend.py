@@ -0,0 +1,161 @@
+"""Бэкенды инференса NER/RE моделей на CPU.
+
+    pytorch    -- fp32 PyTorch eager (как раньше);
+    int8       -- динамическая int8 квантизация nn.Linear при загрузке:
+                  веса хранятся в int8, активации квантуются на лету;
+    onnx       -- модели, экспортированные convert_models() в ONNX_MODEL_DIR,
+                  выполняются ONNX Runtime;
+    onnx-int8  -- то же для ONNX моделей с int8 весами.
+
+Для ONNX бэкенда PyTorch модель остается на месте (config, токенизатор и
+pipeline transformers работают с ней как прежде), а ее forward подменяется
+вызовом сессии ONNX Runtime. onnx и onnxruntime -- необязательные
+зависимости, импортируются только при выборе ONNX бэкенда или конвертации.
+"""
+import inspect
+import os
+import threading
+import warnings
+
+BACKENDS = ("pytorch", "int8", "onnx", "onnx-int8")
+ONNX_OPSET = 17
+
+
+def onnx_model_file(onnx_dir, name, quantized=False):
+    """Путь к экспортированной модели: <onnx_dir>/<name>.onnx или <name>.int8.onnx"""
+    return os.path.join(onnx_dir, f"{name}.int8.onnx" if quantized else f"{name}.onnx")
+
+
+def quantize_dynamic_int8(model):
+    """Динамическая int8 квантизация линейных слоев модели"""
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    with warnings.catch_warnings():
+        # torch.ao.quantization объявлен устаревшим в пользу torchao, но eager API пока работает
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def is_token_classifier(model):
+    return model.__class__.__name__.endswith("ForTokenClassification")
+
+
+def model_input_names(model, encoding):
+    """Входы encoding в порядке аргументов forward (так их нумерует экспорт ONNX)"""
+    return [name for name in inspect.signature(model.forward).parameters if name in encoding]
+
+
+def export_onnx(model, tokenizer, path, opset=ONNX_OPSET):
+    """Экспорт классификатора transformers в ONNX с динамическими batch и sequence"""
+    import torch
+
+    encoding = tokenizer(["export sample text", "sample"], return_tensors="pt", padding=True)
+    names = model_input_names(model, encoding)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    # Логиты NER имеют ось sequence, логиты RE -- только batch
+    dynamic_axes["logits"] = {0: "batch", 1: "sequence"} if is_token_classifier(model) else {0: "batch"}
+    model.eval()
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            tuple(encoding[name] for name in names),
+            path,
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False
+        )
+    return path
+
+
+def quantize_onnx(source, target):
+    """int8 веса для экспортированной ONNX модели"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+    return target
+
+
+class OnnxForward:
+    """Замена forward модели transformers на сессию ONNX Runtime.
+
+    Сессия создается в процессе, который ее вызывает: пул инференса
+    порождается fork, а потоки ONNX Runtime через fork не переживают.
+    """
+
+    def __init__(self, path, output_class, threads=0):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX model not found: {path} (run 'flask convert-models')")
+        self.path = path
+        self.output_class = output_class
+        self.threads = threads
+        self._session = None
+        self._pid = None
+        self._input_names = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    import onnxruntime
+
+                    options = onnxruntime.SessionOptions()
+                    if self.threads:
+                        options.intra_op_num_threads = self.threads
+                    self._session = onnxruntime.InferenceSession(
+                        self.path, options, providers=["CPUExecutionProvider"]
+                    )
+                    self._input_names = [node.name for node in self._session.get_inputs()]
+                    self._pid = os.getpid()
+        return self._session
+
+    def __call__(self, input_ids=None, attention_mask=None, token_type_ids=None, **kwargs):
+        import torch
+
+        session = self.session()
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        feed = {}
+        for name in self._input_names:
+            value = inputs.get(name)
+            if value is None:
+                value = torch.zeros_like(input_ids) if name == "token_type_ids" else torch.ones_like(input_ids)
+            feed[name] = value.detach().cpu().numpy().astype("int64")
+        logits = session.run(["logits"], feed)[0]
+        return self.output_class(logits=torch.from_numpy(logits))
+
+
+def prepare_model(model, backend, onnx_path=None, onnx_threads=0):
+    """Модель, подготовленная для выбранного бэкенда"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    model.eval()
+    if backend == "int8":
+        return quantize_dynamic_int8(model)
+    if backend in ("onnx", "onnx-int8"):
+        from transformers.modeling_outputs import SequenceClassifierOutput, TokenClassifierOutput
+
+        output_class = TokenClassifierOutput if is_token_classifier(model) else SequenceClassifierOutput
+        forward = OnnxForward(onnx_path, output_class, onnx_threads)
+        # Сессия открывается сразу, чтобы отсутствующий или битый файл проявился при загрузке
+        forward.session()
+        model.forward = forward
+    return model
+
+
+def convert_models(models, onnx_dir, quantize=True):
+    """Экспорт загруженных моделей реестра в ONNX (и int8 ONNX), список файлов"""
+    os.makedirs(onnx_dir, exist_ok=True)
+    written = []
+    for name, model, tokenizer in (
+        ("ner", models.ner_model, models.ner_tokenizer),
+        ("re", models.re_model, models.re_tokenizer)
+    ):
+        path = export_onnx(model, tokenizer, onnx_model_file(onnx_dir, name))
+        written.append(path)
+        if quantize:
+            written.append(quantize_onnx(path, onnx_model_file(onnx_dir, name, quantized=True)))
+    return written
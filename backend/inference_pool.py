@@ -0,0 +1,107 @@
+"""Пул процессов для извлечения с общими весами моделей.
+
+Воркеры создаются из сервера форков (multiprocessing "forkserver"), а не
+fork самого приложения: пул может запускаться лениво из потока запроса, а
+fork многопоточного процесса копирует чужие захваченные блокировки (logging,
+аллокатор, пулы потоков torch/OpenMP) и может повиснуть в воркере. Сервер
+форков -- отдельный однопоточный процесс; он один раз импортирует модули
+preload с окружением environ (приложение загружает в нем модели), и все
+воркеры форкаются от него: страницы с весами NER/RE моделей разделяются по
+copy-on-write и не копируются, пока их никто не изменяет (инференс их только
+читает). Воркер первым делом вызывает gc.freeze(), чтобы сборщик мусора не
+трогал заголовки унаследованных объектов и не размножал страницы памяти.
+
+Воркеры получают конфигурацию только из окружения при импорте preload:
+изменения app.config в родителе после импорта в них не видны.
+
+Тот же эффект для gunicorn дает запуск с --preload и MODEL_LOADING=eager:
+модели загружаются в мастере до форка воркеров.
+"""
+import gc
+import multiprocessing
+import os
+
+
+def _init_worker(torch_threads, initializer):
+    gc.freeze()
+    # Делим ядра между воркерами, иначе каждый займет все ядра под intra-op потоки torch
+    import torch
+    torch.set_num_threads(torch_threads)
+    if initializer is not None:
+        initializer()
+
+
+def read_memory(pid):
+    """Rss/Pss/Uss процесса в КБ из /proc/<pid>/smaps_rollup (Linux)"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    values[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_kb": values.get("Rss", 0),
+        "pss_kb": values.get("Pss", 0),
+        "uss_kb": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    }
+
+
+class InferencePool:
+    """Пул из workers процессов сервера форков. preload -- модули, импортируемые
+    сервером до форка воркеров, environ -- переменные окружения для сервера"""
+
+    def __init__(self, workers, torch_threads=None, preload=(), environ=None):
+        self.workers = workers
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // max(workers, 1))
+        self.preload = list(preload)
+        self.environ = dict(environ or {})
+        self._pool = None
+
+    @property
+    def running(self):
+        return self._pool is not None
+
+    def start(self, initializer=None):
+        """Запуск пула. Сервер форков стартует один раз на процесс: preload и
+        environ первого запущенного пула действуют и для следующих"""
+        if self._pool is not None:
+            return
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(self.preload)
+        saved = {name: os.environ.get(name) for name in self.environ}
+        os.environ.update(self.environ)
+        try:
+            self._pool = context.Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.torch_threads, initializer)
+            )
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def submit(self, fn, *args):
+        """Асинхронный вызов fn(*args) в воркере, возвращает AsyncResult"""
+        return self._pool.apply_async(fn, args)
+
+    def run(self, fn, *args, timeout=None):
+        return self.submit(fn, *args).get(timeout)
+
+    def worker_pids(self):
+        return [process.pid for process in getattr(self._pool, "_pool", [])]
+
+    def memory(self):
+        """Память каждого воркера (Rss/Pss/Uss)"""
+        return {pid: read_memory(pid) for pid in self.worker_pids()}
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
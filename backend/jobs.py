@@ -0,0 +1,100 @@
+"""Очередь фоновых задач извлечения для асинхронного API.
+
+JobRunner держит ограниченную очередь id задач и фиксированное число
+рабочих потоков. Само состояние задач (статус, прогресс, результат)
+хранится в БД вызывающей стороной, поэтому после перезапуска процесса
+незавершенные задачи можно снова поставить в очередь. Пока пул запущен,
+heartbeat(job_ids) вызывается каждые heartbeat_interval секунд с id
+выполняемых сейчас задач: по отметкам вызывающая сторона отличает задачи
+живых процессов от брошенных упавшими.
+"""
+import queue
+import threading
+import time
+
+
+class QueueFull(Exception):
+    """Очередь задач заполнена"""
+
+
+class JobRunner:
+    """Пул потоков execute(job_id) с ограниченной очередью и статистикой ожидания"""
+
+    def __init__(self, execute, workers=2, max_queue=100, heartbeat=None, heartbeat_interval=15.0):
+        self.execute = execute
+        self.workers = workers
+        self.heartbeat = heartbeat
+        self.heartbeat_interval = heartbeat_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._active = set()
+        self.running = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for idx in range(self.workers):
+                thread = threading.Thread(target=self._loop, name=f"job-worker-{idx}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            if self.heartbeat is not None:
+                thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, job_id):
+        self.start()
+        try:
+            self._queue.put_nowait((job_id, time.perf_counter()))
+        except queue.Full:
+            raise QueueFull("Job queue is full")
+
+    def _loop(self):
+        while True:
+            job_id, queued_at = self._queue.get()
+            waited = time.perf_counter() - queued_at
+            with self._lock:
+                self.running += 1
+                self._active.add(job_id)
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            try:
+                self.execute(job_id)
+            except Exception:
+                # execute сам сохраняет ошибку задачи, поток должен продолжать работу
+                pass
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self._active.discard(job_id)
+                    self.completed += 1
+                self._queue.task_done()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                job_ids = sorted(self._active)
+            try:
+                self.heartbeat(job_ids)
+            except Exception:
+                # Пропущенная отметка не должна останавливать пул
+                pass
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "running": self.running,
+                "completed": self.completed,
+                "mean_wait_ms": 1000.0 * self.total_wait / started if started else 0.0,
+                "max_wait_ms": 1000.0 * self.max_wait
+            }
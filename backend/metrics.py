@@ -0,0 +1,165 @@
+"""Метрики приложения в текстовом формате Prometheus (эндпоинт /metrics).
+
+Счетчики и гистограммы с метками хранятся в процессе; значения, которые уже
+считают другие компоненты (кеши, очереди), снимаются колбэками в момент
+запроса /metrics. Длительности этапов конвейера пишутся в stats результата
+(stage_timer), а в гистограммы попадают в процессе запроса -- так они
+учитываются и при выполнении конвейера в пуле воркеров.
+
+Реестр у каждого процесса свой: счетчики и гистограммы, которые обновляются
+прямо внутри воркеров пула (model_forward_total, model_examples_total), до
+/metrics родительского процесса не доходят. При INFERENCE_WORKERS > 0 они
+показывают только работу моделей в самом процессе (потоковая и
+инкрементальная обработка, фоновые задачи).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы корзин: длительности в секундах и размеры (байты, символы, штуки)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, key), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][idx] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    result.append((f"{self.name}_bucket",
+                                   _labels(self.labelnames, key, (("le", _number(bound)),)), cumulative))
+                result.append((f"{self.name}_sum", _labels(self.labelnames, key), total))
+                result.append((f"{self.name}_count", _labels(self.labelnames, key), count))
+        return result
+
+
+class CallbackMetric:
+    """Значения, вычисляемые при запросе: fn() -> [(dict меток, значение)]"""
+
+    def __init__(self, name, documentation, type, fn):
+        self.name = name
+        self.documentation = documentation
+        self.type = type
+        self.fn = fn
+
+    def samples(self):
+        result = []
+        for labels, value in self.fn():
+            names = tuple(sorted(labels))
+            result.append((self.name, _labels(names, [labels[name] for name in names]), value))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self.prefix + name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, type, fn):
+        return self._register(CallbackMetric(self.prefix + name, documentation, type, fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def stage_timer(stats, stage):
+    """Длительность этапа в stats["timings_ms"][stage] (повторные замеры суммируются)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            timings = stats.setdefault("timings_ms", {})
+            timings[stage] = timings.get(stage, 0.0) + 1000.0 * (time.perf_counter() - started)
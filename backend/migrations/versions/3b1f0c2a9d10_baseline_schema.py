@@ -0,0 +1,71 @@
+"""baseline schema: user, cached_result, extraction_job
+
+Revision ID: 3b1f0c2a9d10
+Revises: 
+Create Date: 2026-10-18 15:25:07.064719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f0c2a9d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Базы, созданные раньше через flask init-db, уже содержат эти таблицы:
+    # создаем только недостающие, чтобы flask db upgrade работал и для них
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('password_hash', sa.String(length=120), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+        )
+
+    if 'cached_result' not in existing:
+        op.create_table('cached_result',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+        )
+
+    if 'extraction_job' not in existing:
+        op.create_table('extraction_job',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('entities_found', sa.Integer(), nullable=True),
+        sa.Column('pairs_scored', sa.Integer(), nullable=True),
+        sa.Column('pairs_total', sa.Integer(), nullable=True),
+        sa.Column('result', sa.LargeBinary(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('extraction_job', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_extraction_job_status'), ['status'], unique=False)
+            batch_op.create_index(batch_op.f('ix_extraction_job_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('extraction_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_extraction_job_user_id'))
+        batch_op.drop_index(batch_op.f('ix_extraction_job_status'))
+
+    op.drop_table('extraction_job')
+    op.drop_table('cached_result')
+    op.drop_table('user')
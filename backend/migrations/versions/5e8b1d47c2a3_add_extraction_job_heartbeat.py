@@ -0,0 +1,26 @@
+"""add extraction_job.heartbeat_at for reclaiming abandoned jobs
+
+Revision ID: 5e8b1d47c2a3
+Revises: 9d2a6f3e81c4
+Create Date: 2026-10-18 18:41:05.221374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b1d47c2a3'
+down_revision = '9d2a6f3e81c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('extraction_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('extraction_job', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
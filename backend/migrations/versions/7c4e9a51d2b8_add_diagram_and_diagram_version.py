@@ -0,0 +1,61 @@
+"""add diagram and diagram_version
+
+Revision ID: 7c4e9a51d2b8
+Revises: 3b1f0c2a9d10
+Create Date: 2026-10-18 15:26:41.318502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e9a51d2b8'
+down_revision = '3b1f0c2a9d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('diagram',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('current_version', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('diagram', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_diagram_content_hash'), ['content_hash'], unique=False)
+        batch_op.create_index(batch_op.f('ix_diagram_owner_id'), ['owner_id'], unique=False)
+        batch_op.create_index('ix_diagram_owner_updated', ['owner_id', 'updated_at'], unique=False)
+
+    op.create_table('diagram_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('diagram_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['diagram_id'], ['diagram.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('diagram_id', 'version', name='uq_diagram_version')
+    )
+    with op.batch_alter_table('diagram_version', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_diagram_version_content_hash'), ['content_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('diagram_version', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_diagram_version_content_hash'))
+
+    op.drop_table('diagram_version')
+    with op.batch_alter_table('diagram', schema=None) as batch_op:
+        batch_op.drop_index('ix_diagram_owner_updated')
+        batch_op.drop_index(batch_op.f('ix_diagram_owner_id'))
+        batch_op.drop_index(batch_op.f('ix_diagram_content_hash'))
+
+    op.drop_table('diagram')
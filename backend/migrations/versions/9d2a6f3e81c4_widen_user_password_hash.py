@@ -0,0 +1,32 @@
+"""widen user.password_hash for scrypt hashes with tunable cost
+
+Revision ID: 9d2a6f3e81c4
+Revises: 7c4e9a51d2b8
+Create Date: 2026-10-18 16:02:13.540917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2a6f3e81c4'
+down_revision = '7c4e9a51d2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=120),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=120),
+               existing_nullable=False)
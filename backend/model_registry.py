@@ -0,0 +1,138 @@
+"""Реестр NER/RE моделей с ленивой или фоновой загрузкой.
+
+torch и transformers импортируются только при загрузке моделей, поэтому
+flask init-db, миграции и эндпоинты аутентификации не платят за импорт
+и десериализацию весов. Режимы:
+
+    eager      -- загрузка сразу при создании приложения (как раньше);
+    lazy       -- синхронная загрузка при первом обращении к моделям;
+    background -- загрузка в фоновом потоке, пока она идет,
+                  require() бросает ModelsWarmingUp.
+
+backend выбирает способ инференса загруженных моделей (см. inference_backend):
+fp32 PyTorch, int8 квантизация или ONNX Runtime с моделями из onnx_dir.
+"""
+import threading
+import time
+
+from inference_backend import onnx_model_file, prepare_model
+
+
+class ModelsWarmingUp(Exception):
+    """Модели еще загружаются"""
+
+
+class ModelRegistry:
+    """Общие для приложения токенизаторы, модели и NER пайплайн"""
+
+    def __init__(self, ner_model_path, re_model_path, mode="background", backend="pytorch",
+                 onnx_dir="onnx_models", onnx_threads=0):
+        self.ner_model_path = ner_model_path
+        self.re_model_path = re_model_path
+        self.mode = mode
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        self.onnx_threads = onnx_threads
+        self.ner_tokenizer = None
+        self.ner_model = None
+        self.ner_pipeline = None
+        self.re_tokenizer = None
+        self.re_model = None
+        self.load_seconds = None
+        self.error = None
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._loaded.is_set()
+
+    def load(self):
+        """Синхронная загрузка моделей (повторные вызовы ничего не делают)"""
+        with self._lock:
+            if self._loaded.is_set():
+                return self
+            started = time.perf_counter()
+            try:
+                from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+                from transformers import AutoModelForSequenceClassification
+
+                # Загрузка NER модели
+                ner_tokenizer = AutoTokenizer.from_pretrained(self.ner_model_path)
+                ner_model = AutoModelForTokenClassification.from_pretrained(self.ner_model_path)
+
+                # Загрузка RE модели
+                re_tokenizer = AutoTokenizer.from_pretrained(self.re_model_path)
+                re_model = AutoModelForSequenceClassification.from_pretrained(self.re_model_path)
+                re_model.eval()
+
+                # Квантизация или подмена forward на ONNX Runtime до создания пайплайна
+                quantized = self.backend == "onnx-int8"
+                ner_model = prepare_model(ner_model, self.backend,
+                                          onnx_model_file(self.onnx_dir, "ner", quantized), self.onnx_threads)
+                re_model = prepare_model(re_model, self.backend,
+                                         onnx_model_file(self.onnx_dir, "re", quantized), self.onnx_threads)
+
+                # Создаем пайплайны
+                ner_pipeline = pipeline(
+                    "token-classification",
+                    model=ner_model,
+                    tokenizer=ner_tokenizer,
+                    aggregation_strategy="simple"
+                )
+            except Exception as e:
+                self.error = str(e)
+                raise
+
+            self.ner_tokenizer = ner_tokenizer
+            self.ner_model = ner_model
+            self.ner_pipeline = ner_pipeline
+            self.re_tokenizer = re_tokenizer
+            self.re_model = re_model
+            self.error = None
+            self.load_seconds = time.perf_counter() - started
+            self._loaded.set()
+            return self
+
+    def warm_async(self):
+        """Запуск загрузки в фоновом потоке (один раз)"""
+        with self._thread_lock:
+            if self._loaded.is_set() or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._warm, name="model-warmup", daemon=True)
+            self._thread.start()
+
+    def _warm(self):
+        try:
+            self.load()
+        except Exception:
+            # Ошибка сохранена в self.error и отдается через status()
+            pass
+
+    def require(self):
+        """Загруженный реестр или ModelsWarmingUp, если модели еще грузятся в фоне"""
+        if self._loaded.is_set():
+            return self
+        if self.mode == "background":
+            self.warm_async()
+            raise ModelsWarmingUp(self.error or "Models are warming up")
+        return self.load()
+
+    def status(self):
+        if self._loaded.is_set():
+            state = "ready"
+        elif self.error:
+            state = "error"
+        elif self._thread is not None and self._thread.is_alive():
+            state = "warming_up"
+        else:
+            state = "not_loaded"
+        return {
+            "state": state,
+            "mode": self.mode,
+            "backend": self.backend,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
@@ -0,0 +1,117 @@
+"""Хеширование паролей в отдельном ограниченном пуле потоков.
+
+scrypt и pbkdf2 из hashlib отпускают GIL, поэтому несколько потоков
+хеширования могут занять все ядра. Пул из workers потоков ограничивает
+число одновременно хешируемых паролей, а max_pending -- длину очереди:
+всплеск логинов занимает не больше workers ядер, остальные запросы
+получают PasswordHashingBusy вместо того, чтобы отнимать CPU у инференса.
+
+method -- строка метода Werkzeug ("scrypt:32768:8:1", "pbkdf2:sha256:600000").
+Хеш, созданный с другими параметрами, needs_rehash() помечает для
+пересчета при следующем успешном входе.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHashingBusy(Exception):
+    """Очередь хеширования заполнена"""
+
+
+class PasswordHasher:
+    """Ограниченный пул хеширования паролей с метриками задержки"""
+
+    def __init__(self, method="scrypt:32768:8:1", workers=2, max_pending=32, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._method_tag = None
+        self.rejected = 0
+        self.rehashed = 0
+        self._metrics = {
+            operation: {"count": 0, "total": 0.0, "max": 0.0, "wait": 0.0}
+            for operation in ("hash", "verify")
+        }
+
+    @property
+    def method_tag(self):
+        """Метод с параметрами в том виде, в каком он записывается в хеш"""
+        if self._method_tag is None:
+            self._method_tag = generate_password_hash("", self.method).split("$", 1)[0]
+        return self._method_tag
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashingBusy("Password hashing queue is full")
+        queued = time.perf_counter()
+        timings = {}
+
+        def task():
+            started = time.perf_counter()
+            timings["wait"] = started - queued
+            try:
+                return fn(*args)
+            finally:
+                timings["run"] = time.perf_counter() - started
+                # Место в очереди освобождается по окончании хеширования, а не по таймауту ожидания
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(task)
+        except Exception:
+            self._slots.release()
+            raise
+        try:
+            result = future.result(self.timeout)
+        except FuturesTimeout:
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashingBusy("Password hashing timed out")
+        with self._lock:
+            metrics = self._metrics[operation]
+            metrics["count"] += 1
+            metrics["total"] += timings.get("run", 0.0)
+            metrics["max"] = max(metrics["max"], timings.get("run", 0.0))
+            metrics["wait"] += timings.get("wait", 0.0)
+        return result
+
+    def hash(self, password):
+        return self._run("hash", generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run("verify", check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split("$", 1)[0] != self.method_tag
+
+    def record_rehash(self):
+        with self._lock:
+            self.rehashed += 1
+
+    def stats(self):
+        with self._lock:
+            result = {
+                "method": self.method,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed
+            }
+            for operation, metrics in self._metrics.items():
+                count = metrics["count"]
+                result[operation] = {
+                    "count": count,
+                    "mean_ms": 1000.0 * metrics["total"] / count if count else 0.0,
+                    "max_ms": 1000.0 * metrics["max"],
+                    "mean_wait_ms": 1000.0 * metrics["wait"] / count if count else 0.0
+                }
+            return result
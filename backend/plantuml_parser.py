@@ -0,0 +1,271 @@
+"""Разбор C4-PlantUML в иерархию той же структуры, что строит build_c4_hierarchy.
+
+Файл сканируется один раз скомпилированным регулярным выражением по
+строкам-операторам: вызов макроса (Person, System, Container, Component,
+*_Boundary, Rel...), открывающая "{" и закрывающая "}". Вложенность
+границ отслеживается стеком. Связи Rel и владельцы границ разрешаются
+после прохода, когда известны все объявления (в коде generate_c4_code
+раздел Rel идет раньше объявлений контейнеров). Сложность линейная по
+длине файла.
+
+Владелец границы X_boundary -- элемент X (так границы называет
+generate_c4_code); граница без такого элемента сама становится элементом
+своего уровня. Enterprise_Boundary и Boundary прозрачны.
+"""
+import re
+
+from diagram_delta import LEVELS
+
+STATEMENT_RE = re.compile(
+    r'^[ \t]*(?:(?P<close>\})'
+    r'|(?P<macro>[A-Za-z_]\w*)[ \t]*\((?P<args>(?:"[^"\n]*"|\([^()\n]*\)|[^()"\n])*)\)[ \t]*(?P<open>\{)?)',
+    re.MULTILINE
+)
+ARG_RE = re.compile(r'"([^"\n]*)"|([^,\s][^,]*)')
+
+# Макрос элемента -> (уровень C4, тип)
+ELEMENT_MACROS = {
+    "Person": (1, "actor"),
+    "Person_Ext": (1, "actor"),
+    "System": (1, None),
+    "SystemDb": (1, None),
+    "SystemQueue": (1, None),
+    "System_Ext": (1, "external"),
+    "SystemDb_Ext": (1, "external"),
+    "SystemQueue_Ext": (1, "external"),
+    "Container": (2, "container"),
+    "Container_Ext": (2, "container"),
+    "ContainerDb": (2, "database"),
+    "ContainerDb_Ext": (2, "database"),
+    "ContainerQueue": (2, "queue"),
+    "ContainerQueue_Ext": (2, "queue"),
+    "Queue": (2, "queue"),
+    "Component": (3, None),
+    "Component_Ext": (3, None),
+    "ComponentDb": (3, None),
+    "ComponentQueue": (3, None)
+}
+# Граница -> уровень владельца (None -- прозрачная граница)
+BOUNDARY_MACROS = {
+    "System_Boundary": 1,
+    "Container_Boundary": 2,
+    "Component_Boundary": 3,
+    "Enterprise_Boundary": None,
+    "Boundary": None
+}
+# Суффиксы подписей границ, которые добавляет generate_c4_code
+BOUNDARY_LABEL_SUFFIXES = {1: " Boundary", 2: " Components", 3: " Code"}
+BOUNDARY_ALIAS_SUFFIX = "_boundary"
+
+
+class PlantUMLSyntaxError(Exception):
+    """Несогласованные границы в коде PlantUML"""
+
+
+def parse_arguments(args):
+    """Позиционные аргументы макроса (кавычки снимаются, $keyword=... пропускаются)"""
+    values = []
+    for match in ARG_RE.finditer(args):
+        quoted, bare = match.groups()
+        if bare is not None:
+            bare = bare.strip()
+            if bare.startswith("$"):
+                continue
+            values.append(bare)
+        else:
+            values.append(quoted)
+    return values
+
+
+def line_number(code, position):
+    return code.count("\n", 0, position) + 1
+
+
+class _Builder:
+    """Накопление элементов, связей родитель-ребенок и порядка списков иерархии"""
+
+    def __init__(self):
+        self.hierarchy = {list_key: [] for list_key, _ in LEVELS.values()}
+        self.elements = {}
+        self.levels = {}
+        self.synthetic = set()
+        self.declared = []
+        self.bounded = []
+
+    def element(self, element_id, level, name, element_type=None, description="", synthetic=False):
+        """Элемент по id: новый либо уже объявленный (повторное объявление -- еще один родитель)"""
+        existing = self.elements.get(element_id)
+        if existing is not None:
+            if element_id in self.synthetic and not synthetic:
+                # Элемент, созданный по границе, получает данные из настоящего объявления
+                self.synthetic.discard(element_id)
+                existing["name"] = name
+                if level == 1 and element_type in ("actor", "external"):
+                    existing["type"] = element_type
+                    existing["description"] = description
+                elif level == 2:
+                    existing["type"] = element_type
+            return existing
+
+        if level == 1:
+            if element_type in ("actor", "external"):
+                element = {"id": element_id, "name": name, "type": element_type, "description": description}
+            else:
+                element = {"id": element_id, "name": name, "description": description, "containers": []}
+        elif level == 2:
+            element = {"id": element_id, "name": name, "type": element_type or "container", "components": []}
+        elif level == 3:
+            element = {"id": element_id, "name": name, "code_elements": []}
+        else:
+            element = {
+                "id": element_id,
+                "name": name,
+                "type": element_type or ("function" if "function" in name.lower() else "class")
+            }
+        self.elements[element_id] = element
+        self.levels[element_id] = level
+        if synthetic:
+            self.synthetic.add(element_id)
+        return element
+
+    def note(self, element_id, owns_boundary=False):
+        """Запоминание порядка появления элемента (объявлением или границей)"""
+        if owns_boundary:
+            self.bounded.append(element_id)
+        else:
+            self.declared.append(element_id)
+
+    def finish_order(self):
+        """Плоские списки уровней. Системы -- в порядке объявления, контейнеры и
+        компоненты -- в порядке своих границ (в нем их обходит generate_c4_code),
+        остальные элементы -- в порядке объявления"""
+        seen = set()
+        for ids in (self.declared, self.bounded):
+            for element_id in ids:
+                if self.levels[element_id] == 1 and element_id not in seen:
+                    seen.add(element_id)
+                    self.hierarchy["systems"].append(self.elements[element_id])
+        for ids in (self.bounded, self.declared):
+            for element_id in ids:
+                if element_id not in seen:
+                    seen.add(element_id)
+                    self.hierarchy[LEVELS[self.levels[element_id]][0]].append(self.elements[element_id])
+
+    def link(self, parent_id, child_id):
+        """Вложение ребенка в родителя соседнего уровня (повторы сохраняются, как в build_c4_hierarchy)"""
+        parent_level = self.levels[parent_id]
+        if self.levels[child_id] != parent_level + 1:
+            return False
+        parent = self.elements[parent_id]
+        parent.setdefault(LEVELS[parent_level][1], []).append(self.elements[child_id])
+        return True
+
+
+def parse_c4_plantuml(code):
+    """Иерархия C4 и список связей Rel, не являющихся вложением (source, target, label)"""
+    builder = _Builder()
+    # Стек открытых границ: id владельца или None для прозрачной границы
+    stack = []
+    members = []
+    rels = []
+
+    def current_owner():
+        for owner_id in reversed(stack):
+            if owner_id is not None:
+                return owner_id
+        return None
+
+    for match in STATEMENT_RE.finditer(code):
+        if match.group("close"):
+            if not stack:
+                raise PlantUMLSyntaxError(f"Unexpected '}}' at line {line_number(code, match.start())}")
+            stack.pop()
+            continue
+
+        macro = match.group("macro")
+        args = parse_arguments(match.group("args"))
+        opens = match.group("open") is not None
+
+        if macro in BOUNDARY_MACROS:
+            owner_level = BOUNDARY_MACROS[macro]
+            owner_id = None
+            if owner_level is not None and args:
+                alias = args[0]
+                label = args[1] if len(args) > 1 else alias
+                if alias.endswith(BOUNDARY_ALIAS_SUFFIX) and len(alias) > len(BOUNDARY_ALIAS_SUFFIX):
+                    owner_id = alias[:-len(BOUNDARY_ALIAS_SUFFIX)]
+                    suffix = BOUNDARY_LABEL_SUFFIXES[owner_level]
+                    if label.endswith(suffix):
+                        label = label[:-len(suffix)]
+                else:
+                    owner_id = alias
+                if owner_id in builder.elements:
+                    owner_level = builder.levels[owner_id]
+                builder.element(owner_id, owner_level, label, synthetic=True)
+                builder.note(owner_id, owns_boundary=True)
+                parent_id = current_owner()
+                if parent_id is not None:
+                    members.append((parent_id, owner_id))
+            if opens:
+                stack.append(owner_id)
+            continue
+
+        if macro in ELEMENT_MACROS and args:
+            level, element_type = ELEMENT_MACROS[macro]
+            parent_id = current_owner()
+            if level == 3 and parent_id is not None and builder.levels[parent_id] == 3:
+                # Компонент внутри границы компонента -- элемент кода
+                level = 4
+            name = args[1] if len(args) > 1 else args[0]
+            if level == 4:
+                element_type = args[2] if len(args) > 2 and args[2] else None
+            description = args[2] if level == 1 and len(args) > 2 else ""
+            builder.element(args[0], level, name, element_type, description)
+            builder.note(args[0])
+            if parent_id is not None:
+                members.append((parent_id, args[0]))
+            if opens:
+                stack.append(None)
+            continue
+
+        if macro.startswith(("Rel", "BiRel")) and len(args) >= 2:
+            rels.append((args[0], args[1], args[2] if len(args) > 2 else ""))
+            continue
+
+        if opens:
+            stack.append(None)
+
+    if stack:
+        raise PlantUMLSyntaxError(f"{len(stack)} boundary block(s) are not closed")
+
+    builder.finish_order()
+
+    # Вложение по границам. Rel между родителем и ребенком из границы дублирует
+    # вложение (так пишет generate_c4_code), Rel между соседними уровнями для
+    # элемента вне границ задает вложение, остальные Rel -- обычные связи
+    boundary_links = {}
+    for parent_id, child_id in members:
+        if builder.link(parent_id, child_id):
+            boundary_links[(parent_id, child_id)] = boundary_links.get((parent_id, child_id), 0) + 1
+    boundary_children = {child_id for _, child_id in boundary_links}
+    rel_links = set()
+    relations = []
+    for source, target, label in rels:
+        if source in builder.levels and target in builder.levels:
+            pair = None
+            if builder.levels[target] == builder.levels[source] + 1:
+                pair = (source, target)
+            elif builder.levels[source] == builder.levels[target] + 1:
+                pair = (target, source)
+            if pair is not None:
+                if boundary_links.get(pair):
+                    boundary_links[pair] -= 1
+                    continue
+                if pair[1] not in boundary_children:
+                    if pair not in rel_links:
+                        rel_links.add(pair)
+                        builder.link(*pair)
+                    continue
+        relations.append({"source": source, "target": target, "label": label})
+
+    return builder.hierarchy, relations
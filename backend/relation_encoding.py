@@ -0,0 +1,90 @@
+"""Общая токенизация документа для RE модели.
+
+Текст токенизируется один раз (с offset mapping), а вход для каждой пары
+собирается из готовых id: короткий префикс "<head> <tail> in:" плюс окно
+токенов документа вокруг обеих сущностей. Так документ не перекодируется
+для каждой пары, а сущности за пределами первых max_length токенов не
+теряются: окно сдвигается к ним, а для далеко разнесенных сущностей
+склеиваются два фрагмента контекста. У объединенных сущностей (coreference)
+контекст строится вокруг ближайшей друг к другу пары упоминаний.
+"""
+from bisect import bisect_right
+
+from coreference import entity_mentions
+
+
+class SharedDocumentEncoding:
+    """Однократно токенизированный документ, из которого собираются входы пар"""
+
+    def __init__(self, tokenizer, text, max_length=128):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        self.input_ids = encoding["input_ids"]
+        self.token_starts = [start for start, _ in encoding["offset_mapping"]]
+        self.num_special = tokenizer.num_special_tokens_to_add(pair=False)
+        self.marker_ids = tokenizer(" in:", add_special_tokens=False)["input_ids"]
+        self._text_ids = {}
+
+    def _ids_for(self, entity_text):
+        """Токены текста сущности (кешируются: одна сущность входит во многие пары)"""
+        ids = self._text_ids.get(entity_text)
+        if ids is None:
+            ids = self.tokenizer(entity_text, add_special_tokens=False)["input_ids"]
+            self._text_ids[entity_text] = ids
+        return ids
+
+    def _token_span(self, entity):
+        """Диапазон токенов документа [first, last] для сущности по смещениям"""
+        first = max(bisect_right(self.token_starts, entity['start']) - 1, 0)
+        last = max(bisect_right(self.token_starts, max(entity['end'] - 1, entity['start'])) - 1, first)
+        return first, last
+
+    def _closest_spans(self, head, tail):
+        """Диапазоны токенов ближайших друг к другу упоминаний head и tail"""
+        head_spans = [self._token_span(mention) for mention in entity_mentions(head)]
+        tail_spans = [self._token_span(mention) for mention in entity_mentions(tail)]
+        if len(head_spans) == 1 and len(tail_spans) == 1:
+            return head_spans[0], tail_spans[0]
+        return min(
+            ((head_span, tail_span) for head_span in head_spans for tail_span in tail_spans),
+            key=lambda spans: max(spans[0][1], spans[1][1]) - min(spans[0][0], spans[1][0])
+        )
+
+    def _window(self, first, last, budget):
+        """Окно из budget токенов, по возможности центрированное на [first, last]"""
+        total = len(self.input_ids)
+        span = last - first + 1
+        start = first - (budget - span) // 2
+        start = max(0, min(start, total - budget))
+        return self.input_ids[start:start + budget]
+
+    def pair_input_ids(self, head, tail):
+        """id входа RE модели для пары: [CLS] head tail in: <контекст> [SEP]"""
+        prefix = self._ids_for(head['text']) + self._ids_for(tail['text']) + self.marker_ids
+        budget = self.max_length - self.num_special - len(prefix)
+        if budget <= 0:
+            return self.tokenizer.build_inputs_with_special_tokens(
+                prefix[:self.max_length - self.num_special])
+
+        if len(self.input_ids) <= budget:
+            # Весь документ помещается: вход совпадает с токенизацией полного контекста
+            context = self.input_ids
+        else:
+            (head_first, head_last), (tail_first, tail_last) = self._closest_spans(head, tail)
+            first = min(head_first, tail_first)
+            last = max(head_last, tail_last)
+            if last - first + 1 <= budget:
+                context = self._window(first, last, budget)
+            else:
+                # Сущности далеко друг от друга: склеиваем окна вокруг каждой
+                left, right = sorted([(head_first, head_last), (tail_first, tail_last)])
+                half = budget // 2
+                context = self._window(*left, half) + self._window(*right, budget - half)
+
+        return self.tokenizer.build_inputs_with_special_tokens(prefix + context)
+
+    def encode_pairs(self, pairs):
+        """Паддинг входов всех пар одним вызовом, тензоры PyTorch"""
+        features = [{"input_ids": self.pair_input_ids(head, tail)} for head, tail in pairs]
+        return self.tokenizer.pad(features, padding=True, return_tensors="pt")
@@ -0,0 +1,114 @@
+"""Кеш результатов /process с адресацией по содержимому.
+
+Ключ -- sha256 от текста, отпечатков NER/RE моделей и настроек конвейера,
+поэтому повторная отправка того же текста отдается из кеша без запуска
+моделей. Текст в ключе не нормализуется: результат содержит смещения
+start/end и фрагменты исходной строки, и текст, отличающийся хотя бы
+пробелами, должен получить свои смещения.
+Первый уровень -- LRU в памяти с ограниченным числом записей, второй
+(необязательный) -- персистентное хранилище, например таблица в SQLite.
+"""
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+
+def model_fingerprint(path, revision=None):
+    """Отпечаток модели: путь, ревизия и (имя, размер, mtime) файлов каталога"""
+    digest = hashlib.sha256()
+    digest.update(os.path.abspath(path).encode("utf-8"))
+    digest.update((revision or "").encode("utf-8"))
+    if os.path.isdir(path):
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def compress_payload(payload):
+    """Компактное хранение результата: JSON + zlib"""
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decompress_payload(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class ResultCache:
+    """LRU кеш результатов со счетчиками попаданий и опциональным вторым уровнем.
+
+    persistent_store -- объект с методами get(key) и put(key, payload)."""
+
+    def __init__(self, max_entries=256, model_fingerprints=(), persistent_store=None):
+        self.max_entries = max_entries
+        self.model_fingerprints = tuple(model_fingerprints)
+        self.persistent_store = persistent_store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, text, settings=None):
+        """Ключ кеша для текста с учетом версий моделей и настроек конвейера"""
+        material = json.dumps({
+            "text": text,
+            "models": self.model_fingerprints,
+            "settings": settings or {}
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+
+        if self.persistent_store is not None:
+            payload = self.persistent_store.get(key)
+            if payload is not None:
+                with self._lock:
+                    self.persistent_hits += 1
+                self._remember(key, payload)
+                return payload
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, payload):
+        self._remember(key, payload)
+        if self.persistent_store is not None:
+            self.persistent_store.put(key, payload)
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.persistent_hits) / lookups if lookups else 0.0
+            }
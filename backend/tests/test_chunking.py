@@ -0,0 +1,159 @@
+"""NER по фрагментам: план фрагментов и склейка сущностей на их границах.
+
+Склейка через predict_entities сравнивается с разметкой всего текста
+словарным NER (вместо пайплайна), так что расхождения -- только от
+разбиения на фрагменты. Запуск из backend/: python -m pytest tests
+"""
+import re
+import unittest
+from unittest import mock
+
+import app
+from chunking import Chunk, plan_chunks, stitch_entities
+
+NAMES = {
+    "Order API": "CONTAINER",
+    "Orders DB": "DATABASE",
+    "Shop System": "SYSTEM",
+    "Customer": "ACTOR",
+    "Billing Component": "COMPONENT"
+}
+NAME_RE = re.compile("|".join(re.escape(name) for name in NAMES))
+
+SENTENCES = [
+    "The Customer uses the Shop System.",
+    "The Shop System contains the Order API.",
+    "The Order API stores orders in the Orders DB.",
+    "The Billing Component reads the Orders DB."
+]
+LONG_TEXT = " ".join(SENTENCES * 5)
+
+
+def word_offsets(text):
+    """Смещения токенов-слов (токенизация без модели для плана фрагментов)"""
+    return [match.span() for match in re.finditer(r"\S+", text)]
+
+
+def dictionary_pipeline(texts):
+    """Ответ NER пайплайна (entity_group, word, start, end) для каждого текста"""
+    return [
+        [{"entity_group": NAMES[match.group()], "word": match.group(), "score": 0.99,
+          "start": match.start(), "end": match.end()} for match in NAME_RE.finditer(text)]
+        for text in texts
+    ]
+
+
+def entity(text, start, entity_type="CONTAINER", entity_id=None):
+    return {"text": text, "type": entity_type, "start": start, "end": start + len(text),
+            "id": entity_id, "level": app.C4_LEVELS[entity_type]}
+
+
+class PlanChunksTest(unittest.TestCase):
+    def test_short_text_is_one_chunk(self):
+        text = SENTENCES[0]
+        self.assertEqual(plan_chunks(text, word_offsets(text), 100), [(0, len(text), 0, len(text))])
+        self.assertEqual(plan_chunks("", [], 100), [])
+
+    def test_owned_parts_cover_text_once(self):
+        offsets = word_offsets(LONG_TEXT)
+        for max_tokens in (8, 12, 20, 40):
+            with self.subTest(max_tokens=max_tokens):
+                chunks = plan_chunks(LONG_TEXT, offsets, max_tokens, overlap=2)
+                self.assertGreater(len(chunks), 1)
+                self.assertEqual(chunks[0].own_start, 0)
+                self.assertEqual(chunks[-1].own_end, len(LONG_TEXT))
+                for chunk, following in zip(chunks, chunks[1:]):
+                    self.assertEqual(chunk.own_end, following.own_start)
+                    # Без пропусков; перекрытие -- если во фрагмент входит больше overlap предложений
+                    self.assertLessEqual(following.start, chunk.end)
+                    if max_tokens >= 40:
+                        self.assertLess(following.start, chunk.end)
+                for chunk in chunks:
+                    self.assertLessEqual(chunk.start, chunk.own_start)
+                    self.assertLessEqual(chunk.own_end, chunk.end)
+                    tokens = sum(1 for start, _ in offsets if chunk.start <= start < chunk.end)
+                    self.assertLessEqual(tokens, max_tokens)
+
+    def test_long_sentence_is_split_by_tokens(self):
+        text = " ".join(["word"] * 30) + "."
+        chunks = plan_chunks(text, word_offsets(text), 8, overlap=0)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual([chunk.start for chunk in chunks], [0, 40, 80, 120])
+        self.assertEqual(chunks[-1].end, len(text))
+
+
+class StitchEntitiesTest(unittest.TestCase):
+    def test_entity_in_overlap_is_kept_once(self):
+        chunks = plan_chunks(LONG_TEXT, word_offsets(LONG_TEXT), 12, overlap=2)
+        found = [
+            [entity(match.group(), match.start(), NAMES[match.group()])
+             for match in NAME_RE.finditer(LONG_TEXT, chunk.start, chunk.end)]
+            for chunk in chunks
+        ]
+        stitched = stitch_entities(found, chunks)
+        expected = [(match.start(), match.end()) for match in NAME_RE.finditer(LONG_TEXT)]
+        self.assertEqual([(item["start"], item["end"]) for item in stitched], expected)
+        self.assertEqual([item["id"] for item in stitched], [f"ent-{idx}" for idx in range(len(expected))])
+
+    def test_overlapping_entities_keep_longer(self):
+        text = "The Order API stores orders."
+        chunks = [Chunk(0, 11, 0, 10), Chunk(4, len(text), 10, len(text))]
+        # Сущность, начало которой принадлежит другому фрагменту, отбрасывается
+        self.assertEqual(stitch_entities([[], [entity("Order API", 4)]], chunks), [])
+        # Пересекающиеся сущности соседних фрагментов: остается более длинная
+        cases = [
+            ([entity("Order API", 4)], [entity("API", 10)], "Order API"),
+            ([entity("Order A", 4)], [entity("API stores", 10)], "API stores")
+        ]
+        for left, right, kept in cases:
+            with self.subTest(kept=kept):
+                stitched = stitch_entities([left, right], chunks)
+                self.assertEqual([(item["text"], item["id"]) for item in stitched], [(kept, "ent-0")])
+
+    def test_offsets_are_shifted_by_segment(self):
+        chunks = [Chunk(0, 10, 0, 5), Chunk(3, 20, 5, 20)]
+        found = [[entity("API", 102)], [entity("API", 102), entity("DB", 110)]]
+        stitched = stitch_entities(found, chunks, offset=100)
+        self.assertEqual([(item["start"], item["id"]) for item in stitched], [(102, "ent-0"), (110, "ent-1")])
+
+
+class ChunkedPredictionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        app.models.load()
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(app, "run_ner", lambda texts, batch_size=None: dictionary_pipeline(texts)),
+            mock.patch.dict(app.app.config, {"NER_CHUNK_TOKENS": 16, "NER_CHUNK_OVERLAP": 2})
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def expected(self, text, offset=0):
+        return app.merge_ner_results(dictionary_pipeline([text])[0], offset)
+
+    def test_chunked_text_matches_whole_text(self):
+        self.assertGreater(len(app.plan_ner_chunks(LONG_TEXT)), 2)
+        self.assertEqual(app.predict_entities(LONG_TEXT), self.expected(LONG_TEXT))
+
+    def test_segments_keep_global_offsets(self):
+        segments = [(0, SENTENCES[0]), (500, LONG_TEXT)]
+        short, long = app.predict_segment_entities(segments)
+        self.assertEqual(short, self.expected(SENTENCES[0]))
+        self.assertEqual(long, self.expected(LONG_TEXT, 500))
+
+    def test_chunk_size_defaults_to_model_limit(self):
+        with mock.patch.dict(app.app.config, {"NER_CHUNK_TOKENS": 0}):
+            registry = app.models.require()
+            limit = app.ner_chunk_tokens(registry)
+            self.assertEqual(limit, min(
+                registry.ner_tokenizer.model_max_length,
+                registry.ner_model.config.max_position_embeddings
+            ) - registry.ner_tokenizer.num_special_tokens_to_add())
+            self.assertEqual(len(app.plan_ner_chunks(SENTENCES[0])), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
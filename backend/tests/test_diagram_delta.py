@@ -0,0 +1,171 @@
+"""Патчи диаграммы: проверка операций, откат патча целиком, версии и снимки.
+
+Запуск из backend/: python -m pytest tests
+"""
+import copy
+import json
+import unittest
+
+from app import build_c4_hierarchy, convert_to_diagram_elements
+from benchmarks.synthetic import synthetic_graph
+from diagram_delta import DiagramDocument, PatchError, VersionConflict, validate_op
+
+
+def hierarchy():
+    return {
+        "systems": [{"id": "shop", "name": "Shop", "description": "", "containers": []}],
+        "containers": [],
+        "components": [],
+        "code_elements": []
+    }
+
+
+def document():
+    data = hierarchy()
+    nodes, edges = convert_to_diagram_elements(data)
+    doc = DiagramDocument(data, nodes, edges)
+    doc.apply([
+        {"op": "add", "kind": "container", "id": "api", "name": "Order API", "parent": "shop"},
+        {"op": "add", "kind": "container", "id": "db", "name": "Orders DB", "parent": "shop", "type": "database"},
+        {"op": "add", "kind": "component", "id": "checkout", "name": "Checkout", "parent": "api"},
+        {"op": "add", "kind": "code", "id": "cart", "name": "Cart", "parent": "checkout"}
+    ], 1)
+    return doc
+
+
+def state(doc):
+    """Все, что видит клиент: версия, фрагменты кода, узлы и ребра (клиент находит их по id,
+    порядок в словарях после отката может отличаться)"""
+    snapshot = json.loads(json.dumps(doc.snapshot()))
+    return {
+        "version": doc.version,
+        "fragments": doc.fragments(),
+        "hierarchy": snapshot["hierarchy"],
+        "nodes": {node["id"]: node for node in snapshot["nodes"]},
+        "edges": {edge["id"]: edge for edge in snapshot["edges"]}
+    }
+
+
+class ValidateOpTest(unittest.TestCase):
+    def test_invalid_fields(self):
+        cases = [
+            ({"op": "rename", "id": "shop"}, "rename requires name"),
+            ({"op": "add", "kind": "system", "name": "n"}, "add requires id"),
+            ({"op": "rename", "id": ["shop"], "name": "n"}, "id must be a string"),
+            ({"op": "add", "kind": ["system"], "id": "q", "name": "n"}, "kind must be a string"),
+            ({"op": "add", "level": True, "id": "q", "name": "n"}, "level must be a number"),
+            ({"op": "add", "kind": "container", "id": "q", "name": "n", "parent": 1}, "parent must be a string"),
+            ({"op": "move", "id": "shop", "position": {"x": "1", "y": 2}}, "position requires numeric x and y"),
+            ({"op": "move", "id": "shop", "position": {"x": False, "y": 2}}, "position requires numeric x and y"),
+            ({"op": "move", "id": "shop", "position": [1, 2]}, "position requires numeric x and y")
+        ]
+        for op, message in cases:
+            with self.subTest(op=op):
+                with self.assertRaisesRegex(PatchError, message):
+                    validate_op(op)
+
+    def test_valid_ops(self):
+        for op in ({"op": "add", "kind": "system", "id": "q", "name": "n", "position": {"x": 1.5, "y": 2}},
+                   {"op": "add", "level": 2, "id": "q", "name": "n", "parent": "shop"},
+                   {"op": "move", "id": "shop", "position": {"x": 0, "y": 0}},
+                   {"op": "remove", "id": "shop"}):
+            validate_op(op)
+
+    def test_invalid_op_is_reported_with_index(self):
+        doc = document()
+        before = state(doc)
+        for ops in ([{"op": "rename", "id": "shop", "name": "x"}, {"op": "rename", "id": 5, "name": "y"}],
+                    [{"op": "rename", "id": "shop", "name": "x"}, "rename"],
+                    [{"op": ["add"]}]):
+            with self.subTest(ops=ops):
+                with self.assertRaisesRegex(PatchError, "(Operation|operation at index) [01]"):
+                    doc.apply(ops, doc.version)
+                self.assertEqual(state(doc), before)
+
+
+class ApplyTest(unittest.TestCase):
+    def test_failed_patch_is_rolled_back(self):
+        doc = document()
+        before = state(doc)
+        valid = [
+            {"op": "rename", "id": "api", "name": "Orders"},
+            {"op": "add", "kind": "component", "id": "billing", "name": "Billing", "parent": "db"},
+            {"op": "move", "id": "cart", "parent": "billing"},
+            {"op": "move", "id": "shop", "position": {"x": 10, "y": 20}},
+            {"op": "remove", "id": "checkout"},
+            {"op": "remove", "id": "db"}
+        ]
+        for failing in ({"op": "remove", "id": "missing"},
+                        {"op": "add", "kind": "system", "id": "shop", "name": "Duplicate"},
+                        {"op": "move", "id": "api", "parent": "cart"}):
+            with self.subTest(failing=failing):
+                with self.assertRaises(PatchError):
+                    doc.apply(valid + [failing], doc.version)
+                self.assertEqual(state(doc), before)
+
+        # Те же операции без ошибочной применяются к неизмененному документу
+        delta = doc.apply(valid, doc.version)
+        self.assertEqual(delta["version"], before["version"] + 1)
+        self.assertEqual(sorted(delta["removed_nodes"]), ["billing", "cart", "checkout", "db"])
+        self.assertEqual(sorted(doc.elements), ["api", "shop"])
+
+    def test_version_conflict(self):
+        doc = document()
+        version = doc.version
+        doc.apply([{"op": "rename", "id": "shop", "name": "Store"}], version)
+        before = state(doc)
+        with self.assertRaises(VersionConflict):
+            doc.apply([{"op": "rename", "id": "shop", "name": "Other"}], version)
+        self.assertEqual(state(doc), before)
+
+    def test_remove_keeps_children_with_other_parents(self):
+        shared = {"id": "shared", "name": "Shared", "code_elements": []}
+        data = hierarchy()
+        data["containers"] = [
+            {"id": "api", "name": "Order API", "type": "container", "components": [shared]},
+            {"id": "db", "name": "Orders DB", "type": "database", "components": [shared]}
+        ]
+        data["systems"][0]["containers"] = list(data["containers"])
+        data["components"] = [shared]
+        doc = DiagramDocument(data, *convert_to_diagram_elements(data))
+        self.assertEqual(doc.parents["shared"], ["api", "db"])
+
+        delta = doc.apply([{"op": "remove", "id": "api"}], doc.version)
+        self.assertEqual(delta["removed_nodes"], ["api"])
+        self.assertEqual(doc.parents["shared"], ["db"])
+        self.assertEqual(doc.nodes["shared"]["data"]["parent"], "db")
+        self.assertIn("edge-api-shared", delta["removed_edges"])
+
+        delta = doc.apply([{"op": "remove", "id": "db"}], doc.version)
+        self.assertEqual(delta["removed_nodes"], ["db", "shared"])
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_restored_document_applies_same_patches(self):
+        entities, relations = synthetic_graph(60)
+        data = build_c4_hierarchy(entities, relations)
+        nodes, edges = convert_to_diagram_elements(data)
+        doc = DiagramDocument(copy.deepcopy(data), nodes, edges)
+
+        # Снимок проходит через JSON, как версия в БД: общие дети становятся копиями
+        restored = json.loads(json.dumps(doc.snapshot()))
+        other = DiagramDocument(restored["hierarchy"], restored["nodes"], restored["edges"], version=doc.version)
+        self.assertEqual(other.fragments(), doc.fragments())
+
+        shared = next(element_id for element_id, parents in doc.parents.items() if len(parents) > 1)
+        level = doc.levels[shared]
+        target = next(element_id for element_id in sorted(doc.elements)
+                      if doc.levels[element_id] == level - 1 and element_id not in doc.parents[shared])
+        patches = [
+            [{"op": "rename", "id": shared, "name": "Renamed"}],
+            [{"op": "move", "id": shared, "parent": target}],
+            [{"op": "remove", "id": target}]
+        ]
+        for ops in patches:
+            with self.subTest(ops=ops):
+                self.assertEqual(other.apply(ops, other.version), doc.apply(ops, doc.version))
+                self.assertEqual(state(other), state(doc))
+
+
+if __name__ == "__main__":
+    unittest.main()
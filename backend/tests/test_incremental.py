@@ -0,0 +1,127 @@
+"""Инкрементальное переизвлечение против полного прогона extract_graph.
+
+NER подменяется словарным (не зависит от контекста), чтобы сравнивать
+только перенос сущностей и отношений; RE -- модель из репозитория с нулевым
+порогом уверенности, так что сравниваются оценки всех пар-кандидатов.
+Запуск из backend/: python -m pytest tests
+"""
+import re
+import unittest
+from unittest import mock
+
+import app
+from incremental import ExtractionState, IncrementalExtractor
+
+NAMES = {
+    "Order API": "CONTAINER",
+    "Payment Service": "CONTAINER",
+    "Orders DB": "DATABASE",
+    "Event Queue": "QUEUE",
+    "Shop System": "SYSTEM",
+    "Customer": "ACTOR",
+    "Checkout Controller": "COMPONENT",
+    "Billing Component": "COMPONENT"
+}
+NAME_RE = re.compile("|".join(re.escape(name) for name in NAMES))
+
+SENTENCES = [
+    "The Customer uses the Shop System.",
+    "The Shop System contains the Order API and the Payment Service.",
+    "The Order API stores orders in the Orders DB.",
+    "The Payment Service publishes events to the Event Queue.",
+    "The Checkout Controller is part of the Order API.",
+    "The Billing Component reads the Event Queue.",
+    "The Payment Service calls the Billing Component."
+]
+# Текст длиннее окна RE модели (RE_MAX_LENGTH токенов)
+LONG_TEXT = " ".join(SENTENCES * 4)
+
+
+def dictionary_entities(text, offset=0):
+    entities = []
+    for match in NAME_RE.finditer(text):
+        entity_type = NAMES[match.group()]
+        entities.append({
+            "text": match.group(),
+            "type": entity_type,
+            "start": offset + match.start(),
+            "end": offset + match.end(),
+            "id": f"ent-{len(entities)}",
+            "level": app.C4_LEVELS[entity_type]
+        })
+    return entities
+
+
+def dictionary_segments(segments):
+    return [dictionary_entities(segment, offset) for offset, segment in segments]
+
+
+class IncrementalExtractionTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        app.models.load()
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(app, "predict_entities", dictionary_entities),
+            mock.patch.object(app, "RE_CONFIDENCE_THRESHOLD", 0.0),
+            mock.patch("app.debug_dump", lambda *args: None)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def extractor(self):
+        return IncrementalExtractor(
+            ner_segments=dictionary_segments,
+            candidate_pairs=app.candidate_pairs,
+            score_pairs=app.score_entity_pairs,
+            relation_inputs=app.relation_inputs,
+            coreference=app.coreference_index
+        )
+
+    def assert_matches_full_run(self, old_text, new_text):
+        previous = ExtractionState(old_text, *app.extract_graph(old_text))
+        stats = {}
+        state = self.extractor().update(previous, new_text, stats)
+        entities, relations = app.extract_graph(new_text)
+
+        self.assertEqual(state.entities, entities)
+        self.assertGreater(len(relations), 0)
+        self.assertEqual(
+            [(relation["source"], relation["target"], relation["type"]) for relation in state.relations],
+            [(relation["source"], relation["target"], relation["type"]) for relation in relations]
+        )
+        for incremental, full in zip(state.relations, relations):
+            self.assertAlmostEqual(incremental["confidence"], full["confidence"], places=4)
+        return stats
+
+    def test_edit_at_start_pair_mode(self):
+        stats = self.assert_matches_full_run(LONG_TEXT, "The Customer opens the Shop System. " + LONG_TEXT)
+        # Контекст всех пар -- начало документа: ни одно отношение не переносится
+        self.assertEqual(stats["reused_relations"], 0)
+        self.assertGreater(stats["changed_contexts"], 0)
+
+    def test_edit_at_start_without_coreference(self):
+        with mock.patch.object(app, "coreference_index", None):
+            self.assert_matches_full_run(LONG_TEXT, "The Customer opens the Shop System. " + LONG_TEXT)
+
+    def test_edit_outside_context_window_reuses_relations(self):
+        stats = self.assert_matches_full_run(LONG_TEXT, LONG_TEXT + " The Order API calls the Payment Service.")
+        self.assertGreater(stats["reused_relations"], 0)
+        self.assertEqual(stats["changed_contexts"], 0)
+
+    def test_edit_at_start_shared_mode(self):
+        with mock.patch.dict(app.app.config, {"RE_SCORING_MODE": "shared"}):
+            stats = self.assert_matches_full_run(LONG_TEXT, "The Customer opens the Shop System. " + LONG_TEXT)
+        # Окна пар в конце документа правку не захватывают
+        self.assertGreater(stats["reused_relations"], 0)
+
+    def test_deleted_sentence(self):
+        text = " ".join(SENTENCES)
+        self.assert_matches_full_run(text, " ".join(SENTENCES[:2] + SENTENCES[3:]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""Круговой прогон build_c4_hierarchy -> generate_c4_code -> parse_c4_plantuml -> generate_c4_code.
+
+Запуск из backend/: python -m pytest tests (или python -m unittest discover tests).
+"""
+import unittest
+
+from app import build_c4_hierarchy, generate_c4_code
+from benchmarks.synthetic import synthetic_graph
+from plantuml_parser import parse_c4_plantuml
+
+
+def entity(entity_id, text, entity_type, level):
+    return {"id": entity_id, "text": text, "type": entity_type, "level": level, "start": 0, "end": 0}
+
+
+def contains(source, target, level):
+    return {"source": source, "target": target, "type": "contains", "confidence": 0.9, "level": level}
+
+
+def by_id(hierarchy):
+    """Плоские списки уровней без учета порядка (порядок элементов без своих
+    границ в коде не сохраняется, generate_c4_code его не использует)"""
+    return {key: sorted(elements, key=lambda element: element["id"]) for key, elements in hierarchy.items()}
+
+
+# Все формы, которые пишет generate_c4_code: Person, System, System_Ext,
+# Container, ContainerDb, Queue и вложенные границы до элементов кода
+ENTITIES = [
+    entity("user", "Customer", "ACTOR", 1),
+    entity("shop", "Online Shop", "SYSTEM", 1),
+    entity("payments", "Payment Provider", "EXTERNAL_SYSTEM", 1),
+    entity("api", "Order API", "CONTAINER", 2),
+    entity("orders_db", "Orders DB", "DATABASE", 2),
+    entity("events", "Order Events", "QUEUE", 2),
+    entity("checkout", "Checkout Controller", "COMPONENT", 3),
+    entity("billing", "Billing Service", "COMPONENT", 3),
+    entity("cart", "Cart class", "VERB", 4),
+    entity("charge", "charge function", "VERB", 4),
+    entity("invoice", "Invoice", "VERB", 4)
+]
+RELATIONS = [
+    contains("shop", "api", 1),
+    contains("shop", "orders_db", 1),
+    contains("shop", "events", 1),
+    contains("api", "checkout", 2),
+    contains("api", "billing", 2),
+    contains("checkout", "cart", 3),
+    contains("billing", "charge", 3),
+    contains("billing", "invoice", 3)
+]
+
+
+class PlantUMLRoundTripTest(unittest.TestCase):
+
+    def assert_round_trip(self, hierarchy):
+        code = generate_c4_code(hierarchy)
+        parsed, relations = parse_c4_plantuml(code)
+        self.assertEqual(generate_c4_code(parsed), code)
+        self.assertEqual(parsed["systems"], hierarchy["systems"])
+        self.assertEqual(by_id(parsed), by_id(hierarchy))
+        self.assertEqual(relations, [])
+        return parsed
+
+    def test_all_element_forms(self):
+        hierarchy = build_c4_hierarchy(ENTITIES, RELATIONS)
+        code = generate_c4_code(hierarchy)
+        for line in ('Person(user, "Customer", "")',
+                     'System_Ext(payments, "Payment Provider", "")',
+                     'ContainerDb(orders_db, "Orders DB", "")',
+                     'Queue(events, "Order Events", "")',
+                     'Component(charge, "charge function", "function")'):
+            self.assertIn(line, code)
+        parsed = self.assert_round_trip(hierarchy)
+        # Здесь порядок плоских списков совпадает с порядком границ
+        self.assertEqual(parsed, hierarchy)
+
+    def test_elements_with_several_parents(self):
+        relations = RELATIONS + [contains("api", "orders_db", 2), contains("checkout", "charge", 3)]
+        entities = ENTITIES + [entity("admin", "Admin Portal", "SYSTEM", 1)]
+        relations.append(contains("admin", "api", 1))
+        self.assert_round_trip(build_c4_hierarchy(entities, relations))
+
+    def test_synthetic_graphs(self):
+        for size in (10, 200):
+            for extra_relations in (0.0, 1.0):
+                with self.subTest(size=size, extra_relations=extra_relations):
+                    self.assert_round_trip(build_c4_hierarchy(*synthetic_graph(size, extra_relations)))
+
+    def test_nested_boundaries_and_external_forms(self):
+        code = """@startuml
+Person_Ext(partner, "Partner")
+Enterprise_Boundary(corp, "Corp") {
+  System_Boundary(shop, "Online Shop") {
+    ContainerDb_Ext(legacy_db, "Legacy DB", "Oracle")
+    ContainerQueue(events, "Order Events")
+    Container_Boundary(api, "Order API") {
+      Component_Ext(checkout, "Checkout")
+      Component_Boundary(billing, "Billing") {
+        Component(charge, "charge function", "function")
+      }
+    }
+  }
+}
+SystemQueue_Ext(bank, "Bank")
+Rel(partner, api, "Calls")
+@enduml
+"""
+        parsed, relations = parse_c4_plantuml(code)
+        self.assertEqual([system["id"] for system in parsed["systems"]], ["partner", "bank", "shop"])
+        self.assertEqual(parsed["systems"][0]["type"], "actor")
+        self.assertEqual(parsed["systems"][1]["type"], "external")
+        shop = parsed["systems"][2]
+        self.assertEqual([(c["id"], c["type"]) for c in shop["containers"]],
+                         [("legacy_db", "database"), ("events", "queue"), ("api", "container")])
+        api = shop["containers"][2]
+        self.assertEqual([component["id"] for component in api["components"]], ["checkout", "billing"])
+        self.assertEqual(api["components"][1]["code_elements"],
+                         [{"id": "charge", "name": "charge function", "type": "function"}])
+        self.assertEqual(relations, [{"source": "partner", "target": "api", "label": "Calls"}])
+
+        # Сгенерированный по разобранной иерархии код разбирается в ту же иерархию
+        regenerated = generate_c4_code(parsed)
+        reparsed, _ = parse_c4_plantuml(regenerated)
+        self.assertEqual(reparsed["systems"], parsed["systems"])
+        self.assertEqual(by_id(reparsed), by_id(parsed))
+        self.assertEqual(generate_c4_code(reparsed), regenerated)
+
+
+if __name__ == "__main__":
+    unittest.main()